@@ -1,211 +1,509 @@
-#Que3_client.py
-#This is the client that students use to apply
-
-#Importing necessary modules
-import socket               #For network communication      
-import json                 #To format the data which is being sent
-
-
-#Step 1: Function to get User Input
-
-def get_application_details():     #It collects all the required information from the applicant
-    
-    print("\n" + "=" *60)
-    print("DUBLIN BUSINESS SCHOOL - APPLICATION FORM")
-    print("=" * 60)
-
-
-    #To get name
-    while True:
-        name = input("\n Enter your full name: ").strip()
-        if name and len(name) >= 2:
-            break
-        print("Please enter a valid name (at least 2 characters)")
-
-    #To get address
-    while True:
-        address = input("Enter your address: ").strip()
-        if address and len(address) >= 5:
-            break
-        print("Please enter a valid address (at least 5 characters)")
-
-    #To get educational qualifications
-    while True:
-        qualifications = input("Enter your educational qualifications: ").strip()
-        if qualifications and len(qualifications) >= 3:
-            break
-        print("Please enter your qualifications (at least 3 characters)")
-
-    #To get course selection
-    print("\nAvailable Courses:")
-    print("1. MSc in Cyber Security")
-    print("2. Msc in Information Systems & Computing")
-    print("3. Msc in Data Analytics")
-
-    courses = {
-        '1' : 'Msc in Cyber Security',
-        '2' : 'Msc in Information Systems & Computing',
-        '3' : 'Msc in Data Analytics'
-    }
-
-    while True:
-        course_choice = input("\nSelect course (1-3):") .strip()
-        if course_choice in courses:
-            course = courses[course_choice]
-            break
-        print("Please select a valid option (1, 2 or 3)")
-                              
-    #Get start year
-    while True:
-        try:
-            start_year = int(input("Enter intended start year: "). strip())
-            if 2024 <= start_year <= 2030:
-                break
-            print("Please enter a year between 2024 and 2030")
-        except ValueError:
-            print("Please enter a valid year (numbers only)")
-
-    #Get start month
-    months = [
-        'January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'
-    ]
-
-    print("\nAvailable Months: ")
-    for i, month in enumerate(months, 1):
-        print(f"{i:2d}.{month}")
-
-    while True:
-        try:
-            month_choice = int(input("\nSelect start month (1-12):").strip())
-            if 1 <= month_choice <= 12:
-                start_month = months[month_choice - 1]
-                break
-            print("Please enter a number between 1 and 12")
-        except ValueError:
-            print("Please enter a valid number")
-
-
-    #Create dictionary with all data
-    application_data = {
-        'name': name,
-        'address': address,
-        'qualifications': qualifications,
-        'course': course,
-        'start_year': start_year,
-        'start_month': start_month
-    }
-
-    return application_data
-
-#Step 2: The function to send the apliocation to the server
-
-def send_application(application_data):      #It connects to the server and sends application data
-
-    #Server details It must always match the the server settings
-    HOST = '127.0.0.1'  #localhost
-    PORT = 65432        #Same port as server
-
-    try:
-        #Create a socket
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-        print("\n[CLIENT] Connecting to DBS Server...")
-
-        #Connecting to server
-        client_socket.connect((HOST, PORT))
-        print("[CLIENT] Connected to server successfully..!")
-
-        #Convert dictionary to JSON string
-        data_to_send = json.dumps(application_data)
-
-        #Send data to server
-        client_socket.send(data_to_send.encode('utf-8'))
-        print("[CLIENT] Application data sent to server")
-
-        #Waiting for the response from server
-        print("[CLIENT] Waitinf for the response...")
-        response = client_socket.recv(4096).decode('utf-8')
-
-        #Convert JSON response back to dictionary
-        response_data = json.loads(response)
-
-        #Display the response
-        print("\n" + "=" * 60)
-        if response_data['status'] == 'success':
-            print("APPLICATION SUBMITTED SUCCESSFULLY!")
-            print("=" * 60)
-            print(f"\n Your Application Number: {response_data['application_number']}")
-            print("Please save this number for future reference.")
-            print("You will receive further communication from DBS soon...")
-        else:
-            print("Application Failed...")
-            print("=" * 60)
-            print(f"\n Error: {response_data['message']}")
-
-        print("=" * 60)
-
-        #Close the connection
-        client_socket.close()
-        print("\n[CLIENT] Connection closed")
-
-        return True
-    
-    except ConnectionRefusedError:
-        print("\n ERROR: Cannot connect to server")
-        print("Make sure the server is running first!")
-        return False
-    
-    except Exception as e:
-        print(f"\n Error: {e}")
-        return False
-    
-#Step 3: Main Program
-
-def main():              #Main function that runs the client application
-     print("\n" + "🎓" * 30)
-     print(" WELCOME TO DUBLIN BUSINESS SCHOOL")
-     print(" Online Application System")
-     print("🎓" * 30)
-
-     while True:
-         print("\n" + "-" * 60)
-         choice = input("\nWould you like to submit an application? (yes/no): ").strip().lower()
-
-         if choice in ['yes', 'y']:
-             #Getting the application details
-             app_data = get_application_details()
-
-             #Showing summary and confirming
-             print("\n" + "-" * 60)
-             print("APPLICATION SUMMARY")
-             print("-" * 60)
-             print(f" Name:              {app_data['name']}")
-             print(f" Address:           {app_data['address']}")
-             print(f" Qualifications:    {app_data['qualifications']}")
-             print(f" Course:            {app_data['course']}")
-             print(f" Start:             {app_data['start_month']} {app_data['start_year']}")
-             print("-" * 60)
-
-             confirm = input("\nConfirm Submission? (yes/no): ").strip().lower()
-
-             if confirm in ['yes', 'y']:
-                 #Send to server
-                 send_application(app_data)
-             else:
-                 print("Application cancelled...")
-
-         elif choice in ['no', 'n']:
-             print("\n Thank you for visiting DBS Application System!")
-             print("Goodbye..!!\n")
-             break
-         
-         else:
-             print("Please enter 'yes' or 'no'")
-
-#Running the client
-
-if __name__ == "__main__":
-    main()
-             
-
-
+#Que3_client.py
+#This is the client that students use to apply
+
+#Importing necessary modules
+import socket               #For network communication      
+import json                 #To format the data which is being sent
+import csv                  #To read bulk upload files and write their reports
+import sys                  #For the exit status of a bulk upload
+import time                 #To measure bulk upload throughput and to wait between retries
+import random               #For the jitter in the retry delays
+import uuid                 #For the request keys that make a resent application safe
+import threading            #Each bulk upload worker keeps its own connection
+import argparse             #For the command line options
+from collections import deque   #To match pipelined responses to their requests
+from concurrent.futures import ThreadPoolExecutor   #To upload over several connections at once
+from Que3_validation import (MONTHS, clean_application, clean_name, clean_address, clean_qualifications,   #The application rules
+                             clean_course, clean_start_year, clean_start_month)
+from Que3_protocol import ENCODING_JSON, ProtocolError, read_frame, send_frame   #The framed wire protocol
+
+
+#Step 1: Function to get User Input
+
+def ask(prompt, clean):            #Keeps asking until the answer passes the check
+    while True:
+        try:
+            return clean(input(prompt))
+        except ValueError as e:
+            print(e)
+
+def get_application_details():     #It collects all the required information from the applicant
+    
+    print("\n" + "=" *60)
+    print("DUBLIN BUSINESS SCHOOL - APPLICATION FORM")
+    print("=" * 60)
+
+
+    #Every answer is checked with the same rules the bulk upload and the server use
+
+    #To get name
+    name = ask("\n Enter your full name: ", clean_name)
+
+    #To get address
+    address = ask("Enter your address: ", clean_address)
+
+    #To get educational qualifications
+    qualifications = ask("Enter your educational qualifications: ", clean_qualifications)
+
+    #To get course selection
+    print("\nAvailable Courses:")
+    print("1. MSc in Cyber Security")
+    print("2. Msc in Information Systems & Computing")
+    print("3. Msc in Data Analytics")
+
+    course = ask("\nSelect course (1-3):", clean_course)
+                              
+    #Get start year
+    start_year = ask("Enter intended start year: ", clean_start_year)
+
+    #Get start month
+    print("\nAvailable Months: ")
+    for i, month in enumerate(MONTHS, 1):
+        print(f"{i:2d}.{month}")
+
+    start_month = ask("\nSelect start month (1-12):", clean_start_month)
+
+
+    #Create dictionary with all data
+    application_data = {
+        'name': name,
+        'address': address,
+        'qualifications': qualifications,
+        'course': course,
+        'start_year': start_year,
+        'start_month': start_month
+    }
+
+    return application_data
+
+#Step 2: A persistent connection to the server
+
+#Server details It must always match the the server settings
+HOST = '127.0.0.1'  #localhost
+PORT = 65432        #Same port as server
+PIPELINE_WINDOW = 64    #Most requests sent ahead of their responses on one connection
+REQUEST_TIMEOUT = 30    #Seconds to wait for the server before giving up
+
+class ServerBusy(Exception):       #The server turned the connection away, nothing sent on it was processed
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def new_request_key():             #A fresh key for one submission, reused for every retry of it
+    return uuid.uuid4().hex
+
+def keyed(message, request_key):   #Adds the request key to a message when there is one
+    return dict(message, request_key=request_key) if request_key else message
+
+class ApplicationConnection:       #Keeps one connection open and sends many applications over it
+
+    def __init__(self, host=HOST, port=PORT, encoding=ENCODING_JSON, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.encoding = encoding
+        self.next_id = 1
+
+    def request(self, message):    #Sends one request and waits for its response
+        return self.pipeline([message])[0]
+
+    def pipeline(self, messages, window=PIPELINE_WINDOW):   #Sends requests without waiting for each answer, returns responses in the same order
+        responses = []
+        in_flight = deque()        #ids sent but not answered yet, the server answers in order
+        messages = iter(messages)
+        finished_sending = False
+
+        while not finished_sending or in_flight:
+            #Keep the window full, then collect the oldest answer
+            while not finished_sending and len(in_flight) < window:
+                message = next(messages, None)
+                if message is None:
+                    finished_sending = True
+                    break
+                request_id = self.next_id
+                self.next_id += 1
+                send_frame(self.sock, dict(message, id=request_id), self.encoding)
+                in_flight.append(request_id)
+
+            if in_flight:
+                frame = read_frame(self.sock)
+                if frame is None:
+                    raise ProtocolError("Server closed the connection")
+                response, _ = frame
+                if response.get('status') == 'busy':       #The server closes a busy connection, the caller retries
+                    self.close()
+                    raise ServerBusy(response.get('message', 'Server busy'), response.get('retry_after', 0))
+                expected = in_flight.popleft()
+                if response.get('id') != expected:
+                    raise ProtocolError(f"Response for request {response.get('id')} arrived, expected {expected}")
+                responses.append(response)
+
+        return responses
+
+    def submit(self, application_data, request_key=None):   #Submits one application and returns the server's response
+        return self.request(keyed({'type': 'submit', 'application': application_data}, request_key))
+
+    def submit_many(self, applications, window=PIPELINE_WINDOW, request_keys=None):   #Pipelines many applications, responses come back in order
+        request_keys = request_keys or [None] * len(applications)
+        return self.pipeline((keyed({'type': 'submit', 'application': app}, key)
+                              for app, key in zip(applications, request_keys)), window)
+
+    def submit_batch(self, applications, request_key=None):   #Submits a list of applications in one message, the server inserts them in one transaction
+        return self.request(keyed({'type': 'batch', 'applications': list(applications)}, request_key))
+
+    def status(self, app_number):  #Looks up one application by its number
+        return self.request({'type': 'status', 'application_number': app_number})
+
+    def list_intake(self, course, start_year, start_month, limit=None, after=None):   #One page of an intake, pass the response's next_after to get the next
+        return self.request({'type': 'list_intake', 'course': course, 'start_year': start_year,
+                             'start_month': start_month, 'limit': limit, 'after': after})
+
+    def search_name(self, prefix, limit=None, after=None):   #One page of applicants whose name starts with prefix
+        return self.request({'type': 'search_name', 'prefix': prefix, 'limit': limit, 'after': after})
+
+    def stats(self, prometheus=False):   #The server's metrics, as a dictionary or as Prometheus text
+        return self.request({'type': 'stats', 'format': 'prometheus' if prometheus else 'json'})
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+#Retrying: a busy server or one that is not accepting connections yet is tried again after
+#a delay that doubles each time (exponential backoff) and is picked at random below that
+#(full jitter), so clients turned away together do not all come back at the same moment.
+#Without a request key only failures where the server cannot have processed the request are
+#retried. A submission carrying a request key is also sent again after a timeout or a dropped
+#connection: if the server did save it, it answers the repeat with the original number.
+
+RETRY_ATTEMPTS = 5      #Tries in total, including the first
+RETRY_BASE_DELAY = 0.2  #Seconds, doubled for every retry
+RETRY_MAX_DELAY = 5.0   #Seconds, the most one wait can be
+
+def backoff_delay(attempt, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY, rng=random):   #How long to wait before retry number attempt (1, 2, ...)
+    return rng.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+def call_with_retry(request, host=HOST, port=PORT, attempts=RETRY_ATTEMPTS, timeout=REQUEST_TIMEOUT,
+                    on_retry=None, resend=False):   #Runs request(connection) on a fresh connection, retrying while the server is busy or refusing
+    for attempt in range(1, attempts + 1):
+        try:
+            with ApplicationConnection(host, port, timeout=timeout) as connection:
+                return request(connection)
+        except ServerBusy as e:
+            error, delay = e, max(e.retry_after, backoff_delay(attempt))
+        except ConnectionRefusedError as e:
+            error, delay = e, backoff_delay(attempt)
+        except (OSError, ProtocolError) as e:   #Timed out or dropped after sending, resent only for a keyed request
+            if not resend:
+                raise
+            error, delay = e, backoff_delay(attempt)
+        if attempt == attempts:
+            raise error
+        if on_retry:
+            on_retry(error, attempt, delay)
+        time.sleep(delay)
+
+def print_retry(error, attempt, delay):   #Tells the user why the client is waiting
+    print(f"[CLIENT] {str(error) or error.__class__.__name__} - retrying in {delay:.1f} s (attempt {attempt + 1} of {RETRY_ATTEMPTS})")
+
+
+#Step 3: The function to send the apliocation to the server
+
+def send_application(application_data):      #It connects to the server and sends application data
+
+    try:
+        print("\n[CLIENT] Connecting to DBS Server...")
+
+        #Connecting to server, send data and wait for the response (tried again if the server is busy
+        #or does not answer, the request key makes sure a resent application is only saved once)
+        request_key = new_request_key()
+        print("[CLIENT] Application data sent to server")
+        print("[CLIENT] Waitinf for the response...")
+        response_data = call_with_retry(lambda connection: connection.submit(application_data, request_key),
+                                        HOST, PORT, on_retry=print_retry, resend=True)
+
+        #Display the response
+        print("\n" + "=" * 60)
+        if response_data['status'] == 'success':
+            print("APPLICATION SUBMITTED SUCCESSFULLY!")
+            print("=" * 60)
+            print(f"\n Your Application Number: {response_data['application_number']}")
+            print("Please save this number for future reference.")
+            print("You will receive further communication from DBS soon...")
+        else:
+            print("Application Failed...")
+            print("=" * 60)
+            print(f"\n Error: {response_data['message']}")
+
+        print("=" * 60)
+
+        #The connection is closed when leaving the with block
+        print("\n[CLIENT] Connection closed")
+
+        return True
+    
+    except ConnectionRefusedError:
+        print("\n ERROR: Cannot connect to server")
+        print("Make sure the server is running first!")
+        return False
+
+    except ServerBusy as e:
+        print(f"\n ERROR: {e}")
+        print("The server is too busy at the moment, please try again later.")
+        return False
+
+    except TimeoutError:
+        print("\n ERROR: The server did not answer in time")
+        print("Please try again later.")
+        return False
+    
+    except Exception as e:
+        print(f"\n Error: {e}")
+        return False
+    
+#Step 4: Bulk submission from a file
+
+BULK_CONNECTIONS = 4    #Connections opened to the server for a bulk upload
+BULK_CHUNK_SIZE = 200   #Applications handed to one connection at a time
+
+def read_applications(path, file_format=None):    #Yields (row number, raw row) from a CSV or JSON Lines file without loading it all
+    if file_format is None:
+        file_format = 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        if file_format == 'csv':
+            for row_number, row in enumerate(csv.DictReader(file), 1):
+                yield row_number, row
+        else:
+            for row_number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield row_number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield row_number, e            #Reported as a failed row, the rest of the file still goes
+
+def chunks(rows, size):            #Groups an iterator into lists of at most size items
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def submit_bulk(rows, host=HOST, port=PORT, connections=BULK_CONNECTIONS,
+                chunk_size=BULK_CHUNK_SIZE, window=PIPELINE_WINDOW, batch=True):     #Streams (row number, raw row) pairs to the server, yields one result per row in file order
+
+    local = threading.local()      #Each worker thread keeps its own pipelined connection
+    opened = []                    #Every connection opened, so they can all be closed at the end
+
+    def send_chunk(chunk):
+        nonlocal batch
+        results = []
+        valid = []
+        for row_number, row in chunk:
+            try:
+                if isinstance(row, Exception):
+                    raise ValueError(f"Invalid JSON: {row}")
+                valid.append((row_number, clean_application(row)))
+                results.append(None)
+            except ValueError as e:
+                results.append({'row': row_number, 'status': 'error', 'message': str(e)})
+
+        applications = [app for _, app in valid]
+        request_key = new_request_key()    #The same key on every attempt, so a resent chunk is only saved once
+        responses = []
+        for attempt in range(1, RETRY_ATTEMPTS + 1):
+            if not applications:
+                break
+            try:
+                if getattr(local, 'connection', None) is None:
+                    local.connection = ApplicationConnection(host, port, timeout=REQUEST_TIMEOUT)
+                    opened.append(local.connection)
+                responses = None
+                if batch:          #One message per chunk, inserted with one executemany
+                    response = local.connection.submit_batch(applications, request_key)
+                    responses = response.get('results')
+                    if responses is None:      #The whole batch failed, only an old server does not know the message
+                        message = response.get('message', '')
+                        if response.get('status') == 'error' and message.startswith("Unknown message type"):
+                            batch = False      #An old server: this chunk and every later one are pipelined instead
+                        else:
+                            responses = [{'status': 'error', 'message': message or "Batch not saved"}] * len(valid)
+                if responses is None:          #One pipelined message per application
+                    responses = local.connection.submit_many(applications, window,
+                                                             [f"{request_key}:{i}" for i in range(len(applications))])
+                break
+            except (ServerBusy, OSError, ProtocolError) as e:
+                #The chunk carries request keys, so sending it again after a pause never saves an application twice
+                if getattr(local, 'connection', None) is not None:
+                    local.connection.close()
+                    local.connection = None    #Reconnect for the next attempt
+                if attempt == RETRY_ATTEMPTS:
+                    reason = "Server busy" if isinstance(e, ServerBusy) else "Connection failed"
+                    responses = [{'status': 'error', 'message': f"{reason}: {e}"}] * len(valid)
+                    break
+                time.sleep(max(getattr(e, 'retry_after', 0), backoff_delay(attempt)))
+
+        answers = iter(zip(valid, responses))
+        for i, result in enumerate(results):
+            if result is None:
+                (row_number, _), response = next(answers)
+                result = {'row': row_number, 'status': response['status']}
+                if response['status'] == 'success':
+                    result['application_number'] = response['application_number']
+                else:
+                    result['message'] = response.get('message', '')
+                results[i] = result
+        return results
+
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        try:
+            #Only a few chunks are read ahead, so the file is never held in memory
+            in_flight = deque()
+            for chunk in chunks(rows, chunk_size):
+                in_flight.append(pool.submit(send_chunk, chunk))
+                if len(in_flight) >= 2 * connections:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            pool.shutdown(wait=True)
+            for connection in opened:
+                connection.close()
+
+def run_bulk(path, file_format=None, report_path=None, host=HOST, port=PORT,
+             connections=BULK_CONNECTIONS, chunk_size=BULK_CHUNK_SIZE, window=PIPELINE_WINDOW, batch=True):   #Uploads a file and prints the per-row results and throughput
+
+    print("\n" + "=" * 60)
+    print(f"BULK UPLOAD: {path}")
+    print("=" * 60)
+
+    report = open(report_path, 'w', newline='', encoding='utf-8') if report_path else None
+    writer = csv.DictWriter(report, fieldnames=['row', 'status', 'application_number', 'message']) if report else None
+    if writer:
+        writer.writeheader()
+
+    submitted = failed = 0
+    started = time.perf_counter()
+    try:
+        results = submit_bulk(read_applications(path, file_format), host, port, connections, chunk_size, window, batch)
+        for result in results:
+            if result['status'] == 'success':
+                submitted += 1
+            else:
+                failed += 1
+                print(f"[BULK] Row {result['row']} failed: {result['message']}")
+            if writer:
+                writer.writerow(result)
+            else:
+                if result['status'] == 'success':
+                    print(f"[BULK] Row {result['row']}: {result['application_number']}")
+
+            done = submitted + failed
+            if done % 1000 == 0:
+                print(f"[BULK] {done} rows processed ({done / (time.perf_counter() - started):.0f} rows/s)")
+    finally:
+        if report:
+            report.close()
+
+    elapsed = time.perf_counter() - started
+    total = submitted + failed
+    print("-" * 60)
+    print(f" Rows:        {total}")
+    print(f" Submitted:   {submitted}")
+    print(f" Failed:      {failed}")
+    print(f" Time:        {elapsed:.2f} s")
+    print(f" Throughput:  {total / elapsed if elapsed else 0:.0f} rows/s")
+    if report_path:
+        print(f" Report:      {report_path}")
+    print("=" * 60)
+    return failed == 0
+
+
+#Step 5: Main Program
+
+def main():              #Main function that runs the client application
+     print("\n" + "🎓" * 30)
+     print(" WELCOME TO DUBLIN BUSINESS SCHOOL")
+     print(" Online Application System")
+     print("🎓" * 30)
+
+     while True:
+         print("\n" + "-" * 60)
+         choice = input("\nWould you like to submit an application? (yes/no): ").strip().lower()
+
+         if choice in ['yes', 'y']:
+             #Getting the application details
+             app_data = get_application_details()
+
+             #Showing summary and confirming
+             print("\n" + "-" * 60)
+             print("APPLICATION SUMMARY")
+             print("-" * 60)
+             print(f" Name:              {app_data['name']}")
+             print(f" Address:           {app_data['address']}")
+             print(f" Qualifications:    {app_data['qualifications']}")
+             print(f" Course:            {app_data['course']}")
+             print(f" Start:             {app_data['start_month']} {app_data['start_year']}")
+             print("-" * 60)
+
+             confirm = input("\nConfirm Submission? (yes/no): ").strip().lower()
+
+             if confirm in ['yes', 'y']:
+                 #Send to server
+                 send_application(app_data)
+             else:
+                 print("Application cancelled...")
+
+         elif choice in ['no', 'n']:
+             print("\n Thank you for visiting DBS Application System!")
+             print("Goodbye..!!\n")
+             break
+         
+         else:
+             print("Please enter 'yes' or 'no'")
+
+#Running the client
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DBS Application Client")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--status', metavar='NUMBER', help="look up an application by its number")
+    parser.add_argument('--stats', action='store_true', help="show the server's metrics in the Prometheus text format")
+    parser.add_argument('--bulk', metavar='FILE', help="submit every application in a CSV or JSON Lines file")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="file format (guessed from the extension)")
+    parser.add_argument('--report', metavar='FILE', help="write the per-row results to this CSV file")
+    parser.add_argument('--connections', type=int, default=BULK_CONNECTIONS, help="connections used for a bulk upload")
+    parser.add_argument('--window', type=int, default=PIPELINE_WINDOW, help="requests pipelined per connection")
+    parser.add_argument('--no-batch', action='store_true', help="send one message per application instead of batches")
+    args = parser.parse_args()
+
+    HOST, PORT = args.host, args.port
+    if args.status:
+        with ApplicationConnection(args.host, args.port) as connection:
+            response = connection.status(args.status)
+        if response['status'] != 'success':
+            print(f"\n Error: {response['message']}")
+            sys.exit(1)
+        for field, value in response['application'].items():
+            print(f" {field + ':':<20}{value}")
+        sys.exit(0)
+    if args.stats:
+        with ApplicationConnection(args.host, args.port) as connection:
+            print(connection.stats(prometheus=True)['text'], end='')
+        sys.exit(0)
+    if args.bulk:
+        ok = run_bulk(args.bulk, args.format, args.report, args.host, args.port,
+                      args.connections, window=args.window, batch=not args.no_batch)
+        sys.exit(0 if ok else 1)
+    main()
+             
+
+
@@ -0,0 +1,445 @@
+#Que3_journal.py
+#This is the journal ingest mode: applications are acknowledged once they are in a local journal file
+
+#Normally a client waits for its application's SQLite insert and commit. With --journal DIR the
+#server instead:
+#   1. gives the application its number (from counter blocks reserved ahead by the reserver thread)
+#   2. appends it to the journal, a sequence of segment files in DIR, together with the other
+#      applications that arrived in the same flush window, with one fsync for the group
+#   3. answers the client straight away
+#   4. a background drainer then loads journal entries into the applications table in large
+#      transactions, along with their request keys and the sequence number of the last one loaded
+#Every entry has a sequence number. The drainer stores the last one it loaded in the journal_state
+#table in the same transaction as the rows, so on restart exactly the entries after it are replayed.
+#A segment file is deleted once everything in it is in the database.
+#Acknowledging does not wait for the database, so a busy or compacting database only makes the
+#drainer fall behind (see the dbs_journal_backlog metric), not the clients. The one limit is the
+#numbers in hand: about NUMBERS_AHEAD are kept reserved, topped up in the background by a thread of
+#its own whenever fewer than NUMBERS_LOW are left. Only a database locked for longer than it takes
+#to give out those numbers makes acknowledgements wait for the next reservation.
+
+#Journal record: 4 bytes length, 4 bytes CRC-32 of the body (both big-endian), then the body,
+#one JSON object. A record cut short or failing its CRC ends a segment: it was never acknowledged.
+
+#Importing necessary modules
+import os                   #For fsync and the segment files
+import sqlite3              #The drainer's database connection
+import json                 #To format the journal entries
+import zlib                 #For the record checksums
+import struct               #To pack the record header
+import queue                #The journal thread hands entries to the drainer
+import threading            #The drainer runs on its own thread
+import time
+from collections import deque
+import Que3_server as server
+from Que3_queries import applications_inserted
+from Que3_metrics import (log, errors_total, duplicates_total, db_commit_seconds, db_group_rows, db_rows_total,
+                          journal_sync_seconds, journal_backlog)
+
+JOURNAL_DIR = 'dbs_journal'                 #The journal directory, next to the database
+RECORD_HEADER = struct.Struct('!II')        #body length, CRC-32 of the body
+SEGMENT_SIZE = 64 * 1024 * 1024             #A new segment file is started after this many bytes
+DRAIN_BATCH = 2000                          #Most journal entries loaded in one transaction
+DRAIN_WINDOW = 0.05                         #Seconds the drainer waits to gather a bigger transaction
+DRAIN_RETRY = 1.0                           #Seconds before a failed load is tried again
+DRAIN_BUSY_TIMEOUT = 30.0                   #Seconds the drainer waits for the database write lock
+NUMBERS_AHEAD = 20 * server.NUMBER_BLOCK_SIZE   #Application numbers kept reserved ahead of the journal
+NUMBERS_LOW = NUMBERS_AHEAD // 2            #The reserver tops them up when fewer are left
+
+JOURNAL_INSERT_SQL = (
+    "INSERT INTO applications ("
+    "application_number, name, address, qualifications, course, start_year, start_month, name_key, submission_date"
+    ") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+sync = getattr(os, 'fdatasync', os.fsync)   #Only the data has to reach the disk, not the file times
+
+def submission_time(created):               #The time an entry was acknowledged, in the format of CURRENT_TIMESTAMP
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(created))
+
+def encode_record(entry):
+    body = json.dumps(entry, separators=(',', ':')).encode('utf-8')
+    return RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+def read_segment(path):     #The entries of one segment file and how many bytes of it are whole records
+    with open(path, 'rb') as segment:
+        data = segment.read()
+    entries = []
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        body = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            break
+        try:
+            entries.append(json.loads(body.decode('utf-8')))
+        except ValueError:
+            break
+        offset += RECORD_HEADER.size + length
+    return entries, offset, len(data)
+
+
+#Step 1: The journal files
+
+class Journal:              #Segment files named after their first sequence number, appended in order
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.closed = []                    #(path, last sequence number) of the full segments still on disk
+        self.file = None
+        self.size = 0
+        self.last_seq = 0
+        self.lock = threading.Lock()        #Appends come from the journal thread, deletes from the drainer
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, drained_seq):            #Reads the existing segments, returns the entries after drained_seq
+        entries = []
+        self.last_seq = drained_seq
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith('journal-') and name.endswith('.log')):
+                continue
+            path = os.path.join(self.directory, name)
+            segment_entries, good, size = read_segment(path)
+            if good < size:                 #A torn write from a crash, cut it off so the file ends on a record
+                log.warning("[JOURNAL] Incomplete record at the end of a segment dropped",
+                            extra={'fields': {'segment': name, 'bytes': size - good}})
+                with open(path, 'r+b') as segment:
+                    segment.truncate(good)
+            last = segment_entries[-1]['seq'] if segment_entries else 0
+            self.closed.append((path, last))
+            self.last_seq = max(self.last_seq, last)
+            entries.extend(entry for entry in segment_entries if entry['seq'] > drained_seq)
+        self._start_segment()
+        return entries
+
+    def _start_segment(self):
+        path = os.path.join(self.directory, f"journal-{self.last_seq + 1:012d}.log")
+        self.closed = [segment for segment in self.closed if segment[0] != path]   #Left empty by a crash
+        self.file = open(path, 'ab', buffering=0)   #Unbuffered, so a failed append leaves nothing behind to flush
+        if self.file.tell():                #Only bytes of failed appends: every acknowledged entry is before this number
+            os.ftruncate(self.file.fileno(), 0)
+        self.size = 0
+        self.path = path
+        if hasattr(os, 'O_DIRECTORY'):      #Make the new file itself durable
+            directory = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+    def append(self, entries):              #Writes entries and returns once they are on disk
+        data = memoryview(b''.join(encode_record(entry) for entry in entries))
+        with self.lock:
+            if self.file is None:           #The last append failed, carry on in a new segment
+                self._start_segment()
+            try:
+                written = 0
+                while written < len(data):
+                    written += self.file.write(data[written:])
+                sync(self.file.fileno())
+            except Exception:
+                self._seal_failed()
+                raise
+            self.size += len(data)
+            self.last_seq = entries[-1]['seq']
+            if self.size >= self.segment_size:
+                self.file.close()
+                self.closed.append((self.path, self.last_seq))
+                self._start_segment()
+
+    def _seal_failed(self):                 #Cuts off a failed append and closes the segment, so nothing is written after it
+        try:
+            os.ftruncate(self.file.fileno(), self.size)
+        except OSError:
+            pass                            #Replay stops at the bad record, and nothing follows it
+        try:
+            self.file.close()
+        except OSError:
+            pass
+        if self.size:                       #An empty one is reused by the next segment
+            self.closed.append((self.path, self.last_seq))
+        self.file = None
+
+    def release(self, drained_seq):         #Deletes the full segments whose entries are all in the database
+        with self.lock:
+            done = [segment for segment in self.closed if segment[1] <= drained_seq]
+            self.closed = [segment for segment in self.closed if segment[1] > drained_seq]
+        for path, _ in done:
+            try:
+                os.remove(path)
+            except OSError as e:
+                log.warning("[JOURNAL] Could not delete a drained segment", extra={'fields': {'error': repr(e)}})
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+
+
+#Step 2: The writer that acknowledges from the journal
+
+class JournalWriter(server.ApplicationWriter):   #Same interface as ApplicationWriter, the futures resolve once journaled
+
+    def __init__(self, db_file=server.DB_FILE, directory=JOURNAL_DIR, batch_size=server.BATCH_SIZE,
+                 flush_window=server.FLUSH_WINDOW, drain_batch=DRAIN_BATCH, drain_window=DRAIN_WINDOW):
+        self.drain_batch = drain_batch
+        self.drain_window = drain_window
+        self.drain_queue = queue.Queue()  #Lists of journaled entries in sequence order, None to stop
+        self.lock = threading.Lock()      #Guards the two maps below, shared by the journal thread and the drainer
+        self.undrained = {}               #application number -> entry, for entries not in the database yet
+        self.undrained_keys = {}          #request key -> (application number, fingerprint), the same
+        self.available = deque()          #Reserved application numbers not given out yet
+        self.reserver = server.ApplicationNumbers()   #Used by the reserver thread to reserve them
+        self.numbers_ready = threading.Condition()
+        self.reserve_wanted = 0           #How many numbers the journal thread asked the reserver thread for
+        self.reserver_stopping = False
+
+        #Replay what the last run journaled but did not load, before anything new is accepted
+        connection = sqlite3.connect(db_file, isolation_level=None)
+        try:
+            connection.execute("CREATE TABLE IF NOT EXISTS journal_state(name TEXT PRIMARY KEY, drained_seq INTEGER NOT NULL)")
+            connection.execute("INSERT OR IGNORE INTO journal_state (name, drained_seq) VALUES ('journal', 0)")
+            drained_seq = connection.execute("SELECT drained_seq FROM journal_state WHERE name = 'journal'").fetchone()[0]
+            self.journal = Journal(directory)
+            replayed = self.journal.open(drained_seq)
+            self.journal.release(drained_seq)
+            self.next_seq = self.journal.last_seq + 1
+            self._reserve(connection, NUMBERS_AHEAD)
+        finally:
+            connection.close()
+        if replayed:
+            log.info("[JOURNAL] Replaying entries not yet in the database", extra={'fields': {'entries': len(replayed)}})
+            self._track(replayed)
+            self.drain_queue.put(replayed)
+
+        super().__init__(db_file, batch_size, flush_window)
+        self.drainer = threading.Thread(target=self._drain_run, name='dbs-drainer', daemon=True)
+        self.drainer.start()
+        self.numbers_thread = threading.Thread(target=self._reserve_run, name='dbs-numbers', daemon=True)
+        self.numbers_thread.start()
+
+    def close(self):                      #Journals what is queued, then loads everything journaled, then stops
+        super().close()
+        self.drain_queue.put(None)
+        self.drainer.join()
+        with self.numbers_ready:
+            self.reserver_stopping = True
+            self.numbers_ready.notify_all()
+        self.numbers_thread.join()
+        self.journal.close()
+
+    def pending_application(self, app_number):   #The status of an acknowledged application the drainer has not loaded yet
+        with self.lock:
+            entry = self.undrained.get(str(app_number).strip().upper())
+        if entry is None:
+            return None
+        data = entry['application']
+        return {'application_number': entry['number'], 'name': data['name'], 'course': data['course'],
+                'start_year': data['start_year'], 'start_month': data['start_month'],
+                'submission_date': submission_time(entry['created'])}
+
+    def _track(self, entries):            #Entries now in the journal but not in the database
+        with self.lock:
+            for entry in entries:
+                self.undrained[entry['number']] = entry
+                if entry['key'] is not None:
+                    self.undrained_keys[entry['key']] = (entry['number'], entry['fingerprint'])
+        journal_backlog.inc(len(entries))
+
+    #Runs on the journal thread (ApplicationWriter._run), the connection is only read from here
+
+    def _find_key(self, cursor, key, fingerprint, now, claimed):   #The number already given to a request key, or None
+        with self.lock:
+            entry = claimed.get(key) or self.undrained_keys.get(key)
+        if entry is None:
+            return self.keys.find(cursor, key, fingerprint, now)
+        if entry[1] != fingerprint:
+            raise ValueError("request_key was already used for a different application")
+        return entry[0]
+
+    def _take_numbers(self, count):       #count reserved numbers, asking the reserver thread for more in good time
+        with self.numbers_ready:
+            while len(self.available) < count:   #Only when the database kept the reserver out for too long
+                #Asked again each time round, a reservation made meanwhile may have been too small
+                self._want_numbers(count - len(self.available) + NUMBERS_AHEAD)
+                self.numbers_ready.wait()
+            numbers = [self.available.popleft() for _ in range(count)]
+            if len(self.available) < NUMBERS_LOW:
+                self._want_numbers(NUMBERS_AHEAD - len(self.available))
+            return numbers
+
+    def _want_numbers(self, count):       #Asks the reserver thread for at least count more numbers, called holding numbers_ready
+        self.reserve_wanted = max(self.reserve_wanted, count)
+        self.numbers_ready.notify_all()   #Wakes the reserver thread up
+
+    def _journal_entries(self, cursor, applications, keys, now, claimed):   #Numbers and journal entries for one job
+        app_numbers = [None] * len(applications)
+        fingerprints = {}
+        for i, (data, key) in enumerate(zip(applications, keys)):
+            if key is not None:
+                fingerprints[i] = server.application_fingerprint(data)
+                app_numbers[i] = self._find_key(cursor, key, fingerprints[i], now, claimed)
+        new = [i for i, app_number in enumerate(app_numbers) if app_number is None]
+        entries = []
+        for i, app_number in zip(new, self._take_numbers(len(new))):
+            app_numbers[i] = app_number
+            entries.append({'number': app_number, 'application': applications[i],
+                            'key': keys[i], 'fingerprint': fingerprints.get(i), 'created': now})
+            if keys[i] is not None:
+                claimed[keys[i]] = (app_number, fingerprints[i])
+        return app_numbers, entries
+
+    def _write(self, connection, batch):  #Journals one group of jobs with a single fsync, then answers them
+        cursor = connection.cursor()
+        now = time.time()
+        claimed = {}                      #Request keys given a number earlier in this group
+        entries = []
+        results = []
+        for applications, keys, future, single in batch:
+            try:
+                app_numbers, job_entries = self._journal_entries(cursor, applications, keys, now, claimed)
+            except Exception as e:        #A bad job only fails its own caller
+                future.set_exception(e)
+                continue
+            entries.extend(job_entries)
+            results.append((future, single, app_numbers, len(job_entries)))
+
+        if entries:
+            for seq, entry in enumerate(entries, self.next_seq):
+                entry['seq'] = seq
+            started = time.perf_counter()
+            try:
+                self.journal.append(entries)
+            except Exception as e:
+                log.error("[JOURNAL] Append failed", extra={'fields': {'error': repr(e)}})
+                errors_total.inc(1, 'journal')
+                for future, *_ in results:
+                    future.set_exception(e)
+                return
+            self.next_seq += len(entries)  #Only once they are on disk, a failed group's sequence numbers are given out again
+            journal_sync_seconds.observe(time.perf_counter() - started)
+            self._track(entries)
+            self.drain_queue.put(entries)
+
+        repeated = sum(len(app_numbers) - new for _, _, app_numbers, new in results)
+        if repeated:
+            duplicates_total.inc(repeated)
+        for future, single, app_numbers, _ in results:
+            future.set_result(app_numbers[0] if single else app_numbers)
+        log.debug("[JOURNAL] Journaled applications", extra={'fields': {'rows': len(entries), 'repeated': repeated,
+                                                                         'jobs': len(batch)}})
+
+    #Runs on the reserver thread, which has a connection of its own so it never waits behind a load
+
+    def _reserve(self, connection, count):   #Reserves numbers in a transaction of its own and makes them available
+        with self.numbers_ready:
+            count = max(count, self.reserve_wanted)   #At least the largest amount asked for so far
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            reserved = self.reserver.take(connection.cursor(), count)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.rollback()
+            self.reserver.reset()         #The block reservation was rolled back too
+            raise
+        with self.numbers_ready:
+            self.available.extend(reserved)
+            if self.reserve_wanted <= count:  #Otherwise more was asked for meanwhile, the reserver goes again
+                self.reserve_wanted = 0
+            self.numbers_ready.notify_all()
+
+    def _reserve_run(self):
+        connection = self._connect()
+        connection.execute(f"PRAGMA busy_timeout = {int(DRAIN_BUSY_TIMEOUT * 1000)}")
+        try:
+            while True:
+                with self.numbers_ready:
+                    while not (self.reserve_wanted or self.reserver_stopping):
+                        self.numbers_ready.wait()
+                    if self.reserver_stopping:
+                        return
+                    wanted = self.reserve_wanted
+                try:
+                    self._reserve(connection, wanted)
+                except Exception as e:   #The journal thread keeps using the numbers it has meanwhile
+                    log.error("[JOURNAL] Reserving application numbers failed, retrying",
+                              extra={'fields': {'error': repr(e)}})
+                    errors_total.inc(1, 'database')
+                    time.sleep(DRAIN_RETRY)
+        finally:
+            connection.close()
+
+    #Runs on the drainer thread, which loads the journal into the database
+
+    def _gather(self):                    #Up to drain_batch entries arriving within the drain window, and whether to stop
+        entries = []
+        item = self.drain_queue.get()
+        deadline = time.monotonic() + self.drain_window
+        while item is not None:
+            entries.extend(item)
+            if len(entries) >= self.drain_batch:
+                break                     #A full transaction
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.drain_queue.get(timeout=remaining) if remaining > 0 else self.drain_queue.get_nowait()
+            except queue.Empty:
+                break
+        return entries, item is None
+
+    def _load(self, connection, entries):   #Loads entries, their request keys and the drained position in one transaction
+        started = time.perf_counter()
+        cursor = connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.executemany(JOURNAL_INSERT_SQL, [
+                server.insert_row(entry['number'], entry['application']) + (submission_time(entry['created']),)
+                for entry in entries])
+            cursor.executemany(server.KEY_INSERT_SQL, [
+                (entry['key'], entry['number'], entry['fingerprint'], entry['created'])
+                for entry in entries if entry['key'] is not None])
+            cursor.execute("UPDATE journal_state SET drained_seq = ? WHERE name = 'journal'", (entries[-1]['seq'],))
+            self.keys.prune(cursor, time.time())
+            cursor.execute("COMMIT")
+        except Exception:
+            connection.rollback()
+            raise
+        db_commit_seconds.observe(time.perf_counter() - started)
+        db_group_rows.observe(len(entries))
+        db_rows_total.inc(len(entries))
+
+    def _drained(self, entries):          #Entries are in the database: forget them and delete finished segments
+        numbers = [entry['number'] for entry in entries]
+        applications_inserted(numbers)
+        with self.lock:
+            for entry in entries:
+                self.undrained.pop(entry['number'], None)
+                if entry['key'] is not None:
+                    self.undrained_keys.pop(entry['key'], None)
+        journal_backlog.dec(len(entries))
+        self.journal.release(entries[-1]['seq'])
+
+    def _drain_run(self):
+        connection = self._connect()
+        connection.execute(f"PRAGMA busy_timeout = {int(DRAIN_BUSY_TIMEOUT * 1000)}")
+        stopping = False
+        try:
+            while not stopping:
+                entries, stopping = self._gather()
+                while True:
+                    try:
+                        if entries:
+                            self._load(connection, entries)
+                            self._drained(entries)
+                        break
+                    except Exception as e:   #Nothing is lost, the entries stay in the journal
+                        log.error("[JOURNAL] Loading into the database failed, retrying",
+                                  extra={'fields': {'error': repr(e), 'entries': len(entries)}})
+                        errors_total.inc(1, 'database')
+                        if stopping:
+                            log.warning("[JOURNAL] Entries left in the journal for the next start",
+                                        extra={'fields': {'entries': len(entries)}})
+                            break
+                        time.sleep(DRAIN_RETRY)
+        finally:
+            connection.close()
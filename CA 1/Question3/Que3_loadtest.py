@@ -0,0 +1,368 @@
+#Que3_loadtest.py
+#This is the load generator and benchmark for the application server
+
+#It starts Que3_server.py on a free port with a fresh database, drives it with many concurrent
+#asyncio clients sending made-up applications, then reports throughput, latency percentiles,
+#errors and how many rows reached the database. The results are saved as JSON and can be
+#checked against an earlier run to catch regressions:
+#
+#   python Que3_loadtest.py --clients 50 --requests 200
+#   python Que3_loadtest.py --batch 50 --output batch.json
+#   python Que3_loadtest.py --baseline loadtest_results.json     #Exit status 1 if slower than the baseline
+#   python Que3_loadtest.py --no-server --port 65432 --db dbs_applications.db   #Against a server already running
+
+#Importing necessary modules
+import asyncio              #Every simulated client is a coroutine
+import argparse             #For the command line options
+import json                 #To save and compare results
+import os                   #For paths and the platform check
+import random               #To make up applications
+import signal               #To stop the server with Ctrl+C
+import socket               #To find a free port and wait for the server
+import sqlite3              #To count the rows that reached the database
+import subprocess           #To start the server
+import sys                  #For the exit status and the Python executable
+import tempfile             #The server runs in its own directory with a fresh database
+import time                 #To measure latency and throughput
+from collections import Counter, deque
+from datetime import datetime, timezone
+from Que3_validation import COURSES, MONTHS, FIRST_YEAR, LAST_YEAR   #So every made-up application is valid
+from Que3_protocol import ENCODING_JSON, ProtocolError, encode_frame, read_frame_async   #The framed wire protocol
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Que3_server.py')
+DB_NAME = 'dbs_applications.db'     #The server's database file name, inside its working directory
+HOST = '127.0.0.1'
+CLIENTS = 20                        #Concurrent client connections
+REQUESTS = 100                      #Messages each client sends
+WINDOW = 1                          #Messages a client sends ahead of their responses
+RESULTS_FILE = 'loadtest_results.json'
+TOLERANCE = 0.20                    #How much worse than the baseline counts as a regression
+MAX_RETRIES = 8                     #Times a client reconnects after being told the server is busy
+RETRY_BASE_DELAY = 0.1              #Seconds, doubled for every retry, with full jitter
+RETRY_MAX_DELAY = 2.0
+
+
+#Step 1: Made-up applications
+
+FIRST_NAMES = ['Aoife', 'Sean', 'Niamh', 'Conor', 'Priya', 'Wei', 'Maria', 'Liam', 'Fatima', 'Oisin']
+LAST_NAMES = ['Murphy', 'Kelly', 'Byrne', 'Sharma', 'Chen', 'Garcia', 'Walsh', 'Nowak', 'Okafor', 'Ryan']
+STREETS = ['Main Street', 'Dame Street', 'Camden Street', 'Aungier Street', 'Grafton Street']
+QUALIFICATIONS = ['BSc Computing', 'BA Business', 'BEng Electronics', 'BSc Mathematics', 'HDip Data Analytics']
+
+def make_application(rng):          #One valid application with random details
+    return {
+        'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        'address': f"{rng.randint(1, 250)} {rng.choice(STREETS)}, Dublin",
+        'qualifications': rng.choice(QUALIFICATIONS),
+        'course': rng.choice(list(COURSES)),
+        'start_year': rng.randint(FIRST_YEAR + 1, LAST_YEAR),
+        'start_month': rng.choice(MONTHS),
+    }
+
+def make_message(rng, batch):       #A submit message, or a batch message of that many applications
+    if batch:
+        return {'type': 'batch', 'applications': [make_application(rng) for _ in range(batch)]}
+    return {'type': 'submit', 'application': make_application(rng)}
+
+
+#Step 2: The simulated clients
+
+class LoadResults:                  #What every client saw, gathered in one place
+
+    def __init__(self):
+        self.latencies = []         #Seconds from sending a message to its response
+        self.messages = 0
+        self.applications = 0       #Applications the server accepted
+        self.retries = 0            #Connections retried after the server turned them away
+        self.errors = Counter()     #Error message -> how many times
+
+    def error(self, message, count=1):
+        self.errors[message] += count
+
+async def run_client(client_id, host, port, requests, window, batch, seed, results):   #One client sending requests messages
+    rng = random.Random(f"{seed}:{client_id}")
+    answered = 0
+    retries = 0
+    while answered < requests:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError as e:
+            results.error(f"Connect failed: {e.__class__.__name__}", requests - answered)
+            return
+
+        in_flight = deque()         #(request id, time sent), the server answers in order
+        first = sent = answered     #Requests answered before this connection
+        turned_away = None          #Why the server would not serve this connection, if it would not
+        try:
+            while sent < requests or in_flight:
+                #Keep the window full, then wait for the oldest answer
+                while sent < requests and len(in_flight) < window:
+                    sent += 1
+                    writer.write(encode_frame(dict(make_message(rng, batch), id=sent), ENCODING_JSON))
+                    in_flight.append((sent, time.perf_counter()))
+                await writer.drain()
+
+                frame = await read_frame_async(reader)
+                if frame is None:
+                    raise ProtocolError("Server closed the connection")
+                response, _ = frame
+                if response.get('status') == 'busy':
+                    turned_away = response
+                    break
+                request_id, sent_at = in_flight.popleft()
+                results.latencies.append(time.perf_counter() - sent_at)
+                results.messages += 1
+                answered += 1
+                if response.get('id') != request_id:
+                    raise ProtocolError(f"Response for request {response.get('id')} arrived, expected {request_id}")
+
+                if batch:
+                    numbers = response.get('application_numbers') or []
+                    accepted = sum(1 for number in numbers if number)
+                    results.applications += accepted
+                    if accepted < batch:
+                        results.error(response.get('message', 'Batch partly failed'), batch - accepted)
+                elif response.get('status') == 'success':
+                    results.applications += 1
+                else:
+                    results.error(response.get('message', 'Unknown error'))
+
+        except (OSError, ProtocolError, asyncio.IncompleteReadError) as e:
+            if answered > first:
+                #Some requests were answered, the rest may or may not have been processed
+                results.error(f"Connection failed: {e}", requests - answered)
+                return
+            turned_away = {'message': f"Connection failed: {e}"}     #Closed before serving anything
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+        if turned_away is None:
+            return
+        #Turned away (or dropped before any answer): wait with backoff and jitter, then try again
+        retries += 1
+        results.retries += 1
+        if retries > MAX_RETRIES:
+            results.error(turned_away.get('message', 'Server busy'), requests - answered)
+            return
+        delay = rng.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (retries - 1)))
+        await asyncio.sleep(max(turned_away.get('retry_after', 0), delay))
+
+async def drive(host, port, clients, requests, window, batch, seed):   #Runs every client at once, returns (results, seconds)
+    results = LoadResults()
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(client_id, host, port, requests, window, batch, seed, results)
+                           for client_id in range(clients)))
+    return results, time.perf_counter() - started
+
+
+#Step 3: Starting and stopping the server
+
+def free_port(host=HOST):           #A port nothing is listening on
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+def wait_for_server(process, host, port, timeout=15.0):   #Waits until the server accepts connections
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode} before it was ready")
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server did not start listening on {host}:{port} within {timeout:.0f} s")
+
+def start_server(workdir, host, port, server_args=()):    #Starts Que3_server.py in workdir, its output goes to server.log
+    log = open(os.path.join(workdir, 'server.log'), 'w', encoding='utf-8')
+    process = subprocess.Popen([sys.executable, SERVER_SCRIPT, '--host', host, '--port', str(port), *server_args],
+                               cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    log.close()                     #The server keeps its own handle
+    try:
+        wait_for_server(process, host, port)
+    except RuntimeError:
+        stop_server(process)
+        raise
+    return process
+
+def stop_server(process, timeout=15.0):   #Ctrl+C, so the writer commits what is queued, then kill if it hangs
+    if process.poll() is not None:
+        return
+    if os.name == 'nt':
+        process.terminate()
+    else:
+        process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def count_rows(db_file):            #Applications in the database, 0 if it does not exist yet
+    if not os.path.exists(db_file):
+        return 0
+    connection = sqlite3.connect(db_file)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM applications").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        connection.close()
+
+
+#Step 4: The report
+
+def percentile(sorted_values, q):  #Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(q * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+def summarise(config, results, elapsed, rows_before, rows_after):   #The JSON result of one run
+    latencies = sorted(results.latencies)
+    milliseconds = lambda value: round(value * 1000, 3) if value is not None else None
+    inserted = rows_after - rows_before if rows_after is not None else None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': config,
+        'elapsed_s': round(elapsed, 3),
+        'messages': results.messages,
+        'applications': results.applications,
+        'errors': sum(results.errors.values()),
+        'busy_retries': results.retries,
+        'error_messages': dict(results.errors.most_common()),
+        'throughput': {
+            'messages_per_s': round(results.messages / elapsed, 1) if elapsed else 0,
+            'applications_per_s': round(results.applications / elapsed, 1) if elapsed else 0,
+        },
+        'latency_ms': {
+            'p50': milliseconds(percentile(latencies, 0.50)),
+            'p95': milliseconds(percentile(latencies, 0.95)),
+            'p99': milliseconds(percentile(latencies, 0.99)),
+            'max': milliseconds(latencies[-1] if latencies else None),
+            'mean': milliseconds(sum(latencies) / len(latencies) if latencies else None),
+        },
+        'database': {
+            'rows_before': rows_before,
+            'rows_after': rows_after,
+            'rows_inserted': inserted,
+            'matches_accepted': inserted == results.applications if inserted is not None else None,
+        },
+    }
+
+def print_summary(summary):
+    config = summary['config']
+    latency = summary['latency_ms']
+    database = summary['database']
+    print("\n" + "=" * 60)
+    print("DBS APPLICATION SERVER - LOAD TEST")
+    print("=" * 60)
+    mode = f"batches of {config['batch']}" if config['batch'] else "single submits"
+    print(f" Clients:         {config['clients']} x {config['requests']} messages ({mode}, window {config['window']})")
+    print(f" Time:            {summary['elapsed_s']:.2f} s")
+    print(f" Messages:        {summary['messages']} ({summary['throughput']['messages_per_s']:.0f}/s)")
+    print(f" Applications:    {summary['applications']} ({summary['throughput']['applications_per_s']:.0f}/s)")
+    if latency['p50'] is not None:
+        print(f" Latency (ms):    p50 {latency['p50']:.2f}   p95 {latency['p95']:.2f}   "
+              f"p99 {latency['p99']:.2f}   max {latency['max']:.2f}")
+    print(f" Errors:          {summary['errors']}   (busy retries: {summary['busy_retries']})")
+    for message, count in summary['error_messages'].items():
+        print(f"   {count:>6} x {message}")
+    if database['rows_after'] is not None:
+        check = "matches" if database['matches_accepted'] else "DOES NOT MATCH"
+        print(f" Database rows:   {database['rows_before']} -> {database['rows_after']} "
+              f"(+{database['rows_inserted']}, {check} the accepted applications)")
+    print("=" * 60)
+
+def compare(summary, baseline, tolerance=TOLERANCE):   #Returns the ways this run is worse than the baseline
+    regressions = []
+    old, new = baseline['throughput']['applications_per_s'], summary['throughput']['applications_per_s']
+    if old and new < old * (1 - tolerance):
+        regressions.append(f"throughput {new:.0f}/s is below the baseline {old:.0f}/s")
+    for name in ('p50', 'p95', 'p99'):
+        old, new = baseline['latency_ms'].get(name), summary['latency_ms'].get(name)
+        if old and new is not None and new > old * (1 + tolerance):
+            regressions.append(f"{name} latency {new:.2f} ms is above the baseline {old:.2f} ms")
+    if summary['errors'] > baseline.get('errors', 0):
+        regressions.append(f"{summary['errors']} errors, the baseline had {baseline.get('errors', 0)}")
+    if summary['database']['matches_accepted'] is False:
+        regressions.append("the database row count does not match the accepted applications")
+    return regressions
+
+
+#Step 5: Main Program
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the DBS application server")
+    parser.add_argument('--clients', type=int, default=CLIENTS, help="concurrent connections")
+    parser.add_argument('--requests', type=int, default=REQUESTS, help="messages sent by each client")
+    parser.add_argument('--window', type=int, default=WINDOW, help="messages pipelined per connection")
+    parser.add_argument('--batch', type=int, default=0, help="applications per batch message (0: single submits)")
+    parser.add_argument('--seed', default='0', help="seed for the made-up applications")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=None, help="server port (default: a free port)")
+    parser.add_argument('--no-server', action='store_true', help="use a server that is already running")
+    parser.add_argument('--db', default=None, help="database to count rows in (default: the started server's)")
+    parser.add_argument('--workdir', default=None, help="directory the server runs in (default: a new temporary one)")
+    parser.add_argument('--server-arg', action='append', default=[], metavar='ARG',
+                        help="extra option passed to Que3_server.py, e.g. --server-arg=--batch-size=128")
+    parser.add_argument('--output', default=RESULTS_FILE, help="JSON file for the results (default: %(default)s)")
+    parser.add_argument('--baseline', default=None, help="earlier results to compare against")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    #Read the baseline first, so a bad path fails before the run rather than after it
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    process = None
+    db_file = args.db
+    if args.no_server:
+        port = args.port or 65432
+    else:
+        port = args.port or free_port(args.host)
+        workdir = args.workdir or tempfile.mkdtemp(prefix='dbs-loadtest-')
+        os.makedirs(workdir, exist_ok=True)
+        db_file = db_file or os.path.join(workdir, DB_NAME)
+        print(f"[LOAD] Starting server on {args.host}:{port} in {workdir}")
+        process = start_server(workdir, args.host, port, args.server_arg)
+
+    try:
+        rows_before = count_rows(db_file) if db_file else None
+        print(f"[LOAD] {args.clients} clients x {args.requests} messages...")
+        results, elapsed = asyncio.run(drive(args.host, port, args.clients, args.requests,
+                                             max(1, args.window), args.batch, args.seed))
+    finally:
+        if process is not None:
+            stop_server(process)    #Rows are counted after the writer has committed everything
+
+    rows_after = count_rows(db_file) if db_file else None
+    config = {'clients': args.clients, 'requests': args.requests, 'window': max(1, args.window),
+              'batch': args.batch, 'seed': args.seed, 'server_args': args.server_arg}
+    summary = summarise(config, results, elapsed, rows_before, rows_after)
+    print_summary(summary)
+
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, indent=2)
+    print(f"[LOAD] Results saved to {args.output}")
+
+    if baseline is not None:
+        if baseline.get('config') != config:
+            print(f"[LOAD] Note: {args.baseline} was run with different options, the comparison may not be fair")
+        regressions = compare(summary, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        if regressions:
+            return 1
+        print(f"[LOAD] No regressions against {args.baseline}")
+    return 0 if summary['errors'] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+#Que3_metrics.py
+#This is the server's logging setup and its in-process metrics
+
+#Logging: every log call only puts the record on a queue (QueueHandler); a listener thread
+#formats it and writes it to the console, so a slow terminal never holds up a client.
+#Records can be plain text or one JSON object per line, and the level is chosen at startup.
+#
+#Metrics: counters, gauges and histograms kept in memory and updated on the hot path under a
+#small lock. They are read with the 'stats' message or, if the server is started with
+#--metrics-port, from http://host:port/metrics in the Prometheus text format.
+
+#Importing necessary modules
+import json                 #For JSON log lines and the stats snapshot
+import logging              #The standard logging package
+import logging.handlers     #QueueHandler and QueueListener
+import queue                #The queue between the log calls and the listener thread
+import socket               #For MSG_PEEK
+import sys                  #Logs go to the console by default
+import threading            #Metric updates come from many worker threads
+import time                 #For the log timestamps
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger('dbs')             #The logger the server writes to
+
+LOG_FORMATS = ['text', 'json']
+LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+
+
+#Step 1: Logging
+
+class TextFormatter(logging.Formatter):   #"time LEVEL message key=value ..."
+    def format(self, record):
+        line = f"{self.formatTime(record, '%H:%M:%S')}.{int(record.msecs):03d} {record.levelname:<7} {record.getMessage()}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+class JsonFormatter(logging.Formatter):   #One JSON object per record, with the extra fields as keys
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def setup_logging(level='INFO', log_format='text', stream=None):   #Sends the 'dbs' log through a queue, returns the listener to stop at shutdown
+    records = queue.SimpleQueue()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+    listener = logging.handlers.QueueListener(records, output)
+
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(logging.handlers.QueueHandler(records))
+    log.setLevel(level)
+    log.propagate = False
+    listener.start()
+    return listener
+
+
+#Step 2: Metric types
+
+class Counter:                             #A number that only goes up, optionally split by labels
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):                     #(name, labels, value) for the Prometheus text
+        with self.lock:
+            values = dict(self.values)
+        if not values and not self.labels:
+            values = {(): 0}
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in sorted(values.items())]
+
+    def snapshot(self):
+        with self.lock:
+            if not self.labels:
+                return self.values.get((), 0)
+            return {",".join(key): value for key, value in sorted(self.values.items())}
+
+class Gauge(Counter):                      #A number that goes up and down, such as open connections
+
+    kind = 'gauge'
+
+    def dec(self, amount=1, *label_values):
+        self.inc(-amount, *label_values)
+
+class Histogram:                           #Counts observations into buckets, plus their sum and count
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)     #The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            samples.append((self.name + '_bucket', {'le': '+Inf' if bound == float('inf') else repr(bound)}, cumulative))
+        samples.append((self.name + '_sum', {}, total))
+        samples.append((self.name + '_count', {}, count))
+        return samples
+
+    def quantile(self, q, counts=None, count=None):   #Upper bound of the bucket holding the q-th observation
+        if counts is None:
+            with self.lock:
+                counts, count = list(self.counts), self.count
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        return {
+            'count': count,
+            'sum': round(total, 6),
+            'mean': round(total / count, 6) if count else None,
+            'p50': self.quantile(0.50, counts, count),
+            'p95': self.quantile(0.95, counts, count),
+            'p99': self.quantile(0.99, counts, count),
+        }
+
+class Registry:                            #Every metric the server keeps, in the order they are shown
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self):                    #A JSON-friendly dictionary, used by the stats message
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def prometheus(self):                  #The Prometheus text exposition format
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+#Step 3: The server's metrics
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROW_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+registry = Registry()
+requests_total = registry.add(Counter('dbs_requests_total', "Requests handled, by message type", ['type']))
+errors_total = registry.add(Counter('dbs_errors_total', "Errors, by kind", ['kind']))
+request_latency = registry.add(Histogram('dbs_request_latency_seconds',
+                                         "Time from a request being read to its response being sent", LATENCY_BUCKETS))
+accept_latency = registry.add(Histogram('dbs_accept_to_response_seconds',
+                                        "Time from accepting a connection to sending its first response", LATENCY_BUCKETS))
+db_commit_seconds = registry.add(Histogram('dbs_db_commit_seconds',
+                                           "Time the writer spends inserting and committing one group", LATENCY_BUCKETS))
+db_group_rows = registry.add(Histogram('dbs_db_group_rows', "Applications committed in one transaction", ROW_BUCKETS))
+db_rows_total = registry.add(Counter('dbs_db_rows_total', "Applications committed"))
+bytes_received = registry.add(Counter('dbs_bytes_received_total', "Bytes read from clients"))
+bytes_sent = registry.add(Counter('dbs_bytes_sent_total', "Bytes sent to clients"))
+connections_total = registry.add(Counter('dbs_connections_total', "Connections accepted"))
+active_connections = registry.add(Gauge('dbs_active_connections', "Connections being served right now"))
+rejected_total = registry.add(Counter('dbs_rejected_total', "Connections turned away because the server was busy"))
+timeouts_total = registry.add(Counter('dbs_timeouts_total', "Connections closed by a deadline, by kind", ['kind']))
+duplicates_total = registry.add(Counter('dbs_duplicate_submissions_total',
+                                        "Submissions answered with the number already given to their request key"))
+journal_sync_seconds = registry.add(Histogram('dbs_journal_sync_seconds',
+                                              "Time to append and fsync one group of journal entries", LATENCY_BUCKETS))
+journal_backlog = registry.add(Gauge('dbs_journal_backlog',
+                                     "Applications acknowledged from the journal but not yet in the database"))
+
+
+class MeteredSocket:                       #Wraps a client socket and counts the bytes going each way
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def recv(self, size, flags=0):
+        data = self.sock.recv(size, flags)
+        if not flags & socket.MSG_PEEK:    #Peeked bytes are counted when they are really read
+            bytes_received.inc(len(data))
+        return data
+
+    def sendall(self, data):
+        self.sock.sendall(data)
+        bytes_sent.inc(len(data))
+
+    def fileno(self):                      #So select() works on the wrapper
+        return self.sock.fileno()
+
+    def __getattr__(self, name):           #Everything else goes straight to the socket
+        return getattr(self.sock, name)
+
+
+#Step 4: The optional Prometheus endpoint
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  #Scrapes are not worth a log line each
+        pass
+
+def start_metrics_server(host, port):      #Serves /metrics on a background thread, returns the HTTP server to shut down
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='dbs-metrics', daemon=True).start()
+    return server
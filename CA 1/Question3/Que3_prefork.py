@@ -0,0 +1,314 @@
+#Que3_prefork.py
+#This is the pre-fork mode of the server: several server processes sharing one port
+
+#A single server process decodes, validates and answers every request on one core, because of the GIL.
+#In pre-fork mode a supervisor starts:
+#   workers  - N processes, each running the normal accept loop (Que3_server.accept_clients) on its
+#              own socket bound to the same host and port with SO_REUSEPORT, so the kernel shares the
+#              connections out between them. Where SO_REUSEPORT does not exist the supervisor binds
+#              one socket and every worker accepts from that inherited socket instead.
+#   writer   - one process owning the only write connection to the database (an ApplicationWriter,
+#              or with --journal a JournalWriter, see Que3_journal.py).
+#              Workers send it their applications over a local connection and get the numbers back,
+#              so they never fight over SQLite's write lock and request keys stay in one place.
+#              It tells every worker which numbers it has inserted, to keep their lookup caches right.
+#              Reads (status, lists, search) are still done by each worker on its own connections.
+#The supervisor starts a worker again when one dies. On Ctrl+C it stops the workers (each one
+#finishes the clients it has already accepted), then the writer, which commits what is still queued.
+#Each process keeps its own metrics: with --metrics-port P, worker i serves them on P + i and the
+#writer on P + N.
+
+#Importing necessary modules
+import os                   #For the writer connection's key
+import signal               #Workers and the writer are stopped with SIGTERM, Ctrl+C goes to the supervisor
+import socket               #To check whether SO_REUSEPORT exists
+import threading            #Each worker connection in the writer has its own thread
+import time                 #For the restart delay
+import multiprocessing
+from itertools import count
+from multiprocessing.connection import Listener, Client, wait
+from concurrent.futures import Future
+import Que3_server as server
+from Que3_queries import applications_inserted, insert_listeners
+from Que3_metrics import log, setup_logging, start_metrics_server
+
+RESTART_DELAY = 1.0         #Seconds to wait before restarting a worker that died straight after starting
+SHUTDOWN_TIMEOUT = 30.0     #Seconds a stopping process gets to finish before it is killed
+
+
+def stop_on_sigterm():      #In a child: Ctrl+C is left to the supervisor, SIGTERM stops the process like Ctrl+C would
+    def stop(signum, frame):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)  #Once is enough, the clean-up is not interrupted again
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, stop)
+
+
+#Step 1: The writer process
+
+class WriterLink:           #The writer's end of one worker's connection
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.lock = threading.Lock()      #Results are sent from the writer thread, jobs read by our own thread
+
+    def send(self, message):
+        try:
+            with self.lock:
+                self.connection.send(message)
+        except (OSError, ValueError):
+            pass                          #The worker has gone, its connection thread cleans up
+
+def writer_main(address_pipe, authkey, batch_size, flush_window, journal, metrics, log_level, log_format):   #Runs in the writer process
+    stop_on_sigterm()
+    listener = setup_logging(log_level, log_format)
+    writer = server.start_writer(batch_size, flush_window, journal)
+    links = []
+    links_lock = threading.Lock()
+    metrics_server = start_metrics_server(*metrics) if metrics else None
+
+    def finished(link, job_id, future):   #Called on the writer thread when a job is committed (or failed)
+        error = future.exception()
+        if error is not None:
+            try:
+                link.send(('result', job_id, None, error))
+            except Exception:             #Not every exception can be pickled, its message always can
+                link.send(('result', job_id, None, RuntimeError(str(error))))
+            return
+        link.send(('result', job_id, future.result(), None))
+
+    def inserted(app_numbers):            #Once rows are committed, so no worker keeps a cached "not found" for them
+        with links_lock:
+            everyone = list(links)
+        for link in everyone:
+            link.send(('inserted', list(app_numbers)))
+    insert_listeners.append(inserted)
+
+    def serve_link(connection):
+        link = WriterLink(connection)
+        link.send(('hello', bool(journal)))  #Tells the worker whether there can be journaled applications
+        with links_lock:
+            links.append(link)
+        try:
+            while True:
+                job = connection.recv()
+                if job is None:           #The worker is stopping, closing our end lets its reader finish
+                    break
+                if job[0] == 'pending':   #A status lookup for a journaled number, answered straight away
+                    _, job_id, app_number = job
+                    link.send(('result', job_id, writer.pending_application(app_number), None))
+                    continue
+                _, job_id, applications, keys, single = job
+                future = writer.submit(applications[0], keys[0]) if single else writer.submit_many(applications, keys)
+                future.add_done_callback(lambda future, job_id=job_id: finished(link, job_id, future))
+        except (EOFError, OSError):
+            pass                          #The worker stopped
+        except Exception as e:            #A job that could not be read, closing the link fails the worker's waiting jobs
+            log.error("[DATABASE] Worker link failed", extra={'fields': {'error': repr(e)}})
+        finally:
+            with links_lock:
+                links.remove(link)
+            connection.close()
+
+    links_listener = Listener(authkey=authkey)
+    address_pipe.send(links_listener.address)
+    address_pipe.close()
+    log.info("[DATABASE] Writer process running", extra={'fields': {'pid': os.getpid()}})
+    try:
+        while True:
+            connection = links_listener.accept()
+            threading.Thread(target=serve_link, args=(connection,), name='dbs-writer-link', daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        links_listener.close()
+        server.stop_writer()              #Commit anything still queued
+        if metrics_server:
+            metrics_server.shutdown()
+        log.info("[DATABASE] Writer process stopped")
+        listener.stop()
+
+class RemoteWriter:         #Stands in for the ApplicationWriter in a worker, sending the jobs to the writer process
+
+    def __init__(self, address, authkey):
+        self.connection = Client(address, authkey=authkey)
+        _, self.journaled = self.connection.recv()   #The writer's hello, before anything else is read
+        self.lock = threading.Lock()
+        self.futures = {}                 #job id -> Future for the job's numbers
+        self.broken = None                #Why the link stopped working, once it has
+        self.job_ids = count()
+        self.thread = threading.Thread(target=self._receive, name='dbs-writer-link', daemon=True)
+        self.thread.start()
+
+    def submit(self, data, key=None):     #Same as ApplicationWriter.submit
+        return self._send('submit', [data], [key], True)
+
+    def submit_many(self, applications, keys=None):   #Same as ApplicationWriter.submit_many
+        applications = list(applications)
+        return self._send('submit', applications, list(keys) if keys else [None] * len(applications), False)
+
+    def save(self, data):
+        return self.submit(data).result()
+
+    def pending_application(self, app_number):   #Journaled applications are only known to the writer process
+        if not self.journaled:            #Without a journal every answered application is already in the database
+            return None
+        return self._send('pending', app_number).result(server.WRITE_TIMEOUT)
+
+    def _send(self, *job):
+        future = Future()
+        with self.lock:
+            if self.broken is not None:   #Nobody would read the answer
+                future.set_exception(self.broken)
+                return future
+            job_id = next(self.job_ids)
+            self.futures[job_id] = future
+            try:
+                self.connection.send((job[0], job_id, *job[1:]))
+            except (OSError, ValueError) as e:
+                del self.futures[job_id]
+                future.set_exception(ConnectionError(f"Writer process not reachable: {e}"))
+            except Exception as e:        #A job that can not be pickled fails on its own
+                del self.futures[job_id]
+                future.set_exception(e)
+        return future
+
+    def _receive(self):
+        error = ConnectionError("Writer process stopped")
+        try:
+            while True:
+                message = self.connection.recv()
+                if message[0] == 'inserted':
+                    applications_inserted(message[1])
+                    continue
+                _, job_id, numbers, failure = message
+                with self.lock:
+                    future = self.futures.pop(job_id)
+                if failure is not None:
+                    future.set_exception(failure)
+                else:
+                    future.set_result(numbers)
+        except (EOFError, OSError):
+            pass
+        except Exception as e:            #A message that could not be read, the link can not be trusted after it
+            log.error("[SERVER] Writer link failed", extra={'fields': {'error': repr(e)}})
+            error = e
+        #Nothing still waiting will be answered, and nothing sent from now on
+        with self.lock:
+            waiting, self.futures = self.futures, {}
+            self.broken = error
+            self.connection.close()       #So the writer stops sending to a link nobody reads
+        for future in waiting.values():
+            future.set_exception(error)
+
+    def close(self):                      #The writer closes its end in reply, which ends the reading thread
+        try:
+            with self.lock:
+                self.connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self.thread.join(server.WRITE_TIMEOUT)
+        self.connection.close()
+
+
+#Step 2: The worker processes
+
+def worker_main(index, shared_socket, address, authkey, host, port, backlog, max_in_flight,
+                limits, retry_after, metrics, log_level, log_format):   #Runs in a worker process
+    stop_on_sigterm()
+    listener = setup_logging(log_level, log_format)
+    server.writer = RemoteWriter(address, authkey)     #submit_application() now goes to the writer process
+    server_socket = shared_socket or server.listen(host, port, backlog, reuse_port=True)
+    metrics_server = start_metrics_server(*metrics) if metrics else None
+    log.info("[SERVER] Worker running", extra={'fields': {'worker': index, 'pid': os.getpid()}})
+    try:
+        server.accept_clients(server_socket, max_in_flight, limits, retry_after)
+    finally:
+        server.writer.close()
+        if metrics_server:
+            metrics_server.shutdown()
+        log.info("[SERVER] Worker stopped", extra={'fields': {'worker': index}})
+        listener.stop()
+
+
+#Step 3: The supervisor
+
+def stop_process(process, asked=False):  #Asks a child to stop (SIGTERM), kills it if it does not finish in time
+    if not asked and process.is_alive():
+        process.terminate()
+    process.join(SHUTDOWN_TIMEOUT)
+    if process.is_alive():
+        log.warning("[SERVER] Process did not stop in time, killing it", extra={'fields': {'pid': process.pid}})
+        process.kill()
+        process.join()
+
+def start_prefork_server(workers, host=server.HOST, port=server.PORT, backlog=server.BACKLOG,
+                         max_in_flight=server.MAX_IN_FLIGHT, batch_size=server.BATCH_SIZE,
+                         flush_window=server.FLUSH_WINDOW, metrics_port=None, limits=None,
+                         retry_after=server.RETRY_AFTER, log_level='INFO', log_format='text', journal=None):   #Runs the supervisor until Ctrl+C
+
+    server.create_database()
+    limits = limits or server.ConnectionLimits()
+    authkey = os.urandom(32)
+    logging_options = (log_level, log_format)
+
+    def metrics(offset):
+        return (host, metrics_port + offset) if metrics_port else None
+
+    #The writer first, the workers need its address
+    address_pipe, writer_end = multiprocessing.Pipe(duplex=False)
+    writer = multiprocessing.Process(target=writer_main, name='dbs-writer', args=(
+        writer_end, authkey, batch_size, flush_window, journal, metrics(workers), *logging_options))
+    writer.start()
+    writer_end.close()
+    address = address_pipe.recv()
+
+    #Without SO_REUSEPORT every worker accepts from this one socket instead of binding its own
+    shared_socket = None if hasattr(socket, 'SO_REUSEPORT') else server.listen(host, port, backlog)
+
+    def start_worker(index):
+        process = multiprocessing.Process(target=worker_main, name=f'dbs-worker-{index}', args=(
+            index, shared_socket, address, authkey, host, port, backlog, max_in_flight,
+            limits, retry_after, metrics(index), *logging_options))
+        process.start()
+        return process, time.monotonic()
+
+    running = {index: start_worker(index) for index in range(workers)}
+
+    log.info("[SERVER] DBS Application SERVER - RUNNING (pre-fork)")
+    log.info(f"[SERVER] Listening on {host}:{port}", extra={'fields': {
+        'workers': workers, 'reuse_port': shared_socket is None, 'backlog': backlog, 'max_in_flight': max_in_flight}})
+    log.info("[SERVER] Waiting for student applications...")
+
+    try:
+        while True:
+            sentinels = {process.sentinel: index for index, (process, _) in running.items()}
+            ready = wait(list(sentinels) + [writer.sentinel])
+            if writer.sentinel in ready:
+                log.error("[DATABASE] Writer process died, stopping the server",
+                          extra={'fields': {'exitcode': writer.exitcode}})
+                break
+            for sentinel in ready:
+                index = sentinels[sentinel]
+                process, started = running[index]
+                process.join()
+                log.warning("[SERVER] Worker died, restarting it", extra={'fields': {
+                    'worker': index, 'pid': process.pid, 'exitcode': process.exitcode}})
+                if time.monotonic() - started < RESTART_DELAY:   #Do not restart a crashing worker in a tight loop
+                    time.sleep(RESTART_DELAY)
+                running[index] = start_worker(index)
+
+    except KeyboardInterrupt:
+        #Handle Ctrl+C to stop the server
+        log.info("[SERVER] Shutting down...")
+
+    finally:
+        for process, _ in running.values():     #Every worker finishes its clients at the same time
+            if process.is_alive():
+                process.terminate()
+        for process, _ in running.values():
+            stop_process(process, asked=True)
+        stop_process(writer)                    #Only once no worker can send it anything more
+        if shared_socket is not None:
+            shared_socket.close()
+        log.info("[SERVER] Server stopped")
@@ -0,0 +1,157 @@
+#Que3_protocol.py
+#This is the wire protocol shared by the client and the server
+
+#Every message travels in a frame:
+#   1 byte  magic marker (0xDB) - tells a framed client apart from an old one-shot client sending raw JSON
+#   1 byte  encoding of the body (1 = JSON, other numbers are kept free for a compact binary encoding)
+#   4 bytes length of the body (big-endian)
+#   body
+#A client can keep the connection open and send many frames without waiting for the answers.
+#Each request carries an 'id' and the server copies it into the matching response.
+
+#Importing necessary modules
+import asyncio              #For the asyncio version of read_frame
+import json                 #To format the message body
+import re                   #To tell a cut-short JSON token from a wrong one
+import struct               #To pack the frame header
+import time                 #For read deadlines
+
+
+MAGIC = b'\xdb'
+HEADER = struct.Struct('!cBI')              #magic, encoding, body length
+MAX_FRAME_SIZE = 16 * 1024 * 1024           #Bigger frames are refused instead of buffered
+
+ENCODING_JSON = 1
+LEGACY_TOKEN_TAIL = re.compile(r'[\w.+-]+')      #What the last, unfinished token of an old client's JSON can look like
+
+#Encoders and decoders for each body encoding, a binary one can be registered here
+CODECS = {
+    ENCODING_JSON: (
+        lambda message: json.dumps(message, separators=(',', ':')).encode('utf-8'),
+        lambda body: json.loads(body.decode('utf-8')),
+    ),
+}
+
+
+class ProtocolError(Exception):             #Raised when the other side sends something that is not a valid frame
+    pass
+
+
+def encode_frame(message, encoding=ENCODING_JSON):     #Turns a message dictionary into the bytes of one frame
+    if encoding not in CODECS:
+        raise ProtocolError(f"Unknown encoding {encoding}")
+    body = CODECS[encoding][0](message)
+    if len(body) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(body)} bytes is larger than {MAX_FRAME_SIZE}")
+    return HEADER.pack(MAGIC, encoding, len(body)) + body
+
+
+def apply_deadline(sock, deadline):         #Sets the socket timeout to the time left before deadline (a time.monotonic() value)
+    if deadline is None:
+        return
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Read deadline passed")
+    sock.settimeout(remaining)
+
+
+def recv_exact(sock, size, deadline=None):  #Reads exactly size bytes, returns None if the peer closed before sending any
+    chunks = []
+    received = 0
+    while received < size:
+        apply_deadline(sock, deadline)      #A slow sender cannot stretch one frame past the deadline
+        chunk = sock.recv(min(size - received, 65536))
+        if not chunk:
+            if received == 0:
+                return None
+            raise ProtocolError("Connection closed in the middle of a frame")
+        chunks.append(chunk)
+        received += len(chunk)
+    return b''.join(chunks)
+
+
+def parse_header(header):                   #Checks a frame header, returns (encoding, body length)
+    magic, encoding, length = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise ProtocolError("Bad frame marker")
+    if encoding not in CODECS:
+        raise ProtocolError(f"Unknown encoding {encoding}")
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {length} bytes is larger than {MAX_FRAME_SIZE}")
+    return encoding, length
+
+
+def decode_body(body, encoding):            #Turns a frame body back into the message
+    try:
+        return CODECS[encoding][1](body)
+    except ValueError as e:
+        raise ProtocolError(f"Invalid frame body: {e}")
+
+
+def read_frame(sock, deadline=None):        #Reads one frame, returns (message, encoding) or None when the peer is done
+    header = recv_exact(sock, HEADER.size, deadline)
+    if header is None:
+        return None
+    encoding, length = parse_header(header)
+    body = recv_exact(sock, length, deadline) if length else b''
+    if body is None:
+        raise ProtocolError("Connection closed in the middle of a frame")
+    return decode_body(body, encoding), encoding
+
+
+async def read_frame_async(reader):         #The same as read_frame for an asyncio StreamReader
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ProtocolError("Connection closed in the middle of a frame")
+    encoding, length = parse_header(header)
+    try:
+        body = await reader.readexactly(length) if length else b''
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("Connection closed in the middle of a frame")
+    return decode_body(body, encoding), encoding
+
+
+def send_frame(sock, message, encoding=ENCODING_JSON):      #Sends one message as a frame
+    sock.sendall(encode_frame(message, encoding))
+
+
+def legacy_json_incomplete(error, text):   #True if more bytes could still turn text into valid JSON
+    if error.msg == 'Extra data':
+        return False                        #A whole object followed by something else
+    end = len(text.rstrip())
+    if error.pos >= end or error.msg.startswith('Unterminated string'):
+        return True                         #It stops where the input stops
+    if 'escape' in error.msg:
+        return error.pos >= end - 6         #A \uXXXX escape cut short
+    return LEGACY_TOKEN_TAIL.fullmatch(text, error.pos, end) is not None     #A number or true/false/null cut short
+
+def recv_legacy_json(sock, first=b'', deadline=None):   #Reads a raw JSON message from an old one-shot client, however it was split
+    data = first                            #Old clients never half-close, so bad input is refused as soon as it is seen
+    while True:
+        start = data.lstrip()[:1]
+        if start and start != b'{':
+            raise ProtocolError("Not a JSON object")
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError as e:
+            if e.reason != 'unexpected end of data':
+                raise                       #Bad UTF-8, not just a character split between two reads
+            text = None
+        if text is not None:
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError as e:
+                if not legacy_json_incomplete(e, text):
+                    raise
+        if len(data) > MAX_FRAME_SIZE:
+            raise ProtocolError("Message too large")
+        apply_deadline(sock, deadline)
+        chunk = sock.recv(65536)
+        if not chunk:
+            if not data:
+                return None                 #Client connected and left without sending anything
+            return json.loads(data.decode('utf-8'))     #Raises JSONDecodeError if what we have is not valid
+        data += chunk
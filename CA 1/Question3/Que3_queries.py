@@ -0,0 +1,189 @@
+#Que3_queries.py
+#This is the read side of the application database: status lookups, intake lists and name search
+
+#Every query is answered from an index that holds all the columns it returns, so SQLite never has to
+#visit the table itself. Lists are paged with a keyset cursor (the last row seen) instead of OFFSET,
+#so page 100 costs the same as page 1.
+
+#Importing necessary modules
+import sqlite3              #For database operations
+import sys                  #For the largest code point
+import unicodedata          #To fold names the same way whatever their script
+import threading            #Each server thread keeps its own read connection
+from collections import OrderedDict     #For the least-recently-used lookup cache
+from Que3_validation import clean_course, clean_start_month, clean_start_year   #Filters are cleaned like the stored values
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+CACHE_SIZE = 4096           #Application numbers whose lookup result is kept in memory
+
+#The columns a status lookup returns
+STATUS_COLUMNS = ['application_number', 'name', 'course', 'start_year', 'start_month', 'submission_date']
+
+#The columns a list or search returns for each application
+SUMMARY_COLUMNS = ['id', 'application_number', 'name', 'course', 'start_year', 'start_month']
+
+
+def create_indexes(cursor):                 #Creates the covering indexes the queries below rely on
+    #Status lookup by number (the UNIQUE constraint only indexes the number itself)
+    cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_applications_number_status
+                    ON applications(application_number, name, course, start_year, start_month, submission_date)
+                    ''')
+    #Listing an intake, in id order for keyset paging
+    cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_applications_intake
+                    ON applications(course, start_year, start_month, id, application_number, name)
+                    ''')
+    #Case-insensitive name prefix search on the folded name (see name_key), in (name_key, id) order for keyset paging
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(applications)")]
+    if 'name_key' not in columns:
+        cursor.execute("ALTER TABLE applications ADD COLUMN name_key TEXT")
+    missing = cursor.execute("SELECT id, name FROM applications WHERE name_key IS NULL").fetchall()
+    cursor.executemany("UPDATE applications SET name_key = ? WHERE id = ?", [(name_key(name), id_) for id_, name in missing])
+    cursor.execute("DROP INDEX IF EXISTS idx_applications_name")     #The old COLLATE NOCASE index, ASCII only
+    cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_applications_name_key
+                    ON applications(name_key, id, application_number, name, course, start_year, start_month)
+                    ''')
+
+
+def name_key(name):                         #The name as it is searched: Unicode-normalised and case-folded, so "É" matches "é"
+    return unicodedata.normalize('NFKC', str(name)).casefold()
+
+
+class LookupCache:                          #A thread-safe LRU cache of status lookups, keyed by application number
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0                 #Goes up on every invalidation
+
+    def get(self, key):                     #Returns (True, value) on a hit and (False, generation) on a miss
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, self.entries[key]
+            self.misses += 1
+            return False, self.generation
+
+    def put(self, key, value, generation):  #Stores a result read after get() returned generation
+        with self.lock:
+            if generation != self.generation:
+                return                      #An insert happened meanwhile, the result may already be stale
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, keys):             #Drops entries, called after applications are inserted
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.entries.pop(key, None)
+
+
+lookup_cache = LookupCache()
+local = threading.local()                   #Holds each thread's read connection
+
+
+def reader(db_file):                        #Returns this thread's read-only connection to the database
+    connection = getattr(local, 'connection', None)
+    if connection is None or local.db_file != db_file:
+        connection = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+        local.connection = connection
+        local.db_file = db_file
+    return connection
+
+
+insert_listeners = []                       #Also told about inserted numbers, e.g. to pass them on to other processes
+
+
+def applications_inserted(app_numbers):     #Tells the read side that these numbers now exist
+    lookup_cache.invalidate(app_numbers)
+    for listener in insert_listeners:
+        listener(app_numbers)
+
+
+def page_size(limit):                       #Checks the page size a client asked for
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    limit = int(limit)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+def cursor_value(value, kind):              #True if value is a kind (bool is not taken for int)
+    return isinstance(value, kind) and not isinstance(value, bool)
+
+def paging_cursor(after, default, *kinds):  #Checks the next_after a client sent back, default when it sent none
+    if after is None:
+        return default
+    if not isinstance(after, list) or len(after) != len(kinds) or not all(map(cursor_value, after, kinds)):
+        raise ValueError("Invalid paging cursor")
+    return after
+
+
+def lookup_application(db_file, app_number):     #Returns the status of one application, or None if there is no such number
+    app_number = str(app_number).strip().upper()
+    hit, result = lookup_cache.get(app_number)
+    if hit:
+        return result
+    generation = result
+
+    row = reader(db_file).execute(
+        f"SELECT {', '.join(STATUS_COLUMNS)} FROM applications INDEXED BY idx_applications_number_status "
+        "WHERE application_number = ?", (app_number,)).fetchone()
+    result = dict(zip(STATUS_COLUMNS, row)) if row else None
+    lookup_cache.put(app_number, result, generation)
+    return result
+
+
+def list_intake(db_file, course, start_year, start_month, limit=None, after=None):    #One page of an intake, returns (rows, cursor for the next page)
+    limit = page_size(limit)
+    if after is None:
+        after = 0
+    elif not cursor_value(after, int):
+        raise ValueError("Invalid paging cursor")
+    rows = reader(db_file).execute(
+        f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM applications INDEXED BY idx_applications_intake "
+        "WHERE course = ? AND start_year = ? AND start_month = ? AND id > ? "
+        "ORDER BY id LIMIT ?", (clean_course(course), clean_start_year(start_year), clean_start_month(start_month),
+                                after, limit)).fetchall()
+    rows = [dict(zip(SUMMARY_COLUMNS, row)) for row in rows]
+    next_after = rows[-1]['id'] if len(rows) == limit else None
+    return rows, next_after
+
+
+def prefix_upper_bound(prefix):             #The smallest string greater than every string starting with prefix, None if there is none
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    following = ord(prefix[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:       #Surrogates cannot be stored, the next character is U+E000
+        following = 0xE000
+    return prefix[:-1] + chr(following)
+
+
+def search_name(db_file, prefix, limit=None, after=None):      #One page of applicants whose name starts with prefix (any case, any script)
+    limit = page_size(limit)
+    prefix = name_key(str(prefix or '').strip())
+    if not prefix:
+        raise ValueError("prefix must not be empty")
+
+    after_key, after_id = paging_cursor(after, [prefix, 0], str, int)
+    upper = prefix_upper_bound(prefix)
+    rows = reader(db_file).execute(
+        f"SELECT {', '.join(SUMMARY_COLUMNS)}, name_key FROM applications INDEXED BY idx_applications_name_key "
+        "WHERE name_key >= ? " + ("AND name_key < ? " if upper else "") +
+        "AND (name_key > ? OR (name_key = ? AND id > ?)) "
+        "ORDER BY name_key, id LIMIT ?",
+        (prefix, *([upper] if upper else []), after_key, after_key, after_id, limit)).fetchall()
+    next_after = [rows[-1][-1], rows[-1][0]] if len(rows) == limit else None
+    rows = [dict(zip(SUMMARY_COLUMNS, row)) for row in rows]
+    return rows, next_after
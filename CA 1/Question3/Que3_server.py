@@ -1,199 +1,843 @@
-#Ques3_server.py
-#This is the server that receives the student applications
-
-#First I will import necessary modules
-import socket                               #This is for network communication
-import sqlite3                              #This is for database operations
-import uuid                                 #This is for generating unique ids
-import json                                 #This is to format data which will be sent or received
-
-#Step 1: Let's start with creating the database
-print("[DEBUG] Running server file:", __file__)
-def create_database():                      #By writing this function a database and table will be created if they do not exist
-
-    connection = sqlite3.connect('dbs_applications.db')  #It connects to database and creates a file if it doesn't exist
-    cursor = connection.cursor()
-
-
-    #Creating table for storing the muliple applications
-    cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS applications(
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            application_number TEXT UNIQUE NOT NULL,
-                            name TEXT NOT NULL,
-                            address TEXT NOT NULL,
-                            qualifications TEXT NOT NULL,
-                            course TEXT NOT NULL,
-                            start_year INTEGER NOT NULL,
-                            start_month TEXT NOT NULL,
-                            submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                    ''')
-    
-
-    connection.commit()                     #To save changes
-    connection.close()                      #TO close the connection
-    print("[DATABASE] Database and table created successfully")
-    
-
-#Step 2: Let's start with generating unique application numbers
-
-def generate_application_number():        #Generates a unique application number
-
-    unique_id = str(uuid.uuid4())[:8].upper()   #It will get the first 8 characters of UUID
-    app_number = f"APP-{unique_id}"
-    return app_number
-    
-
-#Step 3: Save Application to Database
-
-def save_application(data):  # It saves the student's application to the database and returns the application number
-    connection = sqlite3.connect('dbs_applications.db')
-    cursor = connection.cursor()
-
-    # Generate unique application number
-    app_number = generate_application_number()
-
-    sql = (
-        "INSERT INTO applications ("
-        "application_number, name, address, qualifications, course, start_year, start_month"
-        ") VALUES (?, ?, ?, ?, ?, ?, ?)"
-    )
-
-    try:
-        cursor.execute(sql, (
-            app_number,
-            data['name'],
-            data['address'],
-            data['qualifications'],
-            data['course'],
-            data['start_year'],
-            data['start_month']
-        ))
-
-        connection.commit()
-        print(f"[DATABASE] Application saved with number: {app_number}")
-        return app_number
-
-    except sqlite3.IntegrityError as e:
-        print("[DATABASE] IntegrityError (duplicate app number):", e)
-        connection.close()
-        return save_application(data)  # try again with new number
-
-    except Exception as e:
-        print("[DATABASE] Unexpected error in save_application:", repr(e))
-        raise
-
-    finally:
-        try:
-            connection.close()
-        except:
-            pass
-
-
-#Step 4: Start the server
-        
-def start_server():                       #This is the main server function which listens for clients
-
-    #Create database first
-    create_database()
-
-    #Server Configuration
-    HOST = '127.0.0.1'                    #localhost as server runs on my computer
-    PORT = 65432                          #Port Number (I can use any port from 49152 to 65535)
-
-    #Create a socket
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-    #Allowing the reuse of address it is helpul during the testing
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-    #Binding socket to address and port
-    server_socket.bind((HOST, PORT))
-
-    #Listening for connections (maximum 5 in queue)
-    server_socket.listen(5)
-
-    print("="* 60)
-    print("DBS Application SERVER - RUNNING")
-    print("=" * 60)
-    print(f"[SERVER] Listening on {HOST}:{PORT}")
-    print("[SERVER] Waiting for student applications...")
-    print("=" * 60)
-
-    try:
-        while True:              #Keep server running forever
-            #Accept client connection
-            client_socket, client_address = server_socket.accept()
-            print(f"\n[CONNECTION] New connection from {client_address}")
-
-            try:
-                #Receive data from client (max 4096 bytes)
-                data = client_socket.recv(4096).decode('utf-8')
-
-                if data:
-                    print(f"[RECEIVED] Data received from client")
-
-                    #Convert JSON string back to dictionary
-                    application_data = json.loads(data)
-
-                    #Displaying received data
-                    print("\n--- APPLICATION DETAILS ---")
-                    print(f"Name:  {application_data['name']}")
-                    print(f"Course: {application_data['course']}")
-                    print(f"Start: {application_data['start_month']} {application_data['start_year']}")
-                    print("--------------------------")
-
-                    #Save to database and get application number
-                    app_number = save_application(application_data)
-
-                    #Send application number back to client
-                    response = json.dumps({
-                        'status': 'success',
-                        'application_number': app_number,
-                        'message': 'Application submitted successfully!'
-                    })
-
-                    client_socket.send(response.encode('utf-8'))
-                    print(f"[SENT] Application number sent to client: {app_number}\n")
-
-            except json.JSONDecodeError:
-                #Handling invalid data format
-                error_response = json.dumps({
-                    'status': 'error',
-                    'message' : 'Invalid data format'
-                })
-                client_socket.send(error_response.encode('utf-8'))
-                print("[ERROR] Invalid data received")
-
-            except Exception as e:
-                #Handling any other errors
-                error_response = json.dumps({
-                    'status': 'error',
-                    'message': str(e)
-                })
-                client_socket.send(error_response.encode('utf-8'))
-                print(f"[ERROR] {e}")
-
-            finally:
-                #Closing client connection
-                client_socket.close()
-                print("[CONNECTION] Client disconnected")
-
-    except KeyboardInterrupt:
-        #Handle Ctrl+C to stop the server
-        print("\n\n[SERVER] Shutting down...")
-        server_socket.close()
-        print("[SERVER] Server stopped")
-
-#Running the server
-
-if __name__ == "__main__":
-    start_server()
-
-
-            
-
-        
-
-
+#Ques3_server.py
+#This is the server that receives the student applications
+
+#First I will import necessary modules
+import socket                               #This is for network communication
+import sqlite3                              #This is for database operations
+import json                                 #This is to format data which will be sent or received
+import threading                            #This is to limit how many clients are served at once
+import argparse                             #This is for the command line options
+import queue                                #This is to hand applications over to the database writer
+import time                                 #This is for the writer's flush window
+import select                               #This is to see whether a client has pipelined more requests
+import hashlib                              #This is to tell a retried application from a different one with the same key
+from collections import deque, OrderedDict  #This keeps a connection's replies in request order, and the recent request keys
+from concurrent.futures import ThreadPoolExecutor, Future   #Worker threads serving clients and pending results
+from Que3_validation import clean_application, ValidationError    #The same rules the client form uses
+from Que3_queries import (create_indexes, applications_inserted, name_key,    #The read side: lookups and searches
+                          lookup_application, list_intake, search_name)
+from Que3_protocol import (MAGIC, ENCODING_JSON, ProtocolError,   #The framed wire protocol shared with the client
+                           read_frame, send_frame, recv_legacy_json)
+from Que3_metrics import (log, setup_logging, start_metrics_server, registry, MeteredSocket,   #Logging and metrics
+                          LOG_FORMATS, LOG_LEVELS, requests_total, errors_total, request_latency, accept_latency,
+                          db_commit_seconds, db_group_rows, db_rows_total, connections_total, active_connections,
+                          rejected_total, timeouts_total, duplicates_total)
+
+DB_FILE = 'dbs_applications.db'             #The database file, created next to where the server is started
+
+#Step 1: Let's start with creating the database
+log.debug("[SERVER] Running server file", extra={'fields': {'file': __file__}})
+def create_database():                      #By writing this function a database and table will be created if they do not exist
+
+    connection = sqlite3.connect(DB_FILE)  #It connects to database and creates a file if it doesn't exist
+    cursor = connection.cursor()
+
+
+    #Creating table for storing the muliple applications
+    cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS applications(
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            application_number TEXT UNIQUE NOT NULL,
+                            name TEXT NOT NULL,
+                            address TEXT NOT NULL,
+                            qualifications TEXT NOT NULL,
+                            course TEXT NOT NULL,
+                            start_year INTEGER NOT NULL,
+                            start_month TEXT NOT NULL,
+                            submission_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                    ''')
+    
+
+    #Counter the application numbers are taken from
+    cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS application_counter(
+                            name TEXT PRIMARY KEY,
+                            next_value INTEGER NOT NULL
+                    )
+                    ''')
+    cursor.execute("INSERT OR IGNORE INTO application_counter (name, next_value) VALUES ('application', 1)")
+
+    #Request keys already used, so a retried submission gets its original number back
+    cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS request_keys(
+                            request_key TEXT PRIMARY KEY,
+                            application_number TEXT NOT NULL,
+                            fingerprint TEXT NOT NULL,
+                            created REAL NOT NULL
+                    )
+                    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_request_keys_created ON request_keys(created)")
+
+    #Indexes behind the lookup and search messages
+    create_indexes(cursor)
+
+    connection.commit()                     #To save changes
+    connection.close()                      #TO close the connection
+    log.info("[DATABASE] Database and table created successfully", extra={'fields': {'file': DB_FILE}})
+    
+
+#Step 2: Let's start with generating unique application numbers
+
+#Numbers come from a counter kept in the database, so two applications can never get the same one.
+#The writer reserves a block of counter values at a time (one UPDATE per block, inside its own
+#transaction) and hands them out from memory. Each counter value is scrambled with a reversible
+#32-bit mix so the numbers still look like APP-XXXXXXXX and are not easy to guess.
+
+NUMBER_BLOCK_SIZE = 500                   #Counter values reserved by one database round trip
+NUMBER_MULTIPLIER = 0x9E3779B1            #Odd, so multiplying is reversible modulo 2**32
+NUMBER_MASK = 0xFFFFFFFF
+NUMBER_KEY = 0x5DB5C0DE
+
+def format_application_number(sequence):  #Turns a counter value into its application number
+    mixed = ((sequence * NUMBER_MULTIPLIER) & NUMBER_MASK) ^ NUMBER_KEY
+    return f"APP-{mixed:08X}"
+
+class ApplicationNumbers:                 #Hands out application numbers from blocks reserved in the counter table
+
+    def __init__(self, block_size=NUMBER_BLOCK_SIZE):
+        self.block_size = block_size
+        self.available = deque()
+
+    def reset(self):                      #Forgets the current block, used when the transaction that reserved it rolled back
+        self.available.clear()
+
+    def take(self, cursor, count=1):      #Returns count numbers, reserving more blocks with the given cursor when needed
+        while len(self.available) < count:
+            self._reserve(cursor, max(self.block_size, count - len(self.available)))
+        return [self.available.popleft() for _ in range(count)]
+
+    def _reserve(self, cursor, size):
+        start = cursor.execute("SELECT next_value FROM application_counter WHERE name = 'application'").fetchone()[0]
+        if start + size > NUMBER_MASK:
+            raise RuntimeError("Application numbers exhausted")
+        cursor.execute("UPDATE application_counter SET next_value = ? WHERE name = 'application'", (start + size,))
+
+        numbers = [format_application_number(sequence) for sequence in range(start, start + size)]
+
+        #Rows saved before the counter existed used random numbers, leave out any block entry they already hold
+        taken = set()
+        for i in range(0, len(numbers), 500):
+            part = numbers[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            taken.update(row[0] for row in cursor.execute(
+                f"SELECT application_number FROM applications WHERE application_number IN ({placeholders})", part))
+        self.available.extend(number for number in numbers if number not in taken)
+
+
+#Step 3: Save Application to Database
+
+#All inserts go through one long-lived writer thread that owns the only write connection.
+#Applications arriving close together are committed in one transaction (one fsync for the group)
+#and every caller still gets its own application number back.
+
+BATCH_SIZE = 64                           #Most applications committed in one transaction
+FLUSH_WINDOW = 0.005                      #Seconds the writer waits for more applications before committing
+
+INSERT_SQL = (
+    "INSERT INTO applications ("
+    "application_number, name, address, qualifications, course, start_year, start_month, name_key"
+    ") VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+def insert_row(app_number, data):         #The values inserted for one application, in INSERT_SQL order
+    return application_row(app_number, data) + (name_key(data['name']),)
+
+def application_row(app_number, data):    #The application's own values, also what its fingerprint is taken from
+    return (
+        app_number,
+        data['name'],
+        data['address'],
+        data['qualifications'],
+        data['course'],
+        data['start_year'],
+        data['start_month']
+    )
+
+#A client may attach a request_key to a submission, so that sending it again after a timeout or a
+#dropped connection cannot create a second application. The first time a key is seen the application
+#is inserted and the key is stored with its number in the same transaction; a request arriving again
+#with that key gets the stored number back and nothing is inserted. Keys seen recently are kept in
+#memory (at most KEY_CACHE_SIZE of them), older ones are found through the request_keys primary key.
+#Keys expire after KEY_TTL seconds and are then deleted from the table.
+
+KEY_TTL = 24 * 60 * 60                    #Seconds a request key is remembered
+KEY_CACHE_SIZE = 10000                    #Request keys kept in memory
+KEY_PRUNE_INTERVAL = 60                   #Seconds between deleting expired keys from the table
+MAX_KEY_LENGTH = 128
+
+KEY_INSERT_SQL = (
+    "INSERT OR REPLACE INTO request_keys (request_key, application_number, fingerprint, created) "
+    "VALUES (?, ?, ?, ?)"
+)
+
+def clean_request_key(key):               #Checks an optional request key from a message
+    if key is None:
+        return None
+    if not isinstance(key, str) or not 0 < len(key) <= MAX_KEY_LENGTH:
+        raise ValueError(f"request_key must be a string of 1 to {MAX_KEY_LENGTH} characters")
+    return key
+
+def application_fingerprint(data):        #A hash of the application, a key reused for different details is refused
+    return hashlib.sha256(json.dumps(application_row('', data)).encode('utf-8')).hexdigest()
+
+class RequestKeys:                        #The request keys seen recently, only used by the writer thread
+
+    def __init__(self, ttl=KEY_TTL, maxsize=KEY_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()      #key -> (application number, fingerprint, time stored), oldest first
+        self.last_prune = 0.0
+
+    def find(self, cursor, key, fingerprint, now):   #The number already given to key, or None if the key is new
+        entry = self.entries.get(key)
+        if entry is not None and now - entry[2] > self.ttl:
+            del self.entries[key]
+            entry = None
+        if entry is None:                 #Not in memory, the table also holds keys stored earlier in this transaction
+            entry = cursor.execute(
+                "SELECT application_number, fingerprint, created FROM request_keys WHERE request_key = ? AND created >= ?",
+                (key, now - self.ttl)).fetchone()
+        if entry is None:
+            return None
+        if entry[1] != fingerprint:
+            raise ValueError("request_key was already used for a different application")
+        return entry[0]
+
+    def remember(self, stored):           #Adds (key, number, fingerprint, time) entries once they are committed
+        for key, app_number, fingerprint, created in stored:
+            self.entries[key] = (app_number, fingerprint, created)
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def prune(self, cursor, now):         #Deletes expired keys from the table, at most once every KEY_PRUNE_INTERVAL
+        if now - self.last_prune >= KEY_PRUNE_INTERVAL:
+            self.last_prune = now
+            cursor.execute("DELETE FROM request_keys WHERE created < ?", (now - self.ttl,))
+
+class ApplicationWriter:                  #Owns the database connection and commits queued applications in groups
+
+    def __init__(self, db_file=DB_FILE, batch_size=BATCH_SIZE, flush_window=FLUSH_WINDOW):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.flush_window = flush_window
+        self.pending = queue.Queue()      #Holds (list of applications, their keys, Future, single) jobs waiting to be written
+        self.numbers = ApplicationNumbers()
+        self.keys = RequestKeys()
+        self.thread = threading.Thread(target=self._run, name='dbs-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, data, key=None):     #Queues an application and returns a Future for its application number
+        future = Future()
+        self.pending.put(([data], [key], future, True))
+        return future
+
+    def submit_many(self, applications, keys=None):   #Queues a list of applications, the Future gives their numbers in the same order
+        applications = list(applications)
+        future = Future()
+        self.pending.put((applications, list(keys) if keys else [None] * len(applications), future, False))
+        return future
+
+    def save(self, data):                 #Queues an application and waits until it is committed
+        return self.submit(data).result()
+
+    def pending_application(self, app_number):   #An answered application not in the database yet, never the case here
+        return None
+
+    def close(self):                      #Commits whatever is still queued and stops the writer thread
+        self.pending.put(None)
+        self.thread.join()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_file, isolation_level=None)   #Transactions are started by hand in _write
+        connection.execute("PRAGMA journal_mode=WAL")      #Readers never block the writer
+        connection.execute("PRAGMA synchronous=NORMAL")    #In WAL mode this only fsyncs at checkpoints
+        return connection
+
+    def _collect(self, first):            #Gathers up to batch_size applications arriving within the flush window
+        batch = [first]
+        rows = len(first[0])
+        deadline = time.monotonic() + self.flush_window
+        while rows < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:              #close() was called, finish this batch and then stop
+                self.pending.put(None)
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _insert_many(self, cursor, applications, keys, now):     #Inserts one job's new applications, all or none of them
+        #Applications whose key was seen before get their earlier number, the rest get new ones
+        app_numbers = [None] * len(applications)
+        fingerprints = {}
+        for i, (data, key) in enumerate(zip(applications, keys)):
+            if key is not None:
+                fingerprints[i] = application_fingerprint(data)
+                app_numbers[i] = self.keys.find(cursor, key, fingerprints[i], now)
+        new = [i for i, app_number in enumerate(app_numbers) if app_number is None]
+        for i, app_number in zip(new, self.numbers.take(cursor, len(new))):
+            app_numbers[i] = app_number
+        stored = [(keys[i], app_numbers[i], fingerprints[i], now) for i in new if keys[i] is not None]
+
+        cursor.execute("SAVEPOINT job")
+        try:
+            cursor.executemany(INSERT_SQL, [insert_row(app_numbers[i], applications[i]) for i in new])
+            cursor.executemany(KEY_INSERT_SQL, stored)
+            cursor.execute("RELEASE job")
+            return app_numbers, [app_numbers[i] for i in new], stored
+        except Exception:
+            cursor.execute("ROLLBACK TO job")
+            cursor.execute("RELEASE job")
+            raise
+
+    def _write(self, connection, batch):  #Writes one group of jobs in a single transaction
+        cursor = connection.cursor()
+        results = []
+        started = time.perf_counter()
+        now = time.time()                 #Wall clock, request keys outlive a restart
+        cursor.execute("BEGIN")
+        for applications, keys, future, single in batch:
+            try:
+                results.append((future, single, *self._insert_many(cursor, applications, keys, now)))
+            except Exception as e:        #A bad job only fails its own caller
+                future.set_exception(e)
+        try:
+            self.keys.prune(cursor, now)
+        except Exception as e:            #Expired keys are deleted next time instead
+            log.warning("[DATABASE] Could not delete expired request keys", extra={'fields': {'error': repr(e)}})
+        try:
+            cursor.execute("COMMIT")
+        except Exception as e:
+            log.error("[DATABASE] Commit failed", extra={'fields': {'error': repr(e)}})
+            errors_total.inc(1, 'database')
+            connection.rollback()
+            self.numbers.reset()          #The block reservation was rolled back too
+            for future, *_ in results:
+                future.set_exception(e)
+            return
+        inserted = [n for _, _, _, new_numbers, _ in results for n in new_numbers]
+        repeated = sum(len(app_numbers) - len(new_numbers) for _, _, app_numbers, new_numbers, _ in results)
+        db_commit_seconds.observe(time.perf_counter() - started)
+        db_group_rows.observe(len(inserted))
+        db_rows_total.inc(len(inserted))
+        if repeated:
+            duplicates_total.inc(repeated)
+        applications_inserted(inserted)
+        for _, _, _, _, stored in results:
+            self.keys.remember(stored)
+        for future, single, app_numbers, _, _ in results:
+            future.set_result(app_numbers[0] if single else app_numbers)
+        log.debug("[DATABASE] Committed applications", extra={'fields': {'rows': len(inserted), 'repeated': repeated,
+                                                                         'jobs': len(batch)}})
+
+    def _run(self):
+        connection = self._connect()
+        try:
+            while True:
+                first = self.pending.get()
+                if first is None:
+                    break
+                self._write(connection, self._collect(first))
+        finally:
+            connection.close()
+
+
+writer = None                             #The writer used by save_application, started by start_writer()
+
+def start_writer(batch_size=BATCH_SIZE, flush_window=FLUSH_WINDOW, journal=None):   #Starts the shared writer thread
+    global writer
+    if journal:                           #Applications are answered once journaled (see Que3_journal.py)
+        from Que3_journal import JournalWriter
+        writer = JournalWriter(DB_FILE, journal, batch_size, flush_window)
+    else:
+        writer = ApplicationWriter(DB_FILE, batch_size, flush_window)
+    return writer
+
+def stop_writer():                        #Flushes and stops the shared writer thread
+    global writer
+    if writer is not None:
+        writer.close()
+        writer = None
+
+def submit_applications(applications, keys=None):   #Queues a list of applications to be inserted together, the Future gives their numbers
+    if writer is None:
+        start_writer()
+    return writer.submit_many(applications, keys)
+
+def submit_application(data, key=None):  #Queues an application for the writer and returns a Future for its number
+    if writer is None:
+        start_writer()
+    return writer.submit(data, key)
+
+def save_application(data):  # It saves the student's application to the database and returns the application number
+    app_number = submit_application(data).result()
+    log.debug("[DATABASE] Application saved", extra={'fields': {'application_number': app_number}})
+    return app_number
+
+
+#Step 4: Handle the messages a client can send
+
+#Each handler gets the request message and returns a function that produces the response.
+#Work such as the database insert is started straight away, so many pipelined requests
+#share one commit, and the reply is only waited for when it is its turn to be sent.
+
+def handle_submit(message):               #A single application, sent again with the same request_key it gets the same number
+    application_data = clean_application(message.get('application'))
+    request_key = clean_request_key(message.get('request_key'))
+
+    #Logging received data, only shown at DEBUG level
+    log.debug("[RECEIVED] Application", extra={'fields': {
+        'name': application_data['name'], 'course': application_data['course'],
+        'start': f"{application_data['start_month']} {application_data['start_year']}"}})
+
+    future = submit_application(application_data, request_key)
+
+    def reply():
+        app_number = future.result()
+        log.debug("[DATABASE] Application saved", extra={'fields': {'application_number': app_number}})
+        return {
+            'status': 'success',
+            'application_number': app_number,
+            'message': 'Application submitted successfully!'
+        }
+    return reply
+
+def handle_batch(message):                #A list of applications inserted with one executemany in one transaction
+    applications = message.get('applications')
+    if not isinstance(applications, list):
+        raise ValueError("'applications' must be a list")
+    request_key = clean_request_key(message.get('request_key'))
+
+    #Check every application first, the bad ones are reported and the good ones still go in
+    #With a request_key, the application at position n is keyed "<request_key>:<n>"
+    results = []
+    valid = []
+    keys = []
+    for index, data in enumerate(applications):
+        try:
+            valid.append(clean_application(data))
+            keys.append(f"{request_key}:{index}" if request_key else None)
+            results.append(None)
+        except ValidationError as e:
+            results.append({'status': 'error', 'message': str(e), 'errors': e.errors})
+
+    log.debug("[RECEIVED] Batch", extra={'fields': {'applications': len(applications), 'valid': len(valid)}})
+    future = submit_applications(valid, keys) if valid else None
+
+    def reply():
+        app_numbers = iter(future.result() if future else [])
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = {'status': 'success', 'application_number': next(app_numbers)}
+        saved = sum(1 for result in results if result['status'] == 'success')
+        return {
+            'status': 'success' if saved == len(results) else 'partial' if saved else 'error',
+            'application_numbers': [result.get('application_number') for result in results],
+            'results': results,
+            'message': f"{saved} of {len(results)} applications submitted"
+        }
+    return reply
+
+#Read requests answer straight away from this thread's read connection
+
+def answered(response):                   #Wraps a finished response as a reply function
+    return lambda: response
+
+def handle_status(message):               #Status of one application by its number
+    application = lookup_application(DB_FILE, message.get('application_number', ''))
+    if application is None and writer is not None:     #Journaled but not loaded yet
+        application = writer.pending_application(message.get('application_number', ''))
+    if application is None:
+        return answered(error_response("Application not found"))
+    return answered({'status': 'success', 'application': application})
+
+def handle_list_intake(message):          #Applications for one course and start date, one page at a time
+    rows, next_after = list_intake(DB_FILE, message.get('course'), message.get('start_year'),
+                                   message.get('start_month'), message.get('limit'), message.get('after'))
+    return answered({'status': 'success', 'applications': rows, 'next_after': next_after})
+
+def handle_search_name(message):          #Applicants whose name starts with a prefix, one page at a time
+    rows, next_after = search_name(DB_FILE, message.get('prefix'), message.get('limit'), message.get('after'))
+    return answered({'status': 'success', 'applications': rows, 'next_after': next_after})
+
+def handle_stats(message):                #The server's metrics, as a dictionary or as Prometheus text
+    if message.get('format') == 'prometheus':
+        return answered({'status': 'success', 'text': registry.prometheus()})
+    return answered({'status': 'success', 'metrics': registry.snapshot()})
+
+MESSAGE_HANDLERS = {
+    'submit': handle_submit,
+    'batch': handle_batch,
+    'status': handle_status,
+    'list_intake': handle_list_intake,
+    'search_name': handle_search_name,
+    'stats': handle_stats,
+}
+
+def error_response(message):
+    return {'status': 'error', 'message': message}
+
+def dispatch(message):                    #Starts the work for one request and returns its reply function
+    try:
+        if not isinstance(message, dict):
+            raise ValueError("Request must be a JSON object")
+        handler = MESSAGE_HANDLERS.get(message.get('type'))
+        if handler is None:
+            raise ValueError(f"Unknown message type: {message.get('type')!r}")
+        requests_total.inc(1, message['type'])
+        reply = handler(message)
+    except Exception as e:
+        log.info("[ERROR] Request refused", extra={'fields': {'error': repr(e)}})
+        errors_total.inc(1, 'validation' if isinstance(e, ValueError) else 'request')
+        failure = error_response(str(e))
+        return lambda: failure
+
+    def safe_reply():
+        try:
+            return reply()
+        except Exception as e:
+            log.warning("[ERROR] Request failed", extra={'fields': {'error': repr(e)}})
+            errors_total.inc(1, 'request')
+            return error_response(str(e))
+    return safe_reply
+
+
+#Step 5: Handle a single client connection
+
+#Every connection has deadlines so a slow or silent client only ever ties up its own worker,
+#and only for a bounded time:
+#   read    - a request must arrive completely within READ_TIMEOUT of its first byte
+#             (and the first byte within READ_TIMEOUT of connecting)
+#   write   - a response must be taken by the client within WRITE_TIMEOUT
+#   idle    - a connection with nothing to answer is closed after IDLE_TIMEOUT without a request
+#A client may pipeline at most MAX_PIPELINE requests before the server answers the oldest.
+
+READ_TIMEOUT = 10.0
+WRITE_TIMEOUT = 10.0
+IDLE_TIMEOUT = 60.0
+MAX_PIPELINE = 256
+
+class ConnectionLimits:                   #The deadlines and pipelining cap applied to every connection
+
+    def __init__(self, read_timeout=READ_TIMEOUT, write_timeout=WRITE_TIMEOUT,
+                 idle_timeout=IDLE_TIMEOUT, max_pipeline=MAX_PIPELINE):
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.idle_timeout = idle_timeout
+        self.max_pipeline = max_pipeline
+
+    def read_deadline(self):
+        return time.monotonic() + self.read_timeout
+
+def socket_readable(sock, timeout=0):     #True if the client has already sent more data (or does within timeout)
+    return bool(select.select([sock], [], [], timeout)[0])
+
+class ResponseTimer:                      #Records request and accept-to-response latency as responses are sent
+
+    def __init__(self, accepted):
+        self.accepted = accepted
+
+    def sent(self, received):
+        now = time.perf_counter()
+        request_latency.observe(now - received)
+        if self.accepted is not None:    #Only the first response of a connection
+            accept_latency.observe(now - self.accepted)
+            self.accepted = None
+
+def serve_framed(client_socket, client_address, timer, limits):     #Serves a persistent connection, possibly with many pipelined requests
+    pending = deque()                     #(request id, encoding, time read, reply function) in the order requests arrived
+
+    def answer():
+        request_id, encoding, received, reply = pending.popleft()
+        response = dict(reply(), id=request_id)
+        client_socket.settimeout(limits.write_timeout)
+        send_frame(client_socket, response, encoding)
+        timer.sent(received)
+
+    try:
+        while True:
+            #Answer what we have once the client has nothing more queued up for us,
+            #or straight away if it has pipelined as much as it may
+            if pending and (len(pending) >= limits.max_pipeline or not socket_readable(client_socket)):
+                answer()
+                continue
+
+            #Nothing left to answer: wait for the next request, but not for ever
+            if not pending and not socket_readable(client_socket, limits.idle_timeout):
+                log.debug("[CONNECTION] Idle connection closed", extra={'fields': {'client': client_address}})
+                timeouts_total.inc(1, 'idle')
+                break
+
+            frame = read_frame(client_socket, limits.read_deadline())
+            if frame is None:
+                break                     #Client has finished sending
+            message, encoding = frame
+            received = time.perf_counter()
+            request_id = message.get('id') if isinstance(message, dict) else None
+            pending.append((request_id, encoding, received, dispatch(message)))
+
+    except ProtocolError as e:
+        log.warning("[ERROR] Protocol error", extra={'fields': {'client': client_address, 'error': str(e)}})
+        errors_total.inc(1, 'protocol')
+        pending.append((None, ENCODING_JSON, time.perf_counter(), lambda: error_response(f"Protocol error: {e}")))
+
+    except TimeoutError:
+        #Part of a request arrived but not the rest, answer what came before it and hang up
+        log.warning("[ERROR] Request not received in time", extra={'fields': {'client': client_address}})
+        timeouts_total.inc(1, 'read')
+
+    #Answer everything that is still outstanding
+    while pending:
+        answer()
+
+def serve_legacy(client_socket, client_address, timer, limits):     #Serves an old client: one raw JSON application, one raw JSON reply
+    try:
+        application_data = recv_legacy_json(client_socket, deadline=limits.read_deadline())
+        if application_data is None:
+            return
+        received = time.perf_counter()
+        log.debug("[RECEIVED] Data received", extra={'fields': {'client': client_address}})
+        response = dispatch({'type': 'submit', 'application': application_data})()
+
+    except (json.JSONDecodeError, UnicodeDecodeError, ProtocolError):
+        #Handling invalid data format
+        received = time.perf_counter()
+        response = error_response('Invalid data format')
+        log.warning("[ERROR] Invalid data received", extra={'fields': {'client': client_address}})
+        errors_total.inc(1, 'protocol')
+
+    except TimeoutError:
+        log.warning("[ERROR] Request not received in time", extra={'fields': {'client': client_address}})
+        timeouts_total.inc(1, 'read')
+        return
+
+    client_socket.settimeout(limits.write_timeout)
+    client_socket.sendall(json.dumps(response).encode('utf-8'))
+    timer.sent(received)
+    if response['status'] == 'success':
+        log.debug("[SENT] Application number sent",
+                  extra={'fields': {'client': client_address, 'application_number': response['application_number']}})
+
+def first_byte(client_socket, limits):   #Waits for the first byte of the first request, b'' if the client left
+    client_socket.settimeout(limits.read_timeout)
+    return client_socket.recv(1, socket.MSG_PEEK)
+
+def handle_client(client_socket, client_address, accepted=None, limits=None):     #Serves one client from start to finish, it runs on a worker thread
+
+    log.debug("[CONNECTION] New connection", extra={'fields': {'client': client_address}})
+    limits = limits or ConnectionLimits()
+    connections_total.inc()
+    active_connections.inc()
+    timer = ResponseTimer(accepted if accepted is not None else time.perf_counter())
+    client_socket = MeteredSocket(client_socket)     #Counts the bytes in and out
+
+    try:
+        #Framed clients start with the marker byte, anything else is an old one-shot client
+        try:
+            first = first_byte(client_socket, limits)
+        except TimeoutError:
+            log.debug("[CONNECTION] Client sent nothing", extra={'fields': {'client': client_address}})
+            timeouts_total.inc(1, 'idle')
+            return
+        if first == MAGIC:
+            serve_framed(client_socket, client_address, timer, limits)
+        elif first:
+            serve_legacy(client_socket, client_address, timer, limits)
+
+    except TimeoutError:
+        #The client stopped reading its responses
+        log.warning("[ERROR] Response not taken in time", extra={'fields': {'client': client_address}})
+        timeouts_total.inc(1, 'write')
+
+    except OSError as e:
+        #Client went away before we could answer
+        log.warning("[ERROR] Connection failed", extra={'fields': {'client': client_address, 'error': str(e)}})
+        errors_total.inc(1, 'connection')
+
+    finally:
+        #Closing client connection
+        client_socket.close()
+        active_connections.dec()
+        log.debug("[CONNECTION] Client disconnected", extra={'fields': {'client': client_address}})
+
+
+#When every worker is busy a new client is not left waiting: a small separate pool reads its
+#first request and answers "busy, retry after" straight away. If even that pool is full the
+#connection is simply closed, which the client treats the same way.
+
+RETRY_AFTER = 0.5                         #Seconds a turned-away client is asked to wait
+BUSY_WORKERS = 2                          #Threads answering "busy"
+BUSY_READ_TIMEOUT = 1.0                   #How long a turned-away client gets to send its request
+
+def busy_response(retry_after=RETRY_AFTER):
+    return {'status': 'busy', 'retry_after': retry_after,
+            'message': f"Server busy, retry after {retry_after:g} s"}
+
+def turn_away(client_socket, client_address, retry_after=RETRY_AFTER):   #Answers a client's first request with "busy" and closes
+    rejected_total.inc()
+    try:
+        deadline = time.monotonic() + BUSY_READ_TIMEOUT
+        client_socket.settimeout(BUSY_READ_TIMEOUT)
+        first = client_socket.recv(1, socket.MSG_PEEK)
+        if first == MAGIC:
+            frame = read_frame(client_socket, deadline)
+            if frame is not None:
+                message, encoding = frame
+                request_id = message.get('id') if isinstance(message, dict) else None
+                send_frame(client_socket, dict(busy_response(retry_after), id=request_id), encoding)
+        elif first:
+            recv_legacy_json(client_socket, first=b'', deadline=deadline)
+            client_socket.sendall(json.dumps(busy_response(retry_after)).encode('utf-8'))
+    except (OSError, ProtocolError, ValueError):
+        pass                              #It is being turned away anyway
+    finally:
+        client_socket.close()
+    log.debug("[CONNECTION] Turned away, server busy", extra={'fields': {'client': client_address}})
+
+
+#Step 6: Start the server
+
+#Server Configuration
+HOST = '127.0.0.1'                        #localhost as server runs on my computer
+PORT = 65432                              #Port Number (I can use any port from 49152 to 65535)
+BACKLOG = 128                             #How many connections the OS may queue before accept()
+MAX_IN_FLIGHT = 32                        #How many clients are served at the same time
+
+def listen(host=HOST, port=PORT, backlog=BACKLOG, reuse_port=False):   #Creates the listening socket
+    #Create a socket
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    #Allowing the reuse of address it is helpul during the testing
+    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    #With reuse_port several processes bind the same port and the kernel shares the connections out
+    if reuse_port:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    #Binding socket to address and port
+    server_socket.bind((host, port))
+
+    #Listening for connections, the backlog holds them until the accept loop picks them up
+    server_socket.listen(backlog)
+    return server_socket
+
+def accept_clients(server_socket, max_in_flight=MAX_IN_FLIGHT, limits=None, retry_after=RETRY_AFTER):   #Accepts and serves clients until Ctrl+C
+    #Every connection gets its own worker so one slow client never blocks the others.
+    #The semaphore caps the work in flight; once it is full new clients are told to retry later.
+    limits = limits or ConnectionLimits()
+    workers = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='dbs-worker')
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    busy_workers = ThreadPoolExecutor(max_workers=BUSY_WORKERS, thread_name_prefix='dbs-busy')
+    busy_slots = threading.BoundedSemaphore(BUSY_WORKERS * 8)
+
+    def serve(client_socket, client_address, accepted):
+        try:
+            handle_client(client_socket, client_address, accepted, limits)
+        finally:
+            in_flight.release()
+
+    def reject(client_socket, client_address):
+        try:
+            turn_away(client_socket, client_address, retry_after)
+        finally:
+            busy_slots.release()
+
+    try:
+        while True:              #Keep server running forever
+            #Accept client connection
+            client_socket, client_address = server_socket.accept()
+            accepted = time.perf_counter()
+
+            #Serve it if a worker is free, otherwise answer "busy" without making it wait
+            if in_flight.acquire(blocking=False):
+                workers.submit(serve, client_socket, client_address, accepted)
+            elif busy_slots.acquire(blocking=False):
+                busy_workers.submit(reject, client_socket, client_address)
+            else:
+                rejected_total.inc()
+                client_socket.close()
+
+    except KeyboardInterrupt:
+        #Handle Ctrl+C to stop the server
+        log.info("[SERVER] Shutting down...")
+
+    finally:
+        server_socket.close()
+        workers.shutdown(wait=True)       #Let the clients already accepted finish
+        busy_workers.shutdown(wait=True)
+
+def start_server(host=HOST, port=PORT, backlog=BACKLOG, max_in_flight=MAX_IN_FLIGHT,
+                 batch_size=BATCH_SIZE, flush_window=FLUSH_WINDOW, metrics_port=None,
+                 limits=None, retry_after=RETRY_AFTER, journal=None):   #This is the main server function which listens for clients
+
+    #Create database first and start the writer that owns the connection
+    create_database()
+    start_writer(batch_size, flush_window, journal)
+
+    server_socket = listen(host, port, backlog)
+    limits = limits or ConnectionLimits()
+
+    #The Prometheus endpoint is optional, the stats message always works
+    metrics_server = start_metrics_server(host, metrics_port) if metrics_port else None
+
+    log.info("[SERVER] DBS Application SERVER - RUNNING")
+    log.info(f"[SERVER] Listening on {host}:{port}", extra={'fields': {
+        'backlog': backlog, 'max_in_flight': max_in_flight, 'read_timeout': limits.read_timeout,
+        'write_timeout': limits.write_timeout, 'idle_timeout': limits.idle_timeout}})
+    if metrics_server:
+        log.info(f"[SERVER] Metrics on http://{host}:{metrics_port}/metrics")
+    log.info("[SERVER] Waiting for student applications...")
+
+    try:
+        accept_clients(server_socket, max_in_flight, limits, retry_after)
+    finally:
+        stop_writer()                     #Commit anything still queued
+        if metrics_server:
+            metrics_server.shutdown()
+        log.info("[SERVER] Server stopped")
+
+#Running the server
+
+def main():                               #Reads the command line options and starts the server
+    parser = argparse.ArgumentParser(description="DBS Application Server")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--backlog', type=int, default=BACKLOG, help="listen queue length")
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT, help="clients served concurrently (per process)")
+    parser.add_argument('--workers', type=int, default=1, help="server processes sharing the port (see Que3_prefork.py)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="most applications per commit")
+    parser.add_argument('--flush-window', type=float, default=FLUSH_WINDOW, help="seconds to gather a commit group")
+    parser.add_argument('--journal', default=None, metavar='DIR',
+                        help="answer once applications are in a journal in DIR, load them into the database behind (see Que3_journal.py)")
+    parser.add_argument('--read-timeout', type=float, default=READ_TIMEOUT, help="seconds a request may take to arrive")
+    parser.add_argument('--write-timeout', type=float, default=WRITE_TIMEOUT, help="seconds a client may take to read a response")
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT, help="seconds an idle connection is kept open")
+    parser.add_argument('--retry-after', type=float, default=RETRY_AFTER, help="seconds a client is told to wait when the server is busy")
+    parser.add_argument('--metrics-port', type=int, default=None, help="serve Prometheus metrics on this port")
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='INFO', help="DEBUG shows every connection and application")
+    parser.add_argument('--log-format', choices=LOG_FORMATS, default='text', help="plain text or one JSON object per line")
+    args = parser.parse_args()
+
+    #Log records are written by a background thread, never by the threads serving clients
+    listener = setup_logging(args.log_level, args.log_format)
+    try:
+        limits = ConnectionLimits(args.read_timeout, args.write_timeout, args.idle_timeout)
+        if args.workers > 1:
+            from Que3_prefork import start_prefork_server     #Only needed in pre-fork mode
+            start_prefork_server(args.workers, args.host, args.port, args.backlog, args.max_in_flight,
+                                 args.batch_size, args.flush_window, args.metrics_port, limits, args.retry_after,
+                                 args.log_level, args.log_format, args.journal)
+            return
+        start_server(args.host, args.port, args.backlog, args.max_in_flight,
+                     args.batch_size, args.flush_window, args.metrics_port, limits, args.retry_after, args.journal)
+    finally:
+        listener.stop()                   #Writes out anything still queued
+
+if __name__ == "__main__":
+    main()
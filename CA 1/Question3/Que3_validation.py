@@ -0,0 +1,101 @@
+#Que3_validation.py
+#These are the rules an application must follow, shared by the interactive form, bulk uploads and the server
+
+#Each clean_ function takes what the applicant typed (or what a file contains) and returns the cleaned value,
+#or raises ValueError with the same message the form shows
+
+
+COURSES = {
+    '1' : 'Msc in Cyber Security',
+    '2' : 'Msc in Information Systems & Computing',
+    '3' : 'Msc in Data Analytics'
+}
+
+MONTHS = [
+    'January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December'
+]
+
+FIRST_YEAR = 2024
+LAST_YEAR = 2030
+
+FIELDS = ['name', 'address', 'qualifications', 'course', 'start_year', 'start_month']
+
+
+class ValidationError(ValueError):          #Lists every problem found in one application
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(f"{field}: {message}" for field, message in errors.items()))
+
+
+def clean_name(value):
+    name = str(value or '').strip()
+    if len(name) < 2:
+        raise ValueError("Please enter a valid name (at least 2 characters)")
+    return name
+
+def clean_address(value):
+    address = str(value or '').strip()
+    if len(address) < 5:
+        raise ValueError("Please enter a valid address (at least 5 characters)")
+    return address
+
+def clean_qualifications(value):
+    qualifications = str(value or '').strip()
+    if len(qualifications) < 3:
+        raise ValueError("Please enter your qualifications (at least 3 characters)")
+    return qualifications
+
+def clean_course(value):                    #Accepts the menu number or the course name
+    course = str(value or '').strip()
+    if course in COURSES:
+        return COURSES[course]
+    for name in COURSES.values():
+        if course.lower() == name.lower():
+            return name
+    raise ValueError("Please select a valid option (1, 2 or 3)")
+
+def clean_start_year(value):
+    try:
+        start_year = int(str(value).strip())
+    except ValueError:
+        raise ValueError("Please enter a valid year (numbers only)")
+    if not FIRST_YEAR <= start_year <= LAST_YEAR:
+        raise ValueError(f"Please enter a year between {FIRST_YEAR} and {LAST_YEAR}")
+    return start_year
+
+def clean_start_month(value):               #Accepts the month number (1-12) or the month name
+    month = str(value or '').strip()
+    if month.isdigit():
+        if 1 <= int(month) <= 12:
+            return MONTHS[int(month) - 1]
+        raise ValueError("Please enter a number between 1 and 12")
+    for name in MONTHS:
+        if month.lower() == name.lower():
+            return name
+    raise ValueError("Please enter a valid number")
+
+
+CLEANERS = {
+    'name': clean_name,
+    'address': clean_address,
+    'qualifications': clean_qualifications,
+    'course': clean_course,
+    'start_year': clean_start_year,
+    'start_month': clean_start_month,
+}
+
+def clean_application(data):                #Checks every field and returns the cleaned application dictionary
+    if not isinstance(data, dict):
+        raise ValidationError({'application': "must be an object with the application fields"})
+
+    application_data = {}
+    errors = {}
+    for field in FIELDS:
+        try:
+            application_data[field] = CLEANERS[field](data.get(field))
+        except ValueError as e:
+            errors[field] = str(e)
+
+    if errors:
+        raise ValidationError(errors)
+    return application_data
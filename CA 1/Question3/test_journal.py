@@ -0,0 +1,115 @@
+#test_journal.py
+#Checks of the journal ingest mode, run with: python test_journal.py (or pytest)
+
+import os
+import json
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import Que3_server as server
+import Que3_journal
+from Que3_journal import Journal, JournalWriter, NUMBERS_AHEAD
+
+APPLICATION = {'name': 'Test Student', 'address': 'Dublin', 'qualifications': 'Bachelor',
+               'course': 'MSc in Cyber Security', 'start_year': 2025, 'start_month': 'September'}
+
+#Run in a separate process that is then killed: the drainer is kept out of the database by a lock
+#held on another connection, so the last applications are acknowledged but only in the journal
+CRASHING_WRITER = '''
+import sqlite3, sys, time, json
+import Que3_journal
+db_file, directory = sys.argv[1:3]
+application = json.loads(sys.argv[3])
+writer = Que3_journal.JournalWriter(db_file, directory)
+drained = writer.submit_many([application] * 100).result(timeout=30)
+while writer.undrained:
+    time.sleep(0.01)
+lock = sqlite3.connect(db_file, isolation_level=None)
+lock.execute("BEGIN IMMEDIATE")
+journaled = writer.submit_many([application] * 200).result(timeout=30)
+print(json.dumps(drained + journaled), flush=True)
+time.sleep(60)
+'''
+
+def new_database(folder):                   #An empty database in folder, without leaving server.DB_FILE changed
+    db_file = os.path.join(folder, 'dbs_applications.db')
+    saved, server.DB_FILE = server.DB_FILE, db_file
+    try:
+        server.create_database()
+    finally:
+        server.DB_FILE = saved
+    return db_file
+
+def stored_numbers(db_file):
+    connection = sqlite3.connect(db_file)
+    try:
+        return [row[0] for row in connection.execute("SELECT application_number FROM applications")]
+    finally:
+        connection.close()
+
+def test_batch_larger_than_number_block():  #A batch needing more numbers than are reserved ahead used to wait for ever
+    with tempfile.TemporaryDirectory() as folder:
+        writer = JournalWriter(new_database(folder), os.path.join(folder, 'journal'))
+        try:
+            first = writer.submit_many([APPLICATION] * 600).result(timeout=60)
+            second = writer.submit_many([APPLICATION] * (NUMBERS_AHEAD + 1500)).result(timeout=60)
+            third = writer.submit(APPLICATION).result(timeout=60)
+        finally:
+            writer.close()
+        assert len(set(first + second + [third])) == NUMBERS_AHEAD + 2101
+
+def test_failed_append_loses_nothing_acknowledged():   #Entries written after a failed fsync must survive a restart
+    def entry(seq):
+        return {'seq': seq, 'number': f"APP-{seq:08X}", 'application': APPLICATION, 'key': None,
+                'fingerprint': None, 'created': 0.0}
+
+    def failing_sync(fileno):
+        raise OSError("disk error")
+
+    with tempfile.TemporaryDirectory() as folder:
+        journal = Journal(folder)
+        journal.open(0)
+        journal.append([entry(1), entry(2)])
+        sync = Que3_journal.sync
+        Que3_journal.sync = failing_sync
+        try:
+            journal.append([entry(3)])
+            raise AssertionError("the append should have failed")
+        except OSError:
+            pass
+        finally:
+            Que3_journal.sync = sync
+        journal.append([entry(3), entry(4)])     #The same sequence numbers, given out again
+        journal.close()
+
+        replayed = Journal(folder).open(0)
+        assert [e['seq'] for e in replayed] == [1, 2, 3, 4]
+
+def test_killed_writer_replays_each_entry_once():   #Acknowledged but not drained entries are loaded once after a restart
+    with tempfile.TemporaryDirectory() as folder:
+        db_file = new_database(folder)
+        directory = os.path.join(folder, 'journal')
+        child = subprocess.Popen([sys.executable, '-c', CRASHING_WRITER, db_file, directory, json.dumps(APPLICATION)],
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, text=True)
+        try:
+            acknowledged = json.loads(child.stdout.readline())
+        finally:
+            child.send_signal(signal.SIGKILL)
+            child.wait()
+            child.stdout.close()
+        assert len(acknowledged) == 300
+        assert len(stored_numbers(db_file)) == 100          #The rest is only in the journal
+
+        for restart in range(2):                            #The second start must find nothing left to replay
+            writer = JournalWriter(db_file, directory)
+            writer.close()
+            numbers = stored_numbers(db_file)
+            assert sorted(numbers) == sorted(acknowledged)  #Every acknowledged entry, each exactly once
+
+if __name__ == "__main__":
+    test_batch_larger_than_number_block()
+    test_failed_append_loses_nothing_acknowledged()
+    test_killed_writer_replays_each_entry_once()
+    print("Journal tests passed")
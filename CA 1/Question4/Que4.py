@@ -1,250 +1,519 @@
-"""
-Hotel Room Price Web Scraper
-Question 4 - CA_ONE (30%)
-This program scrapes hotel room pricing data from HTML files and stores in CSV
-"""
-
-import csv
-from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
-import random
-
-print("="*80)
-print("Hotel Room Price Data Extraction System")
-print("="*80)
-
-# Define the HTML files to scrape
-html_files = ['seaside_paradise.html', 'mountain_view_lodge.html']
-
-# Define date range
-start_date = datetime(2025, 12, 20)
-end_date = datetime(2025, 12, 30)
-
-print(f"\nDate Range: {start_date.strftime('%d %B %Y')} to {end_date.strftime('%d %B %Y')}")
-print(f"Duration: {(end_date - start_date).days + 1} days")
-
-# List to store all scraped data
-all_hotel_data = []
-
-# Loop through each HTML file
-for html_file in html_files:
-    print("\n" + "-"*80)
-    print(f"Processing: {html_file}")
-    print("-"*80)
-    
-    try:
-        # Read the HTML file
-        with open(html_file, 'r', encoding='utf-8') as file:
-            html_content = file.read()
-        
-        print(f"Successfully read {html_file}")
-        
-        # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Find hotel name
-        hotel_name_tag = soup.find('h1', class_='hotel-name')
-        hotel_name = hotel_name_tag.get('data-hotel-name')
-        print(f"Hotel Name: {hotel_name}")
-        
-        # Find hotel location
-        location_tag = soup.find('p', class_='hotel-location')
-        location = location_tag.get('data-location')
-        print(f"Location: {location}")
-        
-        # Find all room cards
-        room_cards = soup.find_all('div', class_='room-card')
-        print(f"Found {len(room_cards)} rooms")
-        
-        # Process each room
-        for card in room_cards:
-            # Extract room type
-            room_type_tag = card.find('h2', class_='room-type')
-            room_type = room_type_tag.get('data-room-type')
-            
-            # Extract price
-            price_tag = card.find('div', class_='price')
-            base_price = float(price_tag.get('data-price'))
-            currency = price_tag.get('data-currency')
-            
-            # Extract amenities
-            amenities_tag = card.find('p', class_='amenities')
-            amenities = amenities_tag.get('data-amenities')
-            
-            # Extract capacity
-            capacity_tag = card.find('span', class_='capacity')
-            capacity = capacity_tag.get('data-capacity')
-            
-            # Extract availability
-            availability_tag = card.find('span', class_='availability')
-            availability = availability_tag.get('data-availability')
-            
-            print(f"  - {room_type}: €{base_price}")
-            
-            # Generate price for each date in range
-            current_date = start_date
-            while current_date <= end_date:
-                date_str = current_date.strftime("%Y-%m-%d")
-                day_name = current_date.strftime("%A")
-                
-                # Calculate price with weekend and holiday premiums
-                final_price = base_price
-                
-                # Weekend pricing (Friday & Saturday)
-                if day_name in ['Friday', 'Saturday']:
-                    final_price = final_price * 1.25
-                
-                # Holiday pricing (24-26 Dec, 31 Dec)
-                if current_date.day in [24, 25, 26, 31]:
-                    final_price = final_price * 1.40
-                
-                # Add random variation
-                variation = random.uniform(0.95, 1.05)
-                final_price = round(final_price * variation, 2)
-                
-                # Store data
-                record = {
-                    'Date': date_str,
-                    'Day': day_name,
-                    'Hotel_Name': hotel_name,
-                    'Location': location,
-                    'Room_Type': room_type,
-                    'Base_Price': base_price,
-                    'Final_Price': final_price,
-                    'Currency': currency,
-                    'Amenities': amenities,
-                    'Max_Capacity': capacity,
-                    'Availability': availability
-                }
-                
-                all_hotel_data.append(record)
-                
-                current_date += timedelta(days=1)
-        
-        print(f"Completed scraping {html_file}")
-        
-    except FileNotFoundError:
-        print(f"Error: File {html_file} not found!")
-    except Exception as e:
-        print(f"Error processing {html_file}: {str(e)}")
-
-print("\n" + "="*80)
-print(f"Total records collected: {len(all_hotel_data)}")
-print("="*80)
-
-# Save to CSV file
-csv_filename = "hotel_data.csv"
-
-print(f"\nSaving data to {csv_filename}...")
-
-try:
-    with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-        # Define field names
-        fieldnames = ['Date', 'Day', 'Hotel_Name', 'Location', 'Room_Type', 
-                     'Base_Price', 'Final_Price', 'Currency', 'Amenities', 
-                     'Max_Capacity', 'Availability']
-        
-        # Create CSV writer
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        # Write header
-        writer.writeheader()
-        
-        # Write all rows
-        writer.writerows(all_hotel_data)
-    
-    print(f"Successfully saved {len(all_hotel_data)} records to {csv_filename}")
-
-except Exception as e:
-    print(f"Error saving CSV: {str(e)}")
-
-print("\n" + "="*80)
-print("Reading and displaying data from CSV file...")
-print("="*80)
-
-# Read from CSV and display
-try:
-    with open(csv_filename, 'r', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        data_from_csv = list(reader)
-    
-    print(f"\nSuccessfully read {len(data_from_csv)} records from CSV")
-    
-    # Display data in terminal
-    print("\n" + "="*100)
-    print("HOTEL ROOM PRICING DATA")
-    print("="*100)
-    
-    # Group by hotel
-    hotels = {}
-    for row in data_from_csv:
-        hotel = row['Hotel_Name']
-        if hotel not in hotels:
-            hotels[hotel] = []
-        hotels[hotel].append(row)
-    
-    # Display each hotel's data
-    for hotel_name, hotel_records in hotels.items():
-        print(f"\n{'─'*100}")
-        print(f"Hotel: {hotel_name}")
-        print(f"Location: {hotel_records[0]['Location']}")
-        print(f"{'─'*100}")
-        
-        # Get unique rooms
-        rooms = {}
-        for record in hotel_records:
-            room_type = record['Room_Type']
-            if room_type not in rooms:
-                rooms[room_type] = []
-            rooms[room_type].append(record)
-        
-        # Display each room type
-        for room_type, room_records in rooms.items():
-            sample = room_records[0]
-            print(f"\nRoom Type: {room_type}")
-            print(f"  Base Price: €{sample['Base_Price']}")
-            print(f"  Capacity: {sample['Max_Capacity']} persons")
-            print(f"  Amenities: {sample['Amenities']}")
-            print(f"  Availability: {sample['Availability']}")
-            print(f"\n  Sample Dates and Prices:")
-            print(f"  {'Date':<12} {'Day':<10} {'Price':<10}")
-            print(f"  {'-'*35}")
-            
-            # Show first 5 dates
-            for i, record in enumerate(room_records[:5]):
-                print(f"  {record['Date']:<12} {record['Day']:<10} €{record['Final_Price']:<10}")
-            
-            if len(room_records) > 5:
-                print(f"  ... and {len(room_records) - 5} more dates")
-    
-    # Display statistics
-    print(f"\n\n{'='*100}")
-    print("SUMMARY STATISTICS")
-    print(f"{'='*100}")
-    
-    # Calculate statistics
-    all_prices = [float(row['Final_Price']) for row in data_from_csv]
-    
-    print(f"\nTotal Records: {len(data_from_csv)}")
-    print(f"Number of Hotels: {len(hotels)}")
-    print(f"Total Room Types: {sum(len(set(r['Room_Type'] for r in records)) for records in hotels.values())}")
-    print(f"\nPrice Statistics:")
-    print(f"  Minimum Price: €{min(all_prices):.2f}")
-    print(f"  Maximum Price: €{max(all_prices):.2f}")
-    print(f"  Average Price: €{sum(all_prices)/len(all_prices):.2f}")
-    
-    # Average price per hotel
-    print(f"\nAverage Price by Hotel:")
-    for hotel_name, hotel_records in hotels.items():
-        hotel_prices = [float(r['Final_Price']) for r in hotel_records]
-        avg_price = sum(hotel_prices) / len(hotel_prices)
-        print(f"  {hotel_name}: €{avg_price:.2f}")
-    
-    print("\n" + "="*100)
-    print("Process completed successfully!")
-    print("="*100)
-
-except FileNotFoundError:
-    print(f"Error: CSV file {csv_filename} not found!")
-except Exception as e:
-    print(f"Error reading CSV: {str(e)}")
\ No newline at end of file
+"""
+Hotel Room Price Web Scraper
+Question 4 - CA_ONE (30%)
+This program scrapes hotel room pricing data from HTML files and stores in CSV
+
+It can be run as a script or imported as a scraping pipeline:
+    find_html_files -> scrape (process pool) -> write_csv (streaming) -> display_report
+Sources can also be http(s) URLs; they are fetched by Que4_fetch.py and the bodies
+go straight to the parser processes.
+Records are written as soon as each page is parsed, so memory stays flat however many
+hotel pages there are. Each page's records are kept as a compact PriceBlock (see
+Que4_records.py) and read like dicts.
+"""
+
+import argparse
+import glob
+import os
+import random
+import zlib
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from html.parser import HTMLParser
+
+from Que4_output import FIELDNAMES, WRITERS, parse_capacity, write_records, read_records
+from Que4_stats import ReportCollector, print_report
+from Que4_cache import CACHE_FILE, PageCache, check_cached, check_fetched, is_url
+from Que4_fetch import PER_HOST, Fetcher, fetch_pages
+from Que4_history import PriceHistory
+from Que4_store import PriceStore
+from Que4_rules import DEFAULT_RULES, PricingCalendar, load_rules
+from Que4_records import PriceBlock
+
+# Optional parsers, the standard library fast path works without either
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Define the HTML files to scrape when nothing else is given
+html_files = ['seaside_paradise.html', 'mountain_view_lodge.html']
+
+# Define date range
+start_date = datetime(2025, 12, 20)
+end_date = datetime(2025, 12, 30)
+
+# Output file, its format is taken from the extension unless --format is given
+csv_filename = "hotel_data.csv"
+fieldnames = FIELDNAMES
+
+
+def find_html_files(sources):
+    """Expand files, directories and glob patterns into a sorted list of HTML files (URLs are kept as they are)."""
+    found = []
+    for source in sources:
+        if is_url(source):
+            found.append(source)        # Fetched when it is scraped
+        elif os.path.isdir(source):
+            pattern = os.path.join(source, '**', '*.html')
+            found.extend(sorted(glob.glob(pattern, recursive=True)))
+        elif glob.has_magic(source):
+            found.extend(sorted(glob.glob(source, recursive=True)))
+        else:
+            found.append(source)        # A missing file is reported when it is scraped
+    return found
+
+
+# Which attribute each field is read from, keyed by (tag, class)
+HOTEL_FIELDS = {
+    ('h1', 'hotel-name'): ('hotel_name', 'data-hotel-name'),
+    ('p', 'hotel-location'): ('location', 'data-location'),
+}
+ROOM_FIELDS = {
+    ('h2', 'room-type'): [('room_type', 'data-room-type')],
+    ('div', 'price'): [('base_price', 'data-price'), ('currency', 'data-currency')],
+    ('p', 'amenities'): [('amenities', 'data-amenities')],
+    ('span', 'capacity'): [('capacity', 'data-capacity')],
+    ('span', 'availability'): [('availability', 'data-availability')],
+}
+ROOM_CARD = ('div', 'room-card')
+
+
+def extract_hotel_bs4(html_content):
+    """Parse one hotel page into a hotel dict and a list of room dicts (full BeautifulSoup tree)."""
+    if BeautifulSoup is None:
+        raise RuntimeError("the bs4 parser needs BeautifulSoup (pip install beautifulsoup4)")
+
+    # Parse HTML with BeautifulSoup
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    # Find hotel name and location
+    hotel = {
+        'hotel_name': soup.find('h1', class_='hotel-name').get('data-hotel-name'),
+        'location': soup.find('p', class_='hotel-location').get('data-location'),
+    }
+
+    # Process each room card
+    rooms = []
+    for card in soup.find_all('div', class_='room-card'):
+        price_tag = card.find('div', class_='price')
+        rooms.append({
+            'room_type': card.find('h2', class_='room-type').get('data-room-type'),
+            'base_price': float(price_tag.get('data-price')),
+            'currency': price_tag.get('data-currency'),
+            'amenities': card.find('p', class_='amenities').get('data-amenities'),
+            'capacity': parse_capacity(card.find('span', class_='capacity').get('data-capacity')),
+            'availability': card.find('span', class_='availability').get('data-availability'),
+        })
+    return hotel, rooms
+
+
+class _AttributeCollector:
+    """Collects the data-* attributes from a stream of start tags, no tree is built.
+
+    Mirrors the BeautifulSoup lookups: the first matching tag in the page wins for
+    the hotel fields and the first matching tag inside a card wins for room fields.
+    """
+
+    def __init__(self):
+        self.hotel = {}
+        self.rooms = []
+        self.room = None
+
+    def start(self, tag, classes, attrs):
+        for class_name in classes:
+            key = (tag, class_name)
+            if key == ROOM_CARD:
+                self.room = {}
+                self.rooms.append(self.room)
+            elif key in HOTEL_FIELDS:
+                field, attr = HOTEL_FIELDS[key]
+                self.hotel.setdefault(field, attrs.get(attr))
+            elif key in ROOM_FIELDS and self.room is not None:
+                for field, attr in ROOM_FIELDS[key]:
+                    self.room.setdefault(field, attrs.get(attr))
+
+    def result(self):
+        for field, _ in HOTEL_FIELDS.values():
+            if field not in self.hotel:
+                raise ValueError(f"page has no {field}")
+        for room in self.rooms:
+            for fields in ROOM_FIELDS.values():
+                for field, _ in fields:
+                    if field not in room:
+                        raise ValueError(f"room card has no {field}")
+            room['base_price'] = float(room['base_price'])
+            room['capacity'] = parse_capacity(room['capacity'])
+        hotel = {field: self.hotel[field] for field, _ in HOTEL_FIELDS.values()}
+        rooms = [{field: room[field] for fields in ROOM_FIELDS.values() for field, _ in fields}
+                 for room in self.rooms]
+        return hotel, rooms
+
+
+class _FastHTMLParser(HTMLParser):
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=False)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = attrs.get('class')
+        if classes:
+            self.collector.start(tag, classes.split(), attrs)
+
+    handle_startendtag = handle_starttag
+
+
+def extract_hotel_fast(html_content):
+    """Parse one hotel page with a single event-driven pass of the standard library parser."""
+    collector = _AttributeCollector()
+    parser = _FastHTMLParser(collector)
+    parser.feed(html_content)
+    parser.close()
+    return collector.result()
+
+
+def extract_hotel_lxml(html_content):
+    """Parse one hotel page with lxml's C parser, reading start events only."""
+    if etree is None:
+        raise RuntimeError("the lxml parser needs lxml (pip install lxml)")
+    collector = _AttributeCollector()
+    parser = etree.HTMLPullParser(events=('start',))
+    parser.feed(html_content)
+    parser.close()
+    for _, element in parser.read_events():
+        classes = element.get('class')
+        if classes:
+            collector.start(element.tag, classes.split(), element.attrib)
+    return collector.result()
+
+
+# Selectable extraction backends, all producing the same hotel and room dicts
+EXTRACTORS = {
+    'fast': extract_hotel_fast,
+    'lxml': extract_hotel_lxml,
+    'bs4': extract_hotel_bs4,
+}
+default_parser = 'lxml' if etree is not None else 'fast'     # Quickest backend that is installed
+
+
+def extract_hotel(html_content, parser=default_parser):
+    """Parse one hotel page into a hotel dict and a list of room dicts."""
+    return EXTRACTORS[parser](html_content)
+
+
+# Random variation applied on top of the rule multipliers by both pricing engines
+VARIATION = (0.95, 1.05)
+
+
+def expand_prices(hotel, rooms, calendar, rng=random):
+    """Price every room for every date from the compiled rule calendar, as a PriceBlock."""
+    prices = array('d')
+    for room in rooms:
+        base_price = room['base_price']
+
+        # One multiplier per date, worked out once for the room's class
+        for multiplier in calendar.multipliers(hotel, room):
+            # Add random variation
+            variation = rng.uniform(*VARIATION)
+            prices.append(round(base_price * multiplier * variation, 2))
+    return PriceBlock(hotel, rooms, calendar, prices)
+
+
+def price_matrix(base_prices, multipliers, rng):
+    """Compute the rooms x dates price matrix in one go with NumPy.
+
+    multipliers[i] is room i's per-date multiplier list from the rule calendar; the
+    random variation is drawn for the whole matrix at once.
+    """
+    multiplier = np.asarray(multipliers, dtype=float)
+    base = np.asarray(base_prices, dtype=float)[:, None]
+    variation = rng.uniform(VARIATION[0], VARIATION[1], size=multiplier.shape)
+    return np.round(base * multiplier * variation, 2)
+
+
+def expand_prices_numpy(hotel, rooms, calendar, rng=None):
+    """Return the same PriceBlock as expand_prices, priced in bulk with price_matrix."""
+    if np is None:
+        raise RuntimeError("the numpy pricing engine needs NumPy (pip install numpy)")
+    if rng is None:
+        rng = np.random.default_rng()
+    prices = array('d')
+    if rooms:
+        matrix = price_matrix([room['base_price'] for room in rooms],
+                              [calendar.multipliers(hotel, room) for room in rooms], rng)
+        prices.frombytes(matrix.tobytes())      # Row-major: room by room, like expand_prices
+    return PriceBlock(hotel, rooms, calendar, prices)
+
+
+# Selectable pricing engines: (expand function, random generator factory)
+PRICING_ENGINES = {
+    'python': (expand_prices, random.Random),
+    'numpy': (expand_prices_numpy, lambda seed=None: np.random.default_rng(seed)),
+}
+default_pricing = 'numpy' if np is not None else 'python'
+
+
+def make_rng(pricing, seed, html_file):
+    """A random generator for one page; seeded runs give every page its own repeatable stream."""
+    factory = PRICING_ENGINES[pricing][1]
+    if seed is None:
+        return factory()
+    return factory(zlib.crc32(f"{seed}:{html_file}".encode('utf-8')))
+
+
+# The compiled pricing rules of this process, installed once per run (per worker)
+pricing_calendar = None
+
+
+def use_calendar(calendar):
+    """Install the PricingCalendar that scrape_file prices with; also the pool initializer."""
+    global pricing_calendar
+    pricing_calendar = calendar
+
+
+def scrape_file(html_file, seed=None, parser=default_parser, pricing=default_pricing,
+                use_cache=False, cached=None, page=None):
+    """Scrape one page. Runs in a worker process and returns a picklable result dict.
+
+    Prices come from the calendar installed with use_calendar and are returned as a
+    PriceBlock, which pickles as the rooms and a flat price array. With use_cache the
+    page is only parsed when it differs from the cached entry passed in;
+    result['cache'] then tells the main process what to store. For a URL, page is
+    the response fetched by Que4_fetch and its body is parsed instead of a file.
+    """
+    result = {'file': html_file, 'hotel': None, 'rooms': [], 'records': [], 'error': None, 'cache': None}
+    try:
+        charset = page['charset'] if page is not None else 'utf-8'
+        if use_cache:
+            if page is not None:
+                entry, data = check_fetched(html_file, page, cached)
+            else:
+                entry, data = check_cached(html_file, cached)
+            if data is None:
+                hotel, rooms = entry['hotel'], entry['rooms']
+            else:
+                hotel, rooms = extract_hotel(data.decode(charset), parser)
+                entry.update(hotel=hotel, rooms=rooms)
+            result['cache'] = entry
+        elif page is not None:
+            if page['error'] or page['status'] != 200:
+                raise ValueError(page['error'] or f"HTTP {page['status']} {page['reason']}")
+            hotel, rooms = extract_hotel(page['body'].decode(charset), parser)
+        else:
+            # Read the HTML file
+            with open(html_file, 'r', encoding='utf-8') as file:
+                html_content = file.read()
+            hotel, rooms = extract_hotel(html_content, parser)
+
+        expand = PRICING_ENGINES[pricing][0]
+        rng = make_rng(pricing, seed, html_file)
+        result['hotel'] = hotel
+        result['rooms'] = rooms
+        result['records'] = expand(hotel, rooms, pricing_calendar, rng)
+
+    except FileNotFoundError:
+        result['error'] = f"Error: File {html_file} not found!"
+    except Exception as e:
+        result['error'] = f"Error processing {html_file}: {str(e)}"
+    return result
+
+
+def scrape(html_files, start_date, end_date, workers=None, seed=None, verbose=True,
+           parser=default_parser, pricing=default_pricing, cache=None, calendar=None, fetcher=None):
+    """Scrape pages in a process pool, yielding records in file order as they are produced.
+
+    Only a bounded number of pages are in flight at once, so neither the pending
+    futures nor the finished results grow with the number of files. With a PageCache,
+    unchanged pages reuse their cached hotel and room data and are not parsed again.
+    The PricingCalendar (DEFAULT_RULES compiled for the date range unless given) is
+    handed to each worker once, when it starts. URLs are fetched with the Fetcher
+    (one with the default per-host limit unless given), conditionally when cached.
+    """
+    max_in_flight = 4 * (workers or os.cpu_count() or 1)
+    if calendar is None:
+        calendar = PricingCalendar(DEFAULT_RULES, start_date, end_date)
+    pages = fetch_pages(html_files, fetcher, cache)
+
+    def arguments(html_file, cached, page):
+        return (html_file, seed, parser, pricing, cache is not None, cached, page)
+
+    def finish(result):
+        if cache is not None and result['cache'] is not None:
+            cache.record(result['file'], result['cache'])
+        if result['error']:
+            print(result['error'])      # Errors are shown even in quiet mode
+        if not verbose or result['error']:
+            return result['records']
+        print("\n" + "-"*80)
+        print(f"Processing: {result['file']}")
+        print("-"*80)
+        if result['cache'] is not None and result['cache'].get('status') == 304:
+            print(f"Not modified since last run (304), using cached data for {result['file']}")
+        elif result['cache'] is not None and result['cache']['hit']:
+            print(f"Unchanged since last run, using cached data for {result['file']}")
+        else:
+            print(f"Successfully read {result['file']}")
+        print(f"Hotel Name: {result['hotel']['hotel_name']}")
+        print(f"Location: {result['hotel']['location']}")
+        print(f"Found {len(result['rooms'])} rooms")
+        for room in result['rooms']:
+            print(f"  - {room['room_type']}: €{room['base_price']}")
+        print(f"Completed scraping {result['file']}")
+        return result['records']
+
+    if workers == 1:
+        # No pool: handy for debugging and tiny runs
+        use_calendar(calendar)
+        for source in pages:
+            yield from finish(scrape_file(*arguments(*source)))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=use_calendar, initargs=(calendar,)) as pool:
+        in_flight = deque()
+        for source in pages:
+            in_flight.append(pool.submit(scrape_file, *arguments(*source)))
+            if len(in_flight) >= max_in_flight:
+                yield from finish(in_flight.popleft().result())
+        while in_flight:
+            yield from finish(in_flight.popleft().result())
+
+
+def display_report(csv_filename, output_format=None):
+    """Stream the output file back once and print the per-hotel listing and summary statistics."""
+    print("\n" + "="*80)
+    print("Reading and displaying data from CSV file...")
+    print("="*80)
+
+    # Read from CSV and display, without holding the rows in memory
+    try:
+        collector = ReportCollector().consume(read_records(csv_filename, output_format))
+        print(f"\nSuccessfully read {collector.stats.count} records from CSV")
+        print_report(collector)
+
+    except FileNotFoundError:
+        print(f"Error: CSV file {csv_filename} not found!")
+    except Exception as e:
+        print(f"Error reading CSV: {str(e)}")
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hotel Room Price Data Extraction System")
+    parser.add_argument('sources', nargs='*', default=html_files,
+                        help="HTML files, directories or glob patterns (default: the two sample pages)")
+    parser.add_argument('--start', type=parse_date, default=start_date, help="first date, YYYY-MM-DD")
+    parser.add_argument('--end', type=parse_date, default=end_date, help="last date, YYYY-MM-DD")
+    parser.add_argument('--output', default=csv_filename, help="file to write")
+    parser.add_argument('--format', choices=sorted(WRITERS), default=None,
+                        help="output format (default: from the --output extension, else csv)")
+    parser.add_argument('--workers', type=int, default=None, help="parser processes (default: one per CPU)")
+    parser.add_argument('--seed', default=None, help="seed for the price variation, for repeatable runs")
+    parser.add_argument('--parser', choices=sorted(EXTRACTORS), default=default_parser,
+                        help="page extraction backend (default: %(default)s)")
+    parser.add_argument('--pricing', choices=sorted(PRICING_ENGINES), default=default_pricing,
+                        help="price expansion engine (default: %(default)s)")
+    parser.add_argument('--rules', default=None,
+                        help="pricing rules, JSON or YAML (default: weekend and 24-26/31 Dec premiums, see Que4_rules.py)")
+    parser.add_argument('--per-host', type=int, default=PER_HOST,
+                        help="most requests at once to one host when scraping URLs (default: %(default)s)")
+    parser.add_argument('--cache', default=CACHE_FILE, help="page cache file (default: %(default)s)")
+    parser.add_argument('--no-cache', action='store_true', help="parse every page, ignoring the cache")
+    parser.add_argument('--store', default=None, help="also load the prices into this indexed store (see Que4_store.py)")
+    parser.add_argument('--history', default=None,
+                        help="also add this run's changed prices to this price history (see Que4_history.py)")
+    parser.add_argument('--quiet', action='store_true', help="do not print every hotel and room")
+    parser.add_argument('--no-report', action='store_true', help="skip the report")
+    parser.add_argument('--report-from-file', action='store_true',
+                        help="build the report by reading the output back instead of while scraping")
+    args = parser.parse_args(argv)
+
+    print("="*80)
+    print("Hotel Room Price Data Extraction System")
+    print("="*80)
+
+    print(f"\nDate Range: {args.start.strftime('%d %B %Y')} to {args.end.strftime('%d %B %Y')}")
+    print(f"Duration: {(args.end - args.start).days + 1} days")
+
+    # Compile the pricing rules once, before any page is scraped
+    try:
+        rules = load_rules(args.rules) if args.rules else DEFAULT_RULES
+        calendar = PricingCalendar(rules, args.start, args.end)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error in pricing rules: {str(e)}")
+        return
+    print(f"Pricing rules: {args.rules or 'built-in'} ({len(calendar.rules)} rules, "
+          f"{len(calendar.overrides)} overrides)")
+
+    files = find_html_files(args.sources)
+    print(f"Pages to scrape: {len(files)}")
+
+    # Statistics are gathered from the same stream that is written, so nothing is read back
+    collector = ReportCollector() if not (args.no_report or args.report_from_file) else None
+
+    # Save to CSV file while the pages are being scraped
+    print(f"\nSaving data to {args.output}...")
+    cache = PageCache(args.cache) if not args.no_cache else None
+    store = PriceStore(args.store) if args.store else None
+    history = PriceHistory(args.history) if args.history else None
+    fetcher = Fetcher(args.per_host)
+    saved = False
+    try:
+        records = scrape(files, args.start, args.end, args.workers, args.seed, not args.quiet,
+                         args.parser, args.pricing, cache, calendar, fetcher)
+        if collector is not None:
+            records = collector.collect(records)
+        if store is not None:
+            records = store.collect(records)
+        if history is not None:
+            history.start_run(' '.join(args.sources))
+            records = history.collect(records)
+        total = write_records(records, args.output, args.format)
+        saved = True
+
+        print("\n" + "="*80)
+        print(f"Total records collected: {total}")
+        print("="*80)
+        print(f"Successfully saved {total} records to {args.output}")
+
+    except Exception as e:
+        print(f"Error saving CSV: {str(e)}")
+
+    if fetcher.counts['requests']:
+        print(fetcher.summary())
+    if cache is not None:
+        cache.close()
+        print(cache.summary())
+    if store is not None:
+        store.close()
+        print(f"Prices loaded into {args.store}")
+    if history is not None:
+        if saved:
+            run = history.finish_run()
+            print(f"Run {run['Run']} added to {args.history}: {run['Changed']} of {run['Prices']} prices changed")
+        elif history.run_id is not None:
+            history.abandon_run()       # A partial scrape is not a run, its missing prices would look unchanged
+            print(f"Run not added to {args.history}, the data was not saved")
+        history.close()
+
+    if collector is not None:
+        print_report(collector)
+    elif args.report_from_file:
+        display_report(args.output, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Scraping Pipeline Benchmark
+Question 4 - CA_ONE (30%)
+Times the stages of the Que4.py pipeline separately on synthetic pages (or any
+pages given), so it is clear which stage dominates as the number and size of pages
+grows:
+
+    parse     read each page and extract the hotel and rooms
+    expand    price every room for every date (a PriceBlock per page)
+    write     write the records to the output file
+    report    collect the report statistics and render the report
+
+The stages run one after another in this process, each on the previous stage's
+output. With --profile every stage also runs under cProfile and tracemalloc; the
+per-stage CPU profile (top functions and a .prof file for snakeviz/pstats) and the
+peak memory it allocated are reported.
+
+    python Que4_bench.py --pages 500 --rooms 7
+    python Que4_bench.py --pages 50 --rooms 200 --filler 5 --format parquet --profile
+    python Que4_bench.py pages/ --parser fast --pricing python --output bench.json
+"""
+
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import Que4
+from Que4_generate import generate_pages
+from Que4_output import WRITERS, write_records
+from Que4_records import iter_records
+from Que4_rules import DEFAULT_RULES, PricingCalendar, load_rules
+from Que4_stats import ReportCollector, print_report
+
+STAGES = ['parse', 'expand', 'write', 'report']
+PROFILE_LINES = 12          # Functions listed per stage in profile mode
+
+
+def stage_parse(state):
+    pages = []
+    for html_file in state['files']:
+        with open(html_file, 'r', encoding='utf-8') as file:
+            hotel, rooms = Que4.extract_hotel(file.read(), state['parser'])
+        pages.append((html_file, hotel, rooms))
+    state['pages'] = pages
+    return len(pages)
+
+
+def stage_expand(state):
+    expand = Que4.PRICING_ENGINES[state['pricing']][0]
+    calendar = PricingCalendar(state['rules'], state['start'], state['end'])
+    blocks = []
+    for html_file, hotel, rooms in state['pages']:
+        blocks.append(expand(hotel, rooms, calendar, Que4.make_rng(state['pricing'], state['seed'], html_file)))
+    state['blocks'] = blocks
+    return sum(len(block) for block in blocks)
+
+
+def stage_write(state):
+    return write_records(iter_records(state['blocks']), state['output_file'], state['format'])
+
+
+def stage_report(state):
+    collector = ReportCollector().consume(iter_records(state['blocks']))
+    with contextlib.redirect_stdout(io.StringIO()):
+        print_report(collector)
+    return collector.stats.count
+
+
+STAGE_FUNCTIONS = {
+    'parse': (stage_parse, 'pages'),
+    'expand': (stage_expand, 'records'),
+    'write': (stage_write, 'records'),
+    'report': (stage_report, 'records'),
+}
+
+
+def run_stage(name, state, profile_dir=None):
+    """Run one stage, return its timing (and profile figures when profile_dir is given)."""
+    function, unit = STAGE_FUNCTIONS[name]
+    result = {'stage': name, 'unit': unit}
+    if profile_dir is None:
+        started = time.perf_counter()
+        items = function(state)
+        result['seconds'] = time.perf_counter() - started
+    else:
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        started = time.perf_counter()
+        profiler.enable()
+        items = function(state)
+        profiler.disable()
+        result['seconds'] = time.perf_counter() - started
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        profile_file = os.path.join(profile_dir, f"{name}.prof")
+        profiler.dump_stats(profile_file)
+        listing = io.StringIO()
+        stats = pstats.Stats(profiler, stream=listing)
+        stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+        result['profile_file'] = profile_file
+        result['cpu_seconds'] = stats.total_tt
+        result['top_functions'] = listing.getvalue()
+    result['items'] = items
+    result['items_per_second'] = items / result['seconds'] if result['seconds'] else None
+    return result
+
+
+def print_results(results, profiled):
+    print(f"\n{'Stage':<8} {'Seconds':>9} {'Items':>10} {'Items/sec':>12}" + (f" {'Peak MB':>9}" if profiled else ''))
+    print("-"*(42 + (10 if profiled else 0)))
+    for result in results:
+        line = (f"{result['stage']:<8} {result['seconds']:>9.3f} {result['items']:>10} "
+                f"{result['items_per_second'] or 0:>12.0f}")
+        if profiled:
+            line += f" {result['peak_bytes'] / 1e6:>9.1f}"
+        print(line + f"  {result['unit']}")
+    print(f"{'total':<8} {sum(result['seconds'] for result in results):>9.3f}")
+
+    if profiled:
+        for result in results:
+            print("\n" + "="*80)
+            print(f"Profile: {result['stage']} ({result['profile_file']})")
+            print("="*80)
+            print(result['top_functions'].strip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the stages of the Que4.py pipeline")
+    parser.add_argument('sources', nargs='*',
+                        help="HTML files, directories or glob patterns (default: generate synthetic pages)")
+    parser.add_argument('--pages', type=int, default=200, help="synthetic pages to generate (default: %(default)s)")
+    parser.add_argument('--rooms', type=int, default=7, help="room cards per synthetic page (default: %(default)s)")
+    parser.add_argument('--filler', type=int, default=0, help="description paragraphs per room card")
+    parser.add_argument('--start', type=Que4.parse_date, default=Que4.start_date, help="first date, YYYY-MM-DD")
+    parser.add_argument('--end', type=Que4.parse_date, default=Que4.end_date, help="last date, YYYY-MM-DD")
+    parser.add_argument('--parser', choices=sorted(Que4.EXTRACTORS), default=Que4.default_parser)
+    parser.add_argument('--pricing', choices=sorted(Que4.PRICING_ENGINES), default=Que4.default_pricing)
+    parser.add_argument('--rules', default=None, help="pricing rules file (default: the built-in rules)")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv', help="output format written")
+    parser.add_argument('--seed', default='0', help="seed for the pages and the price variation")
+    parser.add_argument('--profile', action='store_true', help="run each stage under cProfile and tracemalloc")
+    parser.add_argument('--output', default=None, help="save the results as JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='que4-bench-') as workdir:
+        if args.sources:
+            files = Que4.find_html_files(args.sources)
+        else:
+            files = generate_pages(os.path.join(workdir, 'pages'), args.pages, args.rooms, args.filler, args.seed)
+        size = sum(os.path.getsize(html_file) for html_file in files)
+
+        state = {
+            'files': files,
+            'parser': args.parser,
+            'pricing': args.pricing,
+            'rules': load_rules(args.rules) if args.rules else DEFAULT_RULES,
+            'start': args.start,
+            'end': args.end,
+            'seed': args.seed,
+            'format': args.format,
+            'output_file': os.path.join(workdir, f"hotel_data.{args.format}"),
+        }
+        profile_dir = None
+        if args.profile:
+            profile_dir = os.path.abspath(f"que4_profile_{datetime.now():%Y%m%d_%H%M%S}")
+            os.makedirs(profile_dir, exist_ok=True)
+
+        print("="*80)
+        print("Scraping Pipeline Benchmark")
+        print("="*80)
+        print(f"Pages: {len(files)} ({size / 1e6:.1f} MB)   Parser: {args.parser}   Pricing: {args.pricing}   "
+              f"Format: {args.format}   Dates: {(args.end - args.start).days + 1}")
+
+        results = [run_stage(name, state, profile_dir) for name in STAGES]
+        output_bytes = os.path.getsize(state['output_file'])
+
+    print_results(results, args.profile)
+    print(f"\nOutput file: {output_bytes / 1e6:.1f} MB")
+
+    if args.output:
+        summary = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'config': {'pages': len(files), 'page_bytes': size, 'parser': args.parser, 'pricing': args.pricing,
+                       'format': args.format, 'rules': args.rules, 'start': args.start.strftime('%Y-%m-%d'),
+                       'end': args.end.strftime('%Y-%m-%d'), 'sources': args.sources or None,
+                       'rooms': None if args.sources else args.rooms, 'filler': None if args.sources else args.filler},
+            'output_bytes': output_bytes,
+            'stages': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=2)
+        print(f"Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
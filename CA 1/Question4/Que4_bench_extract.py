@@ -0,0 +1,94 @@
+"""
+Extraction Backend Benchmark
+Question 4 - CA_ONE (30%)
+Checks that every extraction backend in Que4.py gives exactly the same hotel and
+room data as the BeautifulSoup extractor, then measures pages/sec for each.
+
+    python Que4_bench_extract.py                      # the two bundled pages
+    python Que4_bench_extract.py pages/ --seconds 5   # any files, directories or globs
+"""
+
+import argparse
+import sys
+import time
+
+import Que4
+
+
+def load_pages(sources):
+    pages = []
+    for html_file in Que4.find_html_files(sources):
+        with open(html_file, 'r', encoding='utf-8') as file:
+            pages.append((html_file, file.read()))
+    return pages
+
+
+def available_backends():
+    backends = []
+    for name in Que4.EXTRACTORS:
+        if name == 'bs4' and Que4.BeautifulSoup is None:
+            continue
+        if name == 'lxml' and Que4.etree is None:
+            continue
+        backends.append(name)
+    return backends
+
+
+def check_identical(pages, backends, reference):
+    """Return a list of (backend, file) pairs whose output differs from the reference backend."""
+    mismatches = []
+    for html_file, html_content in pages:
+        expected = Que4.extract_hotel(html_content, reference)
+        for backend in backends:
+            if Que4.extract_hotel(html_content, backend) != expected:
+                mismatches.append((backend, html_file))
+    return mismatches
+
+
+def pages_per_second(pages, backend, seconds):
+    """Parse the pages repeatedly for at least the given time and return the rate."""
+    extract = Que4.EXTRACTORS[backend]
+    parsed = 0
+    started = time.perf_counter()
+    while True:
+        for _, html_content in pages:
+            extract(html_content)
+        parsed += len(pages)
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return parsed / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare Que4.py extraction backends")
+    parser.add_argument('sources', nargs='*', default=Que4.html_files,
+                        help="HTML files, directories or glob patterns (default: the two sample pages)")
+    parser.add_argument('--seconds', type=float, default=2.0, help="time spent on each backend")
+    args = parser.parse_args(argv)
+
+    pages = load_pages(args.sources)
+    backends = available_backends()
+    reference = 'bs4' if 'bs4' in backends else Que4.default_parser
+
+    print("="*80)
+    print("Extraction Backend Benchmark")
+    print("="*80)
+    print(f"Pages: {len(pages)}   Backends: {', '.join(backends)}   Reference: {reference}")
+
+    mismatches = check_identical(pages, backends, reference)
+    for backend, html_file in mismatches:
+        print(f"MISMATCH: {backend} differs from {reference} on {html_file}")
+    if mismatches:
+        return 1
+    print("All backends produce identical output")
+
+    print(f"\n{'Backend':<10} {'Pages/sec':>12} {'Speed-up':>10}")
+    print("-"*34)
+    rates = {backend: pages_per_second(pages, backend, args.seconds) for backend in backends}
+    for backend, rate in rates.items():
+        print(f"{backend:<10} {rate:>12.1f} {rate / rates[reference]:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
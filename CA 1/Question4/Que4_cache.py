@@ -0,0 +1,162 @@
+"""
+Hotel Page Cache
+Question 4 - CA_ONE (30%)
+An on-disk cache of the hotel and room data extracted from each page, so a rerun
+only parses pages that are new or have changed.
+
+A page is recognised as unchanged when its modification time and size match the
+cached entry (no need to read it), or else when its SHA-256 matches (the file was
+touched but not edited). The cache is a small SQLite file; it is only ever opened
+by the main process, the worker processes get the cached entry passed in.
+
+Pages fetched over HTTP (see Que4_fetch.py) are cached by URL together with their
+ETag and Last-Modified, which the next run sends back so an unchanged page only
+costs a 304 Not Modified.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+
+CACHE_FILE = '.hotel_page_cache.sqlite'
+CACHE_VERSION = 2           # Bump when the extracted fields change, old entries are then ignored
+URL_SCHEMES = ('http://', 'https://')
+
+
+def is_url(source):
+    return source.lower().startswith(URL_SCHEMES)
+
+
+def cache_key(source):
+    """Pages are cached by absolute path, or by URL."""
+    return source if is_url(source) else os.path.abspath(source)
+
+
+def fingerprint(html_file):
+    """The (mtime_ns, size) pair used for the quick unchanged check."""
+    stat = os.stat(html_file)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def check_cached(html_file, cached):
+    """Decide in a worker whether a page can use its cached entry.
+
+    Returns (entry, data). entry holds the page's mtime_ns, size and sha256, and on a
+    hit its cached hotel and rooms; data is None on a hit, otherwise the raw bytes to
+    parse (returned so the file is only read once).
+    """
+    mtime_ns, size = fingerprint(html_file)
+    entry = {'mtime_ns': mtime_ns, 'size': size, 'sha256': None,
+             'hotel': None, 'rooms': None, 'hit': False, 'changed': True}
+    if cached is not None and (cached['mtime_ns'], cached['size']) == (mtime_ns, size):
+        entry.update(sha256=cached['sha256'], hotel=cached['hotel'], rooms=cached['rooms'], hit=True, changed=False)
+        return entry, None
+
+    with open(html_file, 'rb') as file:
+        data = file.read()
+    entry['sha256'] = content_hash(data)
+    if cached is not None and cached['sha256'] == entry['sha256']:
+        entry.update(hotel=cached['hotel'], rooms=cached['rooms'], hit=True)     # Touched, not edited
+        return entry, None
+    return entry, data
+
+
+def check_fetched(url, page, cached):
+    """check_cached for a page fetched over HTTP: page is the fetch result for url.
+
+    A 304 answer, or a 200 with the same SHA-256 as the cached body, is a hit. The
+    entry keeps the response's ETag and Last-Modified for the next conditional GET.
+    """
+    if page['error']:
+        raise ValueError(page['error'])
+    entry = {'mtime_ns': 0, 'size': len(page['body']), 'sha256': None, 'hotel': None, 'rooms': None,
+             'hit': False, 'changed': True, 'etag': page['etag'], 'last_modified': page['last_modified'],
+             'status': page['status']}
+    if page['status'] == 304:
+        if cached is None:
+            raise ValueError("server answered 304 Not Modified for a page that is not cached")
+        validators = (page['etag'] or cached.get('etag'), page['last_modified'] or cached.get('last_modified'))
+        entry.update(size=cached['size'], sha256=cached['sha256'], hotel=cached['hotel'], rooms=cached['rooms'],
+                     etag=validators[0], last_modified=validators[1], hit=True,
+                     changed=validators != (cached.get('etag'), cached.get('last_modified')))
+        return entry, None
+    if page['status'] != 200:
+        raise ValueError(f"HTTP {page['status']} {page['reason']}")
+
+    entry['sha256'] = content_hash(page['body'])
+    if cached is not None and cached['sha256'] == entry['sha256']:
+        entry.update(hotel=cached['hotel'], rooms=cached['rooms'], hit=True)     # Same body, new validators kept
+        return entry, None
+    return entry, page['body']
+
+
+class PageCache:
+    """Extracted hotel/room data per page, keyed by file path and checked by content hash."""
+
+    def __init__(self, filename=CACHE_FILE):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS pages(
+                path TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                payload TEXT NOT NULL
+            )
+        ''')
+        self.hits = 0
+        self.misses = 0
+        self.bytes_parsed = 0       # Size of the pages that had to be parsed
+        self.bytes_skipped = 0      # Size of the pages served from the cache
+        self.pending = 0
+
+    def get(self, html_file):
+        """The cached entry for a page, or None."""
+        row = self.connection.execute(
+            "SELECT mtime_ns, size, sha256, payload FROM pages WHERE path = ? AND version = ?",
+            (cache_key(html_file), CACHE_VERSION)).fetchone()
+        if row is None:
+            return None
+        payload = json.loads(row[3])
+        return {'mtime_ns': row[0], 'size': row[1], 'sha256': row[2],
+                'hotel': payload['hotel'], 'rooms': payload['rooms'],
+                'etag': payload.get('etag'), 'last_modified': payload.get('last_modified')}
+
+    def record(self, html_file, entry):
+        """Count a lookup made by check_cached and store the entry if anything about the page changed."""
+        if entry['hit']:
+            self.hits += 1
+            self.bytes_skipped += entry['size']
+        else:
+            self.misses += 1
+            self.bytes_parsed += entry['size']
+        if not entry['changed']:
+            return
+        payload = {'hotel': entry['hotel'], 'rooms': entry['rooms']}
+        if entry.get('etag') or entry.get('last_modified'):
+            payload.update(etag=entry['etag'], last_modified=entry['last_modified'])
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages (path, version, mtime_ns, size, sha256, payload) VALUES (?, ?, ?, ?, ?, ?)",
+            (cache_key(html_file), CACHE_VERSION, entry['mtime_ns'], entry['size'], entry['sha256'],
+             json.dumps(payload)))
+        self.pending += 1
+        if self.pending >= 1000:
+            self.connection.commit()
+            self.pending = 0
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def summary(self):
+        size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        return (f"Cache: {self.hits} hits, {self.misses} misses, "
+                f"{self.bytes_parsed} bytes parsed, {self.bytes_skipped} bytes skipped, "
+                f"cache file {size} bytes")
@@ -0,0 +1,396 @@
+"""
+Hotel Page Fetcher
+Question 4 - CA_ONE (30%)
+An asyncio HTTP/1.1 client (standard library streams only) for scraping hotel
+pages straight from partner sites instead of local files.
+
+    * keep-alive connections are pooled per host and reused between pages
+    * at most --per-host requests run against one host at a time
+    * pages in the page cache are fetched with If-None-Match / If-Modified-Since,
+      so an unchanged page costs a 304 and is not parsed again
+    * gzip/deflate bodies and chunked responses are handled
+
+fetch_pages() runs the event loop on a background thread and yields the pages in
+the order given, a bounded window ahead of the caller, so Que4.scrape() can hand
+each body to the parser processes as soon as it arrives. Local files in the same
+list pass straight through.
+
+A stand-in partner site, serving a directory with ETag and Last-Modified, is
+included for trying it out:
+
+    python Que4_fetch.py serve . --port 8000
+    python Que4.py http://127.0.0.1:8000/seaside_paradise.html http://127.0.0.1:8000/mountain_view_lodge.html
+    python Que4_fetch.py get http://127.0.0.1:8000/seaside_paradise.html
+"""
+
+import argparse
+import asyncio
+import gzip
+import os
+import ssl
+import sys
+import threading
+import zlib
+from collections import deque
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from Que4_cache import is_url
+
+USER_AGENT = 'Que4-hotel-scraper/1.0'
+PER_HOST = 4                # Connections, and so requests in flight, per host
+FETCH_WINDOW = 32           # Pages fetched ahead of the caller
+FETCH_TIMEOUT = 30.0        # Seconds for one whole request
+MAX_BODY = 32 * 1024 * 1024
+MAX_HEADER_LINES = 100
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """One keep-alive connection to a host."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class HostPool:
+    """The connections to one host: idle ones are reused, at most limit in use at once."""
+
+    def __init__(self, scheme, host, port, limit):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.limit = asyncio.Semaphore(limit)
+        self.idle = []
+
+    async def connect(self):
+        """An idle connection if there is one, else a new one. Returns (connection, reused)."""
+        while self.idle:
+            connection = self.idle.pop()
+            if not connection.reader.at_eof():     # Skip ones the server has already closed
+                return connection, True
+            connection.close()
+        context = ssl.create_default_context() if self.scheme == 'https' else None
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+        return Connection(reader, writer), False
+
+    def release(self, connection, keep_alive):
+        if keep_alive:
+            self.idle.append(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        for connection in self.idle:
+            connection.close()
+        self.idle = []
+
+
+class Fetcher:
+    """Conditional GETs over pooled keep-alive connections, with a per-host concurrency cap."""
+
+    def __init__(self, per_host=PER_HOST, timeout=FETCH_TIMEOUT):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.pools = {}
+        self.counts = {'requests': 0, 'ok': 0, 'not_modified': 0, 'errors': 0, 'connections': 0, 'reused': 0,
+                       'bytes': 0}
+
+    def _pool(self, parts):
+        scheme = parts.scheme.lower()
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = HostPool(scheme, parts.hostname, port, self.per_host)
+        return pool
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        """GET url, conditionally when validators are given; returns a page dict, never raises."""
+        page = {'url': url, 'status': None, 'reason': '', 'body': b'', 'charset': 'utf-8',
+                'etag': None, 'last_modified': None, 'error': None}
+        try:
+            parts = urlsplit(url)
+            if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+                raise HTTPError(f"not an http(s) URL: {url}")
+            headers = {}
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+            pool = self._pool(parts)
+            async with pool.limit:
+                await asyncio.wait_for(self._fetch(pool, parts, headers, page), self.timeout)
+        except asyncio.TimeoutError:
+            page['error'] = f"no response within {self.timeout:g} s"
+        except (OSError, HTTPError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, zlib.error) as e:
+            page['error'] = f"{type(e).__name__}: {e}"
+
+        self.counts['requests'] += 1
+        if page['status'] == 200 and not page['error']:
+            self.counts['ok'] += 1
+            self.counts['bytes'] += len(page['body'])
+        elif page['status'] == 304:
+            self.counts['not_modified'] += 1
+        else:
+            self.counts['errors'] += 1
+        return page
+
+    async def _fetch(self, pool, parts, headers, page):
+        # A reused connection may have been closed by the server while idle; that
+        # request never reached it, so it is sent once more on a new connection
+        while True:
+            connection, reused = await pool.connect()
+            self.counts['reused' if reused else 'connections'] += 1
+            try:
+                keep_alive = await self._request(connection, parts, headers, page)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            pool.release(connection, keep_alive)
+            return
+
+    async def _request(self, connection, parts, headers, page):
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        host = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+        lines = [f"GET {path} HTTP/1.1", f"Host: {host}", f"User-Agent: {USER_AGENT}",
+                 "Accept: text/html", "Accept-Encoding: gzip, deflate", "Connection: keep-alive"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        connection.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+        await connection.writer.drain()
+
+        reader = connection.reader
+        status_line = await reader.readuntil(b"\r\n")
+        version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        if not version.startswith('HTTP/1.') or not status.isdigit():
+            raise HTTPError(f"bad status line {status_line[:80]!r}")
+        response_headers = {}
+        while True:
+            line = (await reader.readuntil(b"\r\n")).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            if len(response_headers) >= MAX_HEADER_LINES:
+                raise HTTPError("too many response headers")
+            name, _, value = line.partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        page['status'] = int(status)
+        page['reason'] = reason
+        page['etag'] = response_headers.get('etag')
+        page['last_modified'] = response_headers.get('last-modified')
+        for parameter in response_headers.get('content-type', '').split(';')[1:]:
+            name, _, value = parameter.strip().partition('=')
+            if name.lower() == 'charset' and value:
+                page['charset'] = value.strip('"')
+
+        connection_header = response_headers.get('connection', '').lower()
+        keep_alive = connection_header != 'close' if version == 'HTTP/1.1' else connection_header == 'keep-alive'
+        if page['status'] in (204, 304) or 100 <= page['status'] < 200:
+            return keep_alive                  # No body
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = await self._read_chunked(reader)
+        elif 'content-length' in response_headers:
+            length = int(response_headers['content-length'])
+            if length > MAX_BODY:
+                raise HTTPError(f"page of {length} bytes is too big")
+            body = await reader.readexactly(length)
+        else:                                  # Delimited by the server closing the connection
+            body = await reader.read(MAX_BODY + 1)
+            while len(body) <= MAX_BODY:
+                more = await reader.read(MAX_BODY + 1 - len(body))
+                if not more:
+                    break
+                body += more
+            if len(body) > MAX_BODY:
+                raise HTTPError("page is too big")
+            keep_alive = False
+
+        encoding = response_headers.get('content-encoding', '').lower()
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'deflate':
+            body = zlib.decompress(body)
+        page['body'] = body
+        return keep_alive
+
+    @staticmethod
+    async def _read_chunked(reader):
+        parts = []
+        size = 0
+        while True:
+            chunk_size = int((await reader.readuntil(b"\r\n")).split(b';')[0], 16)
+            if chunk_size == 0:
+                break
+            size += chunk_size
+            if size > MAX_BODY:
+                raise HTTPError("page is too big")
+            parts.append(await reader.readexactly(chunk_size))
+            await reader.readexactly(2)
+        while await reader.readuntil(b"\r\n") != b"\r\n":    # Trailers
+            pass
+        return b''.join(parts)
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+        self.pools = {}
+
+    def summary(self):
+        counts = self.counts
+        return (f"Fetch: {counts['requests']} requests, {counts['ok']} downloaded ({counts['bytes']} bytes), "
+                f"{counts['not_modified']} not modified, {counts['errors']} failed, "
+                f"{counts['connections']} connections opened, {counts['reused']} reused")
+
+
+def fetch_pages(sources, fetcher=None, cache=None, window=FETCH_WINDOW):
+    """Yield (source, cached entry, page) for every source, in order.
+
+    URLs are fetched on a background event loop, at most window ahead of the caller,
+    conditionally when the cache has validators for them; page is the fetch result.
+    Local files pass straight through with page None. The cached entry is the
+    PageCache entry for the source (None without a cache).
+    """
+    fetcher = fetcher or Fetcher()
+    loop = None
+    thread = None
+    in_flight = deque()
+
+    def start_loop():
+        nonlocal loop, thread
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name='que4-fetch', daemon=True)
+        thread.start()
+
+    async def shutdown():
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        fetcher.close()
+        await asyncio.sleep(0)         # Let the closed connections go
+
+    def done(item):
+        source, cached, future = item
+        return source, cached, future.result() if future is not None else None
+
+    try:
+        for source in sources:
+            cached = cache.get(source) if cache is not None else None
+            future = None
+            if is_url(source):
+                if loop is None:
+                    start_loop()       # Only runs have any URLs in them pay for the loop
+                etag = cached.get('etag') if cached else None
+                last_modified = cached.get('last_modified') if cached else None
+                future = asyncio.run_coroutine_threadsafe(fetcher.fetch(source, etag, last_modified), loop)
+            in_flight.append((source, cached, future))
+            if len(in_flight) >= window:
+                yield done(in_flight.popleft())
+        while in_flight:
+            yield done(in_flight.popleft())
+    finally:
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
+# The stand-in partner site
+
+class PageHandler(SimpleHTTPRequestHandler):
+    """Serves a directory over keep-alive HTTP/1.1 with ETag and Last-Modified validators."""
+
+    protocol_version = 'HTTP/1.1'
+    quiet = False
+    etag = None
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            if self.etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                self.send_response(304)
+                self.end_headers()
+                return None
+        return super().send_head()    # Handles If-Modified-Since itself
+
+    def end_headers(self):
+        if self.etag:
+            self.send_header('ETag', self.etag)
+            self.etag = None
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def start_page_server(directory, host='127.0.0.1', port=0, quiet=True):
+    """Serve directory on a background thread; returns the server (server.server_address, .shutdown())."""
+    handler = type('Handler', (PageHandler,), {'quiet': quiet})
+    server = ThreadingHTTPServer((host, port), lambda *args: handler(*args, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='que4-page-server', daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch hotel pages over HTTP, or serve some to test with")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="serve a directory of pages with ETag/Last-Modified")
+    serve.add_argument('directory', nargs='?', default='.')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8000)
+    get = commands.add_parser('get', help="fetch URLs and show status, size and validators")
+    get.add_argument('urls', nargs='+')
+    get.add_argument('--per-host', type=int, default=PER_HOST)
+    get.add_argument('--etag', default=None, help="send If-None-Match with this ETag")
+    get.add_argument('--since', default=None, help="send If-Modified-Since with this date")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        handler = lambda *handler_args: PageHandler(*handler_args, directory=args.directory)
+        with ThreadingHTTPServer((args.host, args.port), handler) as server:
+            print(f"Serving {os.path.abspath(args.directory)} on http://{args.host}:{args.port}/ (Ctrl+C to stop)")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return 0
+
+    async def fetch_all(fetcher):
+        try:
+            return await asyncio.gather(*(fetcher.fetch(url, args.etag, args.since) for url in args.urls))
+        finally:
+            fetcher.close()
+
+    fetcher = Fetcher(args.per_host)
+    for page in asyncio.run(fetch_all(fetcher)):
+        if page['error']:
+            print(f"{page['url']}: {page['error']}")
+        else:
+            print(f"{page['url']}: {page['status']} {page['reason']}, {len(page['body'])} bytes, "
+                  f"ETag {page['etag']}, Last-Modified {page['last_modified']}")
+    print(fetcher.summary())
+    return 0 if not fetcher.counts['errors'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
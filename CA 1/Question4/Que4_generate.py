@@ -0,0 +1,148 @@
+"""
+Synthetic Hotel Page Generator
+Question 4 - CA_ONE (30%)
+Writes any number of made-up hotel pages in the same markup as the two sample pages
+(h1.hotel-name, p.hotel-location, div.room-card with data-price and the other data-*
+attributes), so Que4.py can be tried on realistic volumes.
+
+Page size is controlled by the number of room cards and by the amount of descriptive
+text in each card, which the scraper has to parse past but does not extract.
+
+    python Que4_generate.py pages/ --pages 1000 --rooms 7
+    python Que4_generate.py big/ --pages 50 --rooms 200 --filler 5 --seed 2
+"""
+
+import argparse
+import html
+import os
+import random
+import sys
+
+PAGE_HEAD = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>{title}</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; max-width: 1000px; margin: 20px auto; padding: 20px; background: #f5f5f5; }}
+        .hotel-header {{ background: #2196F3; color: white; padding: 20px; text-align: center; border-radius: 8px; }}
+        .hotel-name {{ font-size: 2em; margin: 0; }}
+        .hotel-location {{ font-size: 1.2em; }}
+        .room-card {{ background: white; margin: 20px 0; padding: 20px; border-radius: 8px; border: 2px solid #ddd; }}
+        .room-type {{ font-size: 1.5em; color: #333; margin-bottom: 10px; }}
+        .price {{ font-size: 1.8em; color: #2196F3; font-weight: bold; margin: 10px 0; }}
+        .amenities {{ color: #666; line-height: 1.6; }}
+        .capacity, .availability {{ display: inline-block; padding: 8px 15px; margin: 5px; border-radius: 5px; font-size: 0.9em; }}
+        .capacity {{ background: #4CAF50; color: white; }}
+        .availability {{ background: #FF9800; color: white; }}
+    </style>
+</head>
+<body>
+    <div class="hotel-header">
+        <h1 class="hotel-name" data-hotel-name="{name}">{name}</h1>
+        <p class="hotel-location" data-location="{location}">{location}</p>
+    </div>
+'''
+
+ROOM_CARD = '''
+    <div class="room-card">
+        <h2 class="room-type" data-room-type="{room_type}">{room_type}</h2>
+        <div class="price" data-price="{price}" data-currency="{currency}">€{price} per night</div>
+        <p class="amenities" data-amenities="{amenities}">
+            Amenities: {amenities}
+        </p>
+        <span class="capacity" data-capacity="{capacity}">Sleeps {capacity}</span>
+        <span class="availability" data-availability="{availability}">{availability}</span>{filler}
+    </div>
+'''
+
+PAGE_TAIL = '''</body>
+</html>'''
+
+# Word lists the hotels and rooms are made from
+HOTEL_WORDS = ['Seaside', 'Mountain', 'Harbour', 'Riverside', 'Castle', 'Meadow', 'Lakeside', 'Garden', 'Cliff', 'Forest']
+HOTEL_KINDS = ['Resort', 'Lodge', 'Hotel', 'Inn', 'Suites', 'House', 'Retreat']
+LOCATIONS = ['Dublin Bay', 'Wicklow Mountains', 'Galway City', 'Killarney', 'Cork Harbour', 'Dingle', 'Kilkenny',
+             'Sligo', 'Westport', 'Connemara']
+ROOM_STYLES = ['Deluxe', 'Standard', 'Superior', 'Executive', 'Family', 'Premium', 'Cozy', 'Luxury', 'Alpine', 'Garden']
+ROOM_KINDS = ['Double', 'Twin', 'Suite', 'King Room', 'Ocean View', 'Mountain View', 'Studio', 'Loft']
+AMENITIES = ['King Bed', 'Queen Bed', 'Free WiFi', 'Mini Bar', 'Smart TV', 'Sea View', 'Jacuzzi', 'Work Desk',
+             'Coffee Maker', 'Private Balcony', 'Stone Fireplace', 'Kitchenette', 'Heated Floors', 'Netflix']
+AVAILABILITY = ['Available', 'Available', 'Available', 'Limited']
+FILLER_TEXT = ('Guests enjoy a quiet, well-appointed room with daily housekeeping, fresh linen and a selection '
+               'of local teas. Late check-out can be arranged at reception subject to availability.')
+
+
+def make_hotel(rng, index, rooms):
+    """A made-up hotel dict and its room dicts, in the shape extract_hotel returns."""
+    hotel = {
+        'hotel_name': f"{rng.choice(HOTEL_WORDS)} {rng.choice(HOTEL_KINDS)} {index + 1}",
+        'location': f"{rng.choice(LOCATIONS)}, Ireland",
+    }
+    room_list = []
+    used = set()
+    for number in range(rooms):
+        room_type = f"{rng.choice(ROOM_STYLES)} {rng.choice(ROOM_KINDS)}"
+        if room_type in used:
+            room_type += f" {number + 1}"      # Room types stay unique within a hotel
+        used.add(room_type)
+        room_list.append({
+            'room_type': room_type,
+            'base_price': float(rng.randrange(79, 600)),
+            'currency': 'EUR',
+            'amenities': ', '.join(rng.sample(AMENITIES, 5)),
+            'capacity': str(rng.randint(1, 6)),
+            'availability': rng.choice(AVAILABILITY),
+        })
+    return hotel, room_list
+
+
+def render_page(hotel, rooms, filler=0):
+    """The HTML of one page, with filler paragraphs of description in each room card."""
+    escape = lambda value: html.escape(str(value), quote=True)
+    paragraph = f'\n        <p class="description">{FILLER_TEXT}</p>'
+    parts = [PAGE_HEAD.format(title=escape(hotel['hotel_name']), name=escape(hotel['hotel_name']),
+                              location=escape(hotel['location']))]
+    for room in rooms:
+        parts.append(ROOM_CARD.format(room_type=escape(room['room_type']), price=int(room['base_price']),
+                                      currency=escape(room['currency']), amenities=escape(room['amenities']),
+                                      capacity=escape(room['capacity']), availability=escape(room['availability']),
+                                      filler=paragraph * filler))
+    parts.append(PAGE_TAIL)
+    return ''.join(parts)
+
+
+def generate_pages(directory, pages, rooms=7, filler=0, seed=0):
+    """Write pages hotel_00001.html, ... into directory and return their paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    width = max(5, len(str(pages)))
+    paths = []
+    for index in range(pages):
+        hotel, room_list = make_hotel(rng, index, rooms)
+        path = os.path.join(directory, f"hotel_{index + 1:0{width}d}.html")
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(render_page(hotel, room_list, filler))
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic hotel pages for Que4.py")
+    parser.add_argument('directory', help="where to write the pages")
+    parser.add_argument('--pages', type=int, default=100, help="number of pages (default: %(default)s)")
+    parser.add_argument('--rooms', type=int, default=7, help="room cards per page (default: %(default)s)")
+    parser.add_argument('--filler', type=int, default=0,
+                        help="paragraphs of description per room card, to make pages bigger (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=0, help="seed, the same seed gives the same pages")
+    args = parser.parse_args(argv)
+
+    paths = generate_pages(args.directory, args.pages, args.rooms, args.filler, args.seed)
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"Wrote {len(paths)} pages ({args.rooms} rooms each, {size / len(paths) / 1024:.1f} KB per page) "
+          f"to {args.directory}" if paths else "No pages written")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Hotel Price History
+Question 4 - CA_ONE (30%)
+An append-only history of the scraped prices across runs, so rerunning Que4.py
+no longer loses what the prices used to be.
+
+The history is a PriceStore (see Que4_store.py) whose prices table holds the
+latest price of every room and date. Each load is a numbered, timestamped run;
+when it finishes, only the prices that are new or differ from the latest one in
+the history are appended to price_history, keyed (room_id, date, run_id) in a clustered WITHOUT ROWID table:
+
+    grid as of run N     the newest history row at or before N for every room and
+                         date, found in one pass in key order
+    trajectory           one index range: the rows of a single (room, date)
+
+The room details (location, base price, currency, amenities, capacity and
+availability) are versioned the same way: a run appends a room_history row for
+each room whose details differ from its latest version, and the grid shows every
+room as it was described at that run. A room or date missing from a later run
+keeps its last known price and details; nothing is ever deleted or rewritten.
+
+    python Que4.py --history hotel_history.db
+    python Que4_history.py load hotel_data.csv --note "partner feed"
+    python Que4_history.py runs
+    python Que4_history.py grid --run 3 --hotel "Seaside Paradise Resort"
+    python Que4_history.py trajectory "Seaside Paradise Resort" "Deluxe Ocean View" 2025-12-24
+"""
+
+import argparse
+import sys
+from datetime import date, datetime
+
+from Que4_output import read_records
+from Que4_rules import DAY_NAMES
+from Que4_store import RESULT_COLUMNS, PriceStore, print_rows
+
+HISTORY_FILE = 'hotel_history.db'
+
+HISTORY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs(
+    run_id INTEGER PRIMARY KEY,
+    started TEXT NOT NULL,
+    note TEXT,
+    prices INTEGER NOT NULL DEFAULT 0,
+    changed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS price_history(
+    room_id INTEGER NOT NULL REFERENCES rooms(room_id),
+    date TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    final_price REAL NOT NULL,
+    PRIMARY KEY (room_id, date, run_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_history_run ON price_history(run_id);
+CREATE TABLE IF NOT EXISTS room_history(
+    room_id INTEGER NOT NULL REFERENCES rooms(room_id),
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    hotel_name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    room_type TEXT NOT NULL,
+    base_price REAL NOT NULL,
+    currency TEXT NOT NULL,
+    amenities TEXT NOT NULL,
+    max_capacity INTEGER,
+    availability TEXT NOT NULL,
+    PRIMARY KEY (room_id, run_id)
+) WITHOUT ROWID;
+'''
+
+# The run's prices are staged (the last one of a room and night wins) and compared
+# with the history once, when the run finishes
+STAGE_SCHEMA = '''
+CREATE TEMP TABLE IF NOT EXISTS run_prices(
+    room_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    final_price REAL NOT NULL,
+    PRIMARY KEY (room_id, date)
+) WITHOUT ROWID;
+'''
+
+# A price goes into the history only if it is new or differs from the latest one
+HISTORY_INSERT = '''
+    INSERT INTO price_history (room_id, date, run_id, final_price)
+    SELECT s.room_id, s.date, ?, s.final_price
+    FROM run_prices s
+    WHERE s.final_price IS NOT (SELECT h.final_price FROM price_history h
+                                WHERE h.room_id = s.room_id AND h.date = s.date
+                                ORDER BY h.run_id DESC LIMIT 1)
+'''
+
+# The run's rooms go into room_history only if their details differ from the latest version
+ROOM_DETAILS = ['hotel_name', 'location', 'room_type', 'base_price', 'currency', 'amenities', 'max_capacity',
+                'availability']
+ROOM_HISTORY_INSERT = f'''
+    INSERT INTO room_history (room_id, run_id, {', '.join(ROOM_DETAILS)})
+    SELECT r.room_id, ?, {', '.join('r.' + column for column in ROOM_DETAILS)}
+    FROM rooms r
+    WHERE r.room_id IN (SELECT room_id FROM run_prices)
+      AND NOT EXISTS (SELECT 1 FROM room_history v
+                      WHERE v.room_id = r.room_id
+                        AND v.run_id = (SELECT MAX(run_id) FROM room_history WHERE room_id = r.room_id)
+                        AND v.location IS r.location AND v.base_price IS r.base_price
+                        AND v.currency IS r.currency AND v.amenities IS r.amenities
+                        AND v.max_capacity IS r.max_capacity AND v.availability IS r.availability)
+'''
+
+# Histories made before the details were versioned: each room's current details,
+# from the first run that priced it (the older details were not kept)
+ROOM_HISTORY_SEED = f'''
+    INSERT INTO room_history (room_id, run_id, {', '.join(ROOM_DETAILS)})
+    SELECT r.room_id, (SELECT MIN(run_id) FROM price_history WHERE room_id = r.room_id),
+           {', '.join('r.' + column for column in ROOM_DETAILS)}
+    FROM rooms r
+    WHERE EXISTS (SELECT 1 FROM price_history WHERE room_id = r.room_id)
+'''
+
+RUN_COLUMNS = ['Run', 'Started', 'Note', 'Prices', 'Changed']
+
+
+def day_name(date_str):
+    return DAY_NAMES[date.fromisoformat(date_str).weekday()]
+
+
+class PriceHistory(PriceStore):
+    """A PriceStore that also appends every run's changed prices and room details to the history."""
+
+    def __init__(self, filename=HISTORY_FILE):
+        super().__init__(filename)
+        self.connection.executescript(HISTORY_SCHEMA + STAGE_SCHEMA)
+        with self.connection:
+            if self.connection.execute("SELECT NOT EXISTS (SELECT 1 FROM room_history)").fetchone()[0]:
+                self.connection.execute(ROOM_HISTORY_SEED)
+        self.run_id = None
+
+    def start_run(self, note=None, started=None):
+        """Begin a run; the prices loaded until finish_run() belong to it. Returns its number.
+
+        The run is one transaction: nothing of it is committed until finish_run(),
+        and abandon_run() drops it entirely.
+        """
+        started = (started or datetime.now()).isoformat(timespec='seconds')
+        self.room_ids = {}              # So this run's details are written to rooms again
+        self.connection.execute("DELETE FROM run_prices")
+        self.run_id = self.connection.execute(
+            "INSERT INTO runs (started, note) VALUES (?, ?)", (started, note)).lastrowid
+        return self.run_id
+
+    def abandon_run(self):
+        """Drop the run in progress, e.g. when its output could not be written."""
+        self.connection.rollback()
+        self.room_ids = {}              # Rooms first inserted by the run are gone again
+        self.run_id = None
+
+    def finish_run(self):
+        """Append the run's changed prices and room details to the history and return the run as a runs() row."""
+        with self.connection:
+            self.connection.execute(ROOM_HISTORY_INSERT, (self.run_id,))
+            changed = self.connection.execute(HISTORY_INSERT, (self.run_id,)).rowcount
+            prices = self.connection.execute("SELECT COUNT(*) FROM run_prices").fetchone()[0]
+            self.connection.execute("UPDATE runs SET prices = ?, changed = ? WHERE run_id = ?",
+                                    (prices, changed, self.run_id))
+            self.connection.execute("DELETE FROM run_prices")
+        run = self.runs(self.run_id)[0]
+        self.run_id = None
+        return run
+
+    def load(self, records):
+        """Load a record stream into the run in progress, or into a run of its own when none is."""
+        if self.run_id is not None:
+            return self._load(records)
+        self.start_run()
+        try:
+            count = self._load(records)
+        except BaseException:
+            self.abandon_run()
+            raise
+        self.finish_run()
+        return count
+
+    def _insert(self, batch):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO run_prices (room_id, date, final_price) VALUES (?, ?, ?)",
+            [(room_id, date_str, price) for room_id, date_str, _, price in batch])
+        super()._insert(batch)
+
+    def runs(self, run_id=None):
+        """Every run (or one), oldest first."""
+        sql = "SELECT run_id, started, note, prices, changed FROM runs"
+        rows = self.connection.execute(sql + " WHERE run_id = ?" if run_id else sql + " ORDER BY run_id",
+                                       (run_id,) if run_id else ())
+        return [dict(zip(RUN_COLUMNS, row)) for row in rows]
+
+    def grid(self, run_id=None, hotel_name=None, location=None, room_type=None, start=None, end=None):
+        """The prices and room details as they stood after a run (default: the latest), optionally filtered."""
+        if run_id is None:
+            run_id = self.connection.execute("SELECT MAX(run_id) FROM runs").fetchone()[0] or 0
+        where, params = self._room_filter(hotel_name, location, room_type)
+        if start:
+            where += " AND h.date >= ?"
+            params.append(start)
+        if end:
+            where += " AND h.date <= ?"
+            params.append(end)
+        # r is each room's latest room_history version at or before the run.
+        # With MAX() SQLite takes the other columns from the row holding the maximum
+        rows = self.connection.execute(f'''
+            WITH versions AS (SELECT room_id, MAX(run_id) AS run_id FROM room_history
+                              WHERE run_id <= ? GROUP BY room_id)
+            SELECT h.date, r.hotel_name, r.location, r.room_type, h.final_price, r.currency, r.max_capacity,
+                   MAX(h.run_id)
+            FROM price_history h
+            JOIN versions w ON w.room_id = h.room_id
+            JOIN room_history r ON r.room_id = w.room_id AND r.run_id = w.run_id
+            WHERE h.run_id <= ? {where}
+            GROUP BY h.room_id, h.date
+            ORDER BY r.hotel_name, r.room_type, h.date
+        ''', (run_id, run_id, *params))
+        return [dict(zip(RESULT_COLUMNS, (date_str, day_name(date_str), *values)))
+                for date_str, *values, _ in rows]
+
+    def trajectory(self, hotel_name, room_type, date_str):
+        """Every price one room had for one night, run by run."""
+        rows = self.connection.execute('''
+            SELECT h.run_id, u.started, h.final_price
+            FROM rooms r
+            JOIN price_history h ON h.room_id = r.room_id AND h.date = ?
+            JOIN runs u ON u.run_id = h.run_id
+            WHERE r.hotel_name = ? AND r.room_type = ?
+            ORDER BY h.run_id
+        ''', (date_str, hotel_name, room_type))
+        return [{'Run': run_id, 'Started': started, 'Final_Price': price} for run_id, started, price in rows]
+
+
+def print_runs(runs):
+    print(f"{'Run':>5} {'Started':<20} {'Prices':>9} {'Changed':>9}  Note")
+    print("-"*60)
+    for run in runs:
+        print(f"{run['Run']:>5} {run['Started']:<20} {run['Prices']:>9} {run['Changed']:>9}  {run['Note'] or ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the hotel price history")
+    parser.add_argument('--history', default=HISTORY_FILE, help="history file (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('load', help="add a scraped output file (any Que4 format) as a new run")
+    load.add_argument('file')
+    load.add_argument('--note', default=None)
+
+    commands.add_parser('runs', help="list the runs")
+
+    grid = commands.add_parser('grid', help="the prices and room details as they stood after a run")
+    grid.add_argument('--run', type=int, default=None, help="run number (default: the latest)")
+    grid.add_argument('--hotel')
+    grid.add_argument('--location')
+    grid.add_argument('--room')
+    grid.add_argument('--start')
+    grid.add_argument('--end')
+
+    trajectory = commands.add_parser('trajectory', help="how one room's price for one night changed over the runs")
+    trajectory.add_argument('hotel')
+    trajectory.add_argument('room')
+    trajectory.add_argument('date')
+
+    args = parser.parse_args(argv)
+    history = PriceHistory(args.history)
+    try:
+        if args.command == 'load':
+            history.start_run(args.note or args.file)
+            try:
+                history.load(read_records(args.file))
+            except BaseException:
+                history.abandon_run()
+                raise
+            run = history.finish_run()
+            print(f"Run {run['Run']}: {run['Changed']} of {run['Prices']} prices changed")
+        elif args.command == 'runs':
+            print_runs(history.runs())
+        elif args.command == 'grid':
+            print_rows(history.grid(args.run, args.hotel, args.location, args.room, args.start, args.end))
+        else:
+            rows = history.trajectory(args.hotel, args.room, args.date)
+            if not rows:
+                print("No prices recorded for that room and night")
+            previous = None
+            for row in rows:
+                change = f"  ({row['Final_Price'] - previous:+.2f})" if previous is not None else ''
+                print(f"Run {row['Run']:>4}  {row['Started']:<20} {row['Final_Price']:>8.2f}{change}")
+                previous = row['Final_Price']
+    finally:
+        history.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""
+Hotel Price Output Formats
+Question 4 - CA_ONE (30%)
+Pluggable writers and readers for the scraped hotel price records.
+
+    csv       plain CSV (the original format)
+    csv.gz    gzip-compressed CSV
+    csv.zst   zstd-compressed CSV (needs zstandard)
+    parquet   columnar Parquet (needs pyarrow)
+    arrow     columnar Arrow IPC file (needs pyarrow)
+
+The columnar formats store Hotel_Name, Location, Room_Type, Amenities and the other
+repeated strings dictionary-encoded, Date as a real date and the prices as float64,
+so the repeated text is stored once and nothing has to be re-parsed from strings.
+Every writer streams: records are written in batches as they arrive.
+"""
+
+import csv
+import gzip
+import io
+import math
+import re
+from datetime import date
+from numbers import Real
+from operator import itemgetter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+FIELDNAMES = ['Date', 'Day', 'Hotel_Name', 'Location', 'Room_Type',
+              'Base_Price', 'Final_Price', 'Currency', 'Amenities',
+              'Max_Capacity', 'Availability']
+
+# Columns stored as dictionary codes in the columnar formats
+DICTIONARY_COLUMNS = ['Day', 'Hotel_Name', 'Location', 'Room_Type', 'Currency', 'Amenities', 'Availability']
+BATCH_ROWS = 65536
+_field_values = itemgetter(*FIELDNAMES)
+_LEADING_NUMBER = re.compile(r'\s*(\d+)')
+
+
+def parse_capacity(value):
+    """The number of guests a room sleeps, or None when the page does not give one.
+
+    Pages write it as "3" but also as "2 adults"; the leading number is used. An empty
+    or wordy value ("ask at desk") is None rather than an error, so one odd room card
+    does not stop its page or a writer. A number (3, or 3.0 from a YAML or cached
+    source) is returned as an int, None unchanged.
+    """
+    if value is None:
+        return None
+    if isinstance(value, Real):
+        return int(value) if math.isfinite(value) else None
+    match = _LEADING_NUMBER.match(str(value))
+    return int(match.group(1)) if match else None
+
+
+def _open_csv(filename, mode, compression):
+    if compression == 'gzip':
+        return gzip.open(filename, mode + 't', newline='', encoding='utf-8')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("csv.zst output needs zstandard (pip install zstandard)")
+        raw = zstandard.open(filename, mode + 'b')
+        return io.TextIOWrapper(raw, newline='', encoding='utf-8')
+    return open(filename, mode, newline='', encoding='utf-8')
+
+
+def _write_csv(records, filename, compression=None):
+    count = 0
+    with _open_csv(filename, 'w', compression) as csvfile:
+        # Create CSV writer
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+        values = csv.writer(csvfile)
+
+        # Write header
+        writer.writeheader()
+
+        # Write rows as they arrive
+        for record in records:
+            row = getattr(record, 'row', None)
+            if row is not None:         # A compact record (Que4_records) gives its values in column order
+                values.writerow(row())
+            else:
+                writer.writerow(record)
+            count += 1
+    return count
+
+
+def record_values(record):
+    """A record's values in FIELDNAMES order, from a record dict or a compact record."""
+    row = getattr(record, 'row', None)
+    return row() if row is not None else _field_values(record)
+
+
+def write_csv(records, filename):
+    """Stream records into a CSV file and return how many were written."""
+    return _write_csv(records, filename)
+
+
+def write_csv_gzip(records, filename):
+    """Stream records into a gzip-compressed CSV file."""
+    return _write_csv(records, filename, 'gzip')
+
+
+def write_csv_zstd(records, filename):
+    """Stream records into a zstd-compressed CSV file."""
+    return _write_csv(records, filename, 'zstd')
+
+
+def arrow_schema():
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    types = {
+        'Date': pa.date32(),
+        'Base_Price': pa.float64(),
+        'Final_Price': pa.float64(),
+        'Max_Capacity': pa.int32(),
+    }
+    return pa.schema([(name, dictionary if name in DICTIONARY_COLUMNS else types[name]) for name in FIELDNAMES])
+
+
+class _BatchBuilder:
+    """Turns records into Arrow record batches.
+
+    Dictionaries only ever grow, so each batch's dictionary extends the previous one
+    and the IPC writer can send just the new entries (a dictionary delta).
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.codes = {name: {} for name in DICTIONARY_COLUMNS}
+
+    def build(self, rows):
+        arrays = []
+        columns = list(zip(*map(record_values, rows))) or [()] * len(FIELDNAMES)
+        for field, values in zip(self.schema, columns):
+            name = field.name
+            if name in self.codes:
+                codes = self.codes[name]
+                indices = [codes.setdefault(value, len(codes)) for value in values]
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(indices, pa.int32()), pa.array(list(codes), pa.string())))
+            elif name == 'Date':
+                arrays.append(pa.array([value if isinstance(value, date) else date.fromisoformat(value)
+                                        for value in values], pa.date32()))
+            elif name == 'Max_Capacity':     # Null where the page gave no number
+                arrays.append(pa.array([parse_capacity(value) for value in values], field.type))
+            else:
+                convert = int if pa.types.is_integer(field.type) else float
+                arrays.append(pa.array([None if value is None else convert(value) for value in values], field.type))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+def _write_batches(records, write_batch):
+    builder = _BatchBuilder(arrow_schema())
+    count = 0
+    rows = []
+    for record in records:
+        rows.append(record)
+        if len(rows) == BATCH_ROWS:
+            write_batch(builder.build(rows))
+            count += len(rows)
+            rows = []
+    if rows or count == 0:
+        write_batch(builder.build(rows))
+        count += len(rows)
+    return count
+
+
+def write_parquet(records, filename):
+    """Stream records into a Parquet file with dictionary-encoded text and typed columns."""
+    if pa is None:
+        raise RuntimeError("parquet output needs pyarrow (pip install pyarrow)")
+    with pq.ParquetWriter(filename, arrow_schema(), compression='zstd') as writer:
+        return _write_batches(records, writer.write_batch)
+
+
+def write_arrow(records, filename):
+    """Stream records into an Arrow IPC file with dictionary-encoded text and typed columns."""
+    if pa is None:
+        raise RuntimeError("arrow output needs pyarrow (pip install pyarrow)")
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    with pa.OSFile(filename, 'wb') as sink, pa.ipc.new_file(sink, arrow_schema(), options=options) as writer:
+        return _write_batches(records, writer.write_batch)
+
+
+WRITERS = {
+    'csv': write_csv,
+    'csv.gz': write_csv_gzip,
+    'csv.zst': write_csv_zstd,
+    'parquet': write_parquet,
+    'arrow': write_arrow,
+}
+
+# File extensions each format is recognised by, longest first
+EXTENSIONS = [
+    ('.csv.gz', 'csv.gz'),
+    ('.csv.zst', 'csv.zst'),
+    ('.parquet', 'parquet'),
+    ('.arrow', 'arrow'),
+    ('.feather', 'arrow'),
+    ('.csv', 'csv'),
+]
+
+
+def format_for(filename, output_format=None):
+    """The output format to use for a file, from the explicit choice or the extension."""
+    if output_format:
+        return output_format
+    for extension, name in EXTENSIONS:
+        if filename.lower().endswith(extension):
+            return name
+    return 'csv'
+
+
+def write_records(records, filename, output_format=None):
+    """Stream records into a file in the given (or guessed) format, return the count."""
+    return WRITERS[format_for(filename, output_format)](records, filename)
+
+
+def read_records(filename, output_format=None):
+    """Yield the records of a file written by write_records, one dict at a time.
+
+    CSV formats give strings, as csv.DictReader does; the columnar formats give typed
+    values except Date, which comes back as the same YYYY-MM-DD string.
+    """
+    output_format = format_for(filename, output_format)
+    if output_format.startswith('csv'):
+        compression = {'csv': None, 'csv.gz': 'gzip', 'csv.zst': 'zstd'}[output_format]
+        with _open_csv(filename, 'r', compression) as csvfile:
+            yield from csv.DictReader(csvfile)
+        return
+
+    if pa is None:
+        raise RuntimeError(f"reading {output_format} needs pyarrow (pip install pyarrow)")
+    if output_format == 'parquet':
+        batches = pq.ParquetFile(filename).iter_batches(batch_size=BATCH_ROWS)
+    else:
+        reader = pa.ipc.open_file(pa.memory_map(filename, 'r'))
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    for batch in batches:
+        # Decode column by column: each dictionary is turned into Python strings once per batch
+        columns = []
+        for name in FIELDNAMES:
+            column = batch.column(name)
+            if pa.types.is_dictionary(column.type):
+                values = column.dictionary.to_pylist()
+                columns.append([values[i] for i in column.indices.to_pylist()])
+            elif name == 'Date':
+                columns.append(column.cast(pa.string()).to_pylist())
+            else:
+                columns.append(column.to_pylist())
+        for values in zip(*columns):
+            yield dict(zip(FIELDNAMES, values))
@@ -0,0 +1,144 @@
+"""
+Compact Price Records
+Question 4 - CA_ONE (30%)
+The in-memory form of the scraped price records.
+
+A record dict repeats the hotel name, location, amenities and the other room
+details on every date row, and builds a fresh Date and Day string for each one.
+Here those values are held once:
+
+    room_table    the room dimension: one row of interned values per distinct
+                  hotel/room, referenced by an integer room id
+    DateTable     the date dimension of the run, shared by every page (Que4_rules)
+    PriceBlock    one page's facts: the room ids of its rooms and a flat array of
+                  final prices, rooms x dates, so a row costs 8 bytes
+
+Iterating a PriceBlock gives PriceRecord views, which read like the record dicts
+(record['Final_Price'], .get(), .keys(), dict(record)), so the writers, the report
+and the price store take them unchanged.
+"""
+
+import sys
+from array import array
+from collections.abc import Mapping
+from itertools import chain, repeat
+
+from Que4_output import FIELDNAMES
+
+# The room dimension's columns, in the order of a room_table row
+ROOM_COLUMNS = ['Hotel_Name', 'Location', 'Room_Type', 'Base_Price', 'Currency', 'Amenities',
+                'Max_Capacity', 'Availability']
+ROOM_INDEX = {name: i for i, name in enumerate(ROOM_COLUMNS)}
+
+
+class RoomTable:
+    """The room dimension: each distinct room's details stored once, looked up by id."""
+
+    def __init__(self):
+        self.rows = []
+        self.ids = {}
+
+    def add(self, hotel, room):
+        """The id of a room of a hotel, adding it the first time it is seen."""
+        return self.add_row((hotel['hotel_name'], hotel['location'], room['room_type'], room['base_price'],
+                             room['currency'], room['amenities'], room['capacity'], room['availability']))
+
+    def add_row(self, row):
+        room_id = self.ids.get(row)
+        if room_id is None:
+            # Interned, so rooms of different pages share their repeated strings too
+            row = tuple(sys.intern(value) if type(value) is str else value for value in row)
+            room_id = self.ids[row] = len(self.rows)
+            self.rows.append(row)
+        return room_id
+
+    def __len__(self):
+        return len(self.rows)
+
+
+# This process's room dimension, shared by every PriceBlock built or unpickled here
+room_table = RoomTable()
+
+
+class PriceBlock:
+    """One page's prices: row i is room i // len(dates) on date i % len(dates)."""
+
+    __slots__ = ('room_ids', 'dates', 'span', 'prices')
+
+    def __init__(self, hotel, rooms, calendar, prices):
+        self.room_ids = array('I', [room_table.add(hotel, room) for room in rooms])
+        self.dates = calendar.date_table
+        self.span = len(self.dates.dates)        # Dates per room
+        self.prices = prices if isinstance(prices, array) else array('d', prices)
+        if len(self.prices) != len(self.room_ids) * self.span:
+            raise ValueError(f"{len(self.prices)} prices for {len(self.room_ids)} rooms x {self.span} dates")
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self.prices):
+            raise IndexError("price block index out of range")
+        return PriceRecord(self, index)
+
+    def __iter__(self):
+        return map(PriceRecord, repeat(self), range(len(self.prices)))
+
+    def __reduce__(self):
+        # Sent between processes as room details, the date range and the raw prices;
+        # the receiving process maps the rooms into its own room_table
+        rows = [room_table.rows[room_id] for room_id in self.room_ids]
+        return _rebuild_block, (rows, self.dates, self.prices)
+
+
+def _rebuild_block(rows, dates, prices):
+    block = PriceBlock.__new__(PriceBlock)
+    block.room_ids = array('I', [room_table.add_row(row) for row in rows])
+    block.dates = dates
+    block.span = len(dates.dates)
+    block.prices = prices
+    return block
+
+
+class PriceRecord(Mapping):
+    """One row of a PriceBlock, read-only with the same keys as a record dict."""
+
+    __slots__ = ('block', 'index')
+
+    def __init__(self, block, index):
+        self.block = block
+        self.index = index
+
+    def __getitem__(self, field):
+        block = self.block
+        if field == 'Final_Price':
+            return block.prices[self.index]
+        room, day = divmod(self.index, block.span)
+        if field == 'Date':
+            return block.dates.dates[day]
+        if field == 'Day':
+            return block.dates.days[day]
+        return room_table.rows[block.room_ids[room]][ROOM_INDEX[field]]
+
+    def __iter__(self):
+        return iter(FIELDNAMES)
+
+    def __len__(self):
+        return len(FIELDNAMES)
+
+    def row(self):
+        """The values in FIELDNAMES order, without a lookup per field."""
+        block = self.block
+        room, day = divmod(self.index, block.span)
+        (hotel_name, location, room_type, base_price, currency, amenities,
+         capacity, availability) = room_table.rows[block.room_ids[room]]
+        return (block.dates.dates[day], block.dates.days[day], hotel_name, location, room_type,
+                base_price, block.prices[self.index], currency, amenities, capacity, availability)
+
+    def __repr__(self):
+        return f"PriceRecord({dict(self)!r})"
+
+
+def iter_records(blocks):
+    """The records of a sequence of PriceBlocks (or record lists), one after another."""
+    return chain.from_iterable(blocks)
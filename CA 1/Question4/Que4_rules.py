@@ -0,0 +1,249 @@
+"""
+Hotel Pricing Rules
+Question 4 - CA_ONE (30%)
+A declarative rule set for the nightly price multipliers, compiled once per run
+into a per-date multiplier array for each hotel/room class.
+
+A rule set is a JSON or YAML file (YAML needs PyYAML), for example:
+
+    rules:
+      - name: weekend
+        days: [Friday, Saturday]
+        multiplier: 1.25
+      - name: christmas
+        dates: ["12-24", "12-25", "12-26", "12-31"]
+        multiplier: 1.40
+      - name: ski season
+        hotels: ["Mountain View Lodge"]
+        from: "12-15"
+        to: "03-15"
+        multiplier: 1.15
+      - name: nearly full
+        availability: [Limited]
+        multiplier: 1.10
+    overrides:
+      - hotels: ["Seaside Paradise Resort"]
+        dates: ["2025-12-31"]
+        multiplier: 2.0
+
+Which rooms a rule applies to is narrowed with hotels, locations, rooms (room
+types) and availability (the occupancy surcharge above). Which nights it applies
+on is narrowed with days (weekday names), dates (MM-DD every year, or YYYY-MM-DD)
+and a from/to season (MM-DD, which may wrap round the new year, or YYYY-MM-DD).
+A rule must meet all of its conditions; one without any applies every night.
+Matching rules multiply together, then an override replaces the multiplier on its
+dates outright (the last matching override wins).
+"""
+
+import json
+from datetime import date, timedelta
+from functools import lru_cache
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# The built-in rule set: weekend and Christmas/New Year's Eve premiums
+DEFAULT_RULES = {
+    'rules': [
+        {'name': 'weekend', 'days': ['Friday', 'Saturday'], 'multiplier': 1.25},
+        {'name': 'holiday', 'dates': ['12-24', '12-25', '12-26', '12-31'], 'multiplier': 1.40},
+    ],
+    'overrides': [],
+}
+
+ROOM_CONDITIONS = {'hotels': 'hotel_name', 'locations': 'location', 'rooms': 'room_type', 'availability': 'availability'}
+DATE_CONDITIONS = ['days', 'dates', 'from', 'to']
+RULE_KEYS = {'name', 'multiplier', *ROOM_CONDITIONS, *DATE_CONDITIONS}
+
+
+def load_rules(filename):
+    """Read a rule set from a .json, .yaml or .yml file."""
+    with open(filename, 'r', encoding='utf-8') as file:
+        if filename.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise RuntimeError("YAML rule files need PyYAML (pip install pyyaml), or use JSON")
+            rules = yaml.safe_load(file)
+        else:
+            rules = json.load(file)
+    if not isinstance(rules, dict):
+        raise ValueError(f"{filename}: a rule set is a mapping with 'rules' and 'overrides' lists")
+    return rules
+
+
+def as_date(value):
+    """A plain date from a date or datetime (the script's dates are datetimes at midnight)."""
+    return date(value.year, value.month, value.day)
+
+
+def parse_day(value, where):
+    """A date condition: (month, day) for MM-DD, a date for YYYY-MM-DD."""
+    value = str(value)
+    try:
+        if len(value) == 5:
+            month, day = (int(part) for part in value.split('-'))
+            date(2024, month, day)          # Leap year, so 02-29 is allowed
+            return month, day
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{where}: {value!r} is not MM-DD or YYYY-MM-DD") from None
+
+
+class DateTable:
+    """The date dimension of one date range: every date's YYYY-MM-DD string and day name.
+
+    There is one table per range in each process (see date_table), so every record of
+    a run shares the same strings; a pickled table is rebuilt from its first date and
+    length instead of sending the strings.
+    """
+
+    __slots__ = ('first', 'dates', 'days')
+
+    def __init__(self, first, count):
+        days = [first + timedelta(days=i) for i in range(count)]
+        self.first = first
+        self.dates = tuple(day.strftime("%Y-%m-%d") for day in days)
+        self.days = tuple(DAY_NAMES[day.weekday()] for day in days)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __reduce__(self):
+        return date_table, (self.first, len(self.dates))
+
+
+@lru_cache(maxsize=None)
+def date_table(first, count):
+    """The shared DateTable of count dates from first."""
+    return DateTable(first, count)
+
+
+class Rule:
+    """One rule or override: the rooms it matches, the nights it applies on and its multiplier."""
+
+    def __init__(self, spec, where):
+        unknown = set(spec) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+        self.name = spec.get('name', where)
+        if 'name' in spec:
+            where = f"{where} ({self.name})"
+
+        self.multiplier = spec.get('multiplier')
+        if isinstance(self.multiplier, bool) or not isinstance(self.multiplier, (int, float)) or self.multiplier <= 0:
+            raise ValueError(f"{where}: multiplier must be a positive number")
+        self.multiplier = float(self.multiplier)
+
+        self.room_conditions = {}
+        for key, field in ROOM_CONDITIONS.items():
+            if key in spec:
+                self.room_conditions[field] = set(self._list(spec, key, where))
+
+        self.days = None
+        if 'days' in spec:
+            days = self._list(spec, 'days', where)
+            for day in days:
+                if day not in DAY_NAMES:
+                    raise ValueError(f"{where}: {day!r} is not a day name")
+            self.days = {DAY_NAMES.index(day) for day in days}
+        self.dates = None
+        if 'dates' in spec:
+            self.dates = {parse_day(value, where) for value in self._list(spec, 'dates', where)}
+
+        self.season = None
+        if 'from' in spec or 'to' in spec:
+            if 'from' not in spec or 'to' not in spec:
+                raise ValueError(f"{where}: a season needs both from and to")
+            first, last = parse_day(spec['from'], where), parse_day(spec['to'], where)
+            if type(first) is not type(last):
+                raise ValueError(f"{where}: from and to must both be MM-DD or both be YYYY-MM-DD")
+            self.season = (first, last)
+
+    @staticmethod
+    def _list(spec, key, where):
+        values = spec[key]
+        if not isinstance(values, list):
+            raise ValueError(f"{where}: {key} must be a list")
+        return [str(value) for value in values]
+
+    def matches(self, hotel, room):
+        """Does the rule apply to this room of this hotel?"""
+        details = {**hotel, **room}
+        return all(details[field] in values for field, values in self.room_conditions.items())
+
+    def applies_on(self, day):
+        """Does the rule apply on this date?"""
+        if self.days is not None and day.weekday() not in self.days:
+            return False
+        if self.dates is not None and (day.month, day.day) not in self.dates and day not in self.dates:
+            return False
+        if self.season is not None:
+            first, last = self.season
+            if isinstance(first, date):
+                return first <= day <= last
+            key = (day.month, day.day)
+            if first <= last:
+                return first <= key <= last
+            return key >= first or key <= last     # Wraps round the new year
+        return True
+
+
+class PricingCalendar:
+    """A rule set compiled for one date range.
+
+    Each rule's date test is evaluated once per date when the calendar is built.
+    multipliers() then gives a room its per-date multiplier list; rooms that match
+    the same rules share one list, so pricing a row is a single lookup.
+    """
+
+    def __init__(self, rules, start_date, end_date):
+        start_date, end_date = as_date(start_date), as_date(end_date)
+        self.dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        self.date_table = date_table(start_date, len(self.dates))
+        self.date_strings = self.date_table.dates
+        self.day_names = self.date_table.days
+
+        self.rules = [Rule(spec, f"rule {i + 1}") for i, spec in enumerate(rules.get('rules') or [])]
+        self.overrides = [Rule(spec, f"override {i + 1}") for i, spec in enumerate(rules.get('overrides') or [])]
+        self.rule_days = [[rule.applies_on(day) for day in self.dates] for rule in self.rules]
+        self.override_days = [[rule.applies_on(day) for day in self.dates] for rule in self.overrides]
+
+        self.classes = {}       # (matching rules, matching overrides) -> multipliers
+        self.rooms = {}         # (hotel, location, room type, availability) -> multipliers
+
+    def multipliers(self, hotel, room):
+        """The per-date multipliers for one room, compiled the first time its class is seen."""
+        key = (hotel['hotel_name'], hotel['location'], room['room_type'], room['availability'])
+        multipliers = self.rooms.get(key)
+        if multipliers is None:
+            rules = tuple(i for i, rule in enumerate(self.rules) if rule.matches(hotel, room))
+            overrides = tuple(i for i, rule in enumerate(self.overrides) if rule.matches(hotel, room))
+            multipliers = self.classes.get((rules, overrides))
+            if multipliers is None:
+                multipliers = self.classes[(rules, overrides)] = self._compile(rules, overrides)
+            self.rooms[key] = multipliers
+        return multipliers
+
+    def _compile(self, rules, overrides):
+        multipliers = [1.0] * len(self.dates)
+        for i in rules:
+            rule = self.rules[i]
+            for j, applies in enumerate(self.rule_days[i]):
+                if applies:
+                    multipliers[j] *= rule.multiplier
+        for i in overrides:
+            rule = self.overrides[i]
+            for j, applies in enumerate(self.override_days[i]):
+                if applies:
+                    multipliers[j] = rule.multiplier
+        return tuple(multipliers)
+
+    def __getstate__(self):
+        # Worker processes get the compiled date tests but build their own room classes
+        state = self.__dict__.copy()
+        state['classes'] = {}
+        state['rooms'] = {}
+        return state
@@ -0,0 +1,216 @@
+"""
+Hotel Price Report Statistics
+Question 4 - CA_ONE (30%)
+Single-pass statistics for the hotel price report.
+
+ReportCollector looks at each record once, as it streams past, and keeps only
+per-group running totals: count/min/max/sum for the whole dataset, each hotel and
+each room type, the first few dates of every room for the sample table, and a
+mergeable quantile sketch for percentiles. Memory grows with the number of hotels
+and rooms, never with the number of rows.
+"""
+
+import math
+
+from Que4_output import record_values
+
+SAMPLE_DATES = 5            # Dates shown per room in the report
+SKETCH_ACCURACY = 0.01      # Relative error of the percentile estimates
+
+
+class QuantileSketch:
+    """A mergeable quantile sketch with bounded relative error (the DDSketch idea).
+
+    Each value goes into a logarithmic bucket; any quantile is then within
+    SKETCH_ACCURACY of the true value. Two sketches merge by adding bucket counts,
+    so per-worker or per-file sketches can be combined.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1         # Prices are never negative, zero gets its own bucket
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("cannot merge sketches with different accuracy")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self.gamma ** key / (self.gamma + 1)     # Middle of the bucket
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class PriceStats:
+    """Running count, minimum, maximum and mean of a group of prices."""
+
+    def __init__(self, sketch=False):
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.sketch = QuantileSketch() if sketch else None
+
+    def add(self, price):
+        self.count += 1
+        self.total += price
+        if price < self.minimum:
+            self.minimum = price
+        if price > self.maximum:
+            self.maximum = price
+        if self.sketch is not None:
+            self.sketch.add(price)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class RoomSummary:
+    """What the report shows for one room type: its first record, a few dates and the price stats."""
+
+    def __init__(self, first_record):
+        self.sample = first_record
+        self.dates = []
+        self.stats = PriceStats()
+
+
+class HotelSummary:
+    def __init__(self, location):
+        self.location = location
+        self.rooms = {}
+        self.stats = PriceStats(sketch=True)
+
+
+class ReportCollector:
+    """Collects everything the report needs in one pass over the records."""
+
+    def __init__(self):
+        self.hotels = {}
+        self.stats = PriceStats(sketch=True)
+
+    def add(self, record):
+        # All the values at once, which is much cheaper than a lookup per field for compact records
+        date_str, day_name, hotel_name, location, room_type, _, final_price = record_values(record)[:7]
+        price = float(final_price)
+        hotel = self.hotels.get(hotel_name)
+        if hotel is None:
+            hotel = self.hotels[hotel_name] = HotelSummary(location)
+        room = hotel.rooms.get(room_type)
+        if room is None:
+            room = hotel.rooms[room_type] = RoomSummary(dict(record))   # A copy, not a view of the page's prices
+        if len(room.dates) < SAMPLE_DATES:
+            room.dates.append((date_str, day_name, final_price))
+
+        room.stats.add(price)
+        hotel.stats.add(price)
+        self.stats.add(price)
+
+    def collect(self, records):
+        """Pass records through unchanged while adding each one, e.g. on the way to the writer."""
+        for record in records:
+            self.add(record)
+            yield record
+
+    def consume(self, records):
+        """Add every record of a stream, such as read_records() on an output file."""
+        for record in records:
+            self.add(record)
+        return self
+
+
+def print_report(collector):
+    """Print the per-hotel listing and summary statistics from a ReportCollector."""
+    # Display data in terminal
+    print("\n" + "="*100)
+    print("HOTEL ROOM PRICING DATA")
+    print("="*100)
+
+    # Display each hotel's data
+    for hotel_name, hotel in collector.hotels.items():
+        print(f"\n{'─'*100}")
+        print(f"Hotel: {hotel_name}")
+        print(f"Location: {hotel.location}")
+        print(f"{'─'*100}")
+
+        # Display each room type
+        for room_type, room in hotel.rooms.items():
+            sample = room.sample
+            print(f"\nRoom Type: {room_type}")
+            print(f"  Base Price: €{sample['Base_Price']}")
+            capacity = sample['Max_Capacity']
+            print(f"  Capacity: {capacity} persons" if capacity else "  Capacity: not given")
+            print(f"  Amenities: {sample['Amenities']}")
+            print(f"  Availability: {sample['Availability']}")
+            print(f"  Price Range: €{room.stats.minimum:.2f} - €{room.stats.maximum:.2f} (average €{room.stats.mean:.2f})")
+            print(f"\n  Sample Dates and Prices:")
+            print(f"  {'Date':<12} {'Day':<10} {'Price':<10}")
+            print(f"  {'-'*35}")
+
+            # Show first 5 dates
+            for date_str, day_name, final_price in room.dates:
+                print(f"  {date_str:<12} {day_name:<10} €{final_price:<10}")
+
+            if room.stats.count > len(room.dates):
+                print(f"  ... and {room.stats.count - len(room.dates)} more dates")
+
+    # Display statistics
+    print(f"\n\n{'='*100}")
+    print("SUMMARY STATISTICS")
+    print(f"{'='*100}")
+
+    stats = collector.stats
+    print(f"\nTotal Records: {stats.count}")
+    print(f"Number of Hotels: {len(collector.hotels)}")
+    print(f"Total Room Types: {sum(len(hotel.rooms) for hotel in collector.hotels.values())}")
+    if stats.count:
+        print(f"\nPrice Statistics:")
+        print(f"  Minimum Price: €{stats.minimum:.2f}")
+        print(f"  Maximum Price: €{stats.maximum:.2f}")
+        print(f"  Average Price: €{stats.mean:.2f}")
+        print(f"  Median Price: ~€{stats.sketch.quantile(0.5):.2f}")
+        print(f"  90th Percentile: ~€{stats.sketch.quantile(0.9):.2f}")
+        print(f"  99th Percentile: ~€{stats.sketch.quantile(0.99):.2f}")
+
+    # Average price per hotel
+    print(f"\nAverage Price by Hotel:")
+    for hotel_name, hotel in collector.hotels.items():
+        print(f"  {hotel_name}: €{hotel.stats.mean:.2f} (min €{hotel.stats.minimum:.2f}, "
+              f"max €{hotel.stats.maximum:.2f}, median ~€{hotel.stats.sketch.quantile(0.5):.2f})")
+
+    print("\n" + "="*100)
+    print("Process completed successfully!")
+    print("="*100)
@@ -0,0 +1,241 @@
+"""
+Hotel Price Store
+Question 4 - CA_ONE (30%)
+A persisted, indexed SQLite store for the scraped hotel prices, with a small
+query API and command line so questions like "cheapest Deluxe room in Dublin Bay
+between 24 and 26 Dec" are answered from indexes instead of scanning the CSV.
+
+Rooms (hotel, location, room type and the other per-room details) are stored once;
+each nightly price is a (room_id, date) row in a clustered WITHOUT ROWID table.
+
+    python Que4_store.py load hotel_data.csv
+    python Que4_store.py range "Seaside Paradise Resort" "Deluxe Ocean View" 2025-12-24 2025-12-26
+    python Que4_store.py cheapest 2025-12-24 2025-12-26 --location "Dublin Bay" --room Deluxe -k 3
+    python Que4_store.py night 2025-12-25 --hotel "Mountain View Lodge"
+"""
+
+import argparse
+import sqlite3
+import sys
+
+from Que4_output import parse_capacity, read_records
+
+STORE_FILE = 'hotel_prices.db'
+LOAD_BATCH = 10000
+
+ROOMS_TABLE = '''
+CREATE TABLE IF NOT EXISTS {name}(
+    room_id INTEGER PRIMARY KEY,
+    hotel_name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    room_type TEXT NOT NULL,
+    base_price REAL NOT NULL,
+    currency TEXT NOT NULL,
+    amenities TEXT NOT NULL,
+    max_capacity INTEGER,
+    availability TEXT NOT NULL,
+    UNIQUE (hotel_name, room_type)
+);
+'''
+SCHEMA = ROOMS_TABLE.format(name='rooms') + '''
+CREATE TABLE IF NOT EXISTS prices(
+    room_id INTEGER NOT NULL REFERENCES rooms(room_id),
+    date TEXT NOT NULL,
+    day TEXT NOT NULL,
+    final_price REAL NOT NULL,
+    PRIMARY KEY (room_id, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_prices_date_price ON prices(date, final_price, room_id);
+CREATE INDEX IF NOT EXISTS idx_rooms_location ON rooms(location, hotel_name, room_type);
+'''
+
+# Columns every query returns, in this order
+RESULT_COLUMNS = ['Date', 'Day', 'Hotel_Name', 'Location', 'Room_Type', 'Final_Price', 'Currency', 'Max_Capacity']
+RESULT_SELECT = '''
+    SELECT p.date, p.day, r.hotel_name, r.location, r.room_type, p.final_price, r.currency, r.max_capacity
+'''
+
+
+class PriceStore:
+    """The indexed price store. Loading is streaming; every query uses an index range."""
+
+    def __init__(self, filename=STORE_FILE):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self._allow_unknown_capacity()
+        self.connection.executescript(SCHEMA)
+        self.room_ids = {}
+
+    def _allow_unknown_capacity(self):
+        """Stores made before a page could leave out the capacity have it NOT NULL; rebuild their rooms table."""
+        columns = {row[1]: row[3] for row in self.connection.execute("PRAGMA table_info(rooms)")}
+        if not columns.get('max_capacity'):
+            return
+        self.connection.executescript('BEGIN;' + ROOMS_TABLE.format(name='rooms_new') + '''
+            INSERT INTO rooms_new SELECT * FROM rooms;
+            DROP TABLE rooms;
+            ALTER TABLE rooms_new RENAME TO rooms;
+            COMMIT;
+        ''')
+
+    def close(self):
+        self.connection.close()
+
+    def _room_id(self, record):
+        key = (record['Hotel_Name'], record['Room_Type'])
+        room_id = self.room_ids.get(key)
+        if room_id is None:
+            values = (record['Hotel_Name'], record['Location'], record['Room_Type'], float(record['Base_Price']),
+                      record['Currency'], record['Amenities'], parse_capacity(record['Max_Capacity']), record['Availability'])
+            self.connection.execute('''
+                INSERT INTO rooms (hotel_name, location, room_type, base_price, currency, amenities, max_capacity, availability)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (hotel_name, room_type) DO UPDATE SET
+                    location = excluded.location, base_price = excluded.base_price, currency = excluded.currency,
+                    amenities = excluded.amenities, max_capacity = excluded.max_capacity,
+                    availability = excluded.availability
+            ''', values)
+            room_id = self.connection.execute(
+                "SELECT room_id FROM rooms WHERE hotel_name = ? AND room_type = ?", key).fetchone()[0]
+            self.room_ids[key] = room_id
+        return room_id
+
+    def load(self, records):
+        """Insert or replace the nightly prices of a record stream, return how many were loaded."""
+        with self.connection:
+            return self._load(records)
+
+    def _load(self, records):
+        count = 0
+        batch = []
+        for record in records:
+            batch.append((self._room_id(record), str(record['Date']), record['Day'], float(record['Final_Price'])))
+            if len(batch) == LOAD_BATCH:
+                self._insert(batch)
+                count += len(batch)
+                batch = []
+        self._insert(batch)
+        count += len(batch)
+        return count
+
+    def _insert(self, batch):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO prices (room_id, date, day, final_price) VALUES (?, ?, ?, ?)", batch)
+
+    def collect(self, records, batch_size=LOAD_BATCH):
+        """Pass records through unchanged while loading them, e.g. on the way to the writer."""
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == batch_size:
+                self.load(batch)
+                batch = []
+            yield record
+        self.load(batch)
+
+    def _rows(self, sql, params):
+        return [dict(zip(RESULT_COLUMNS, row)) for row in self.connection.execute(sql, params)]
+
+    def price_range(self, hotel_name, room_type, start, end):
+        """Nightly prices of one room between two dates (inclusive), in date order."""
+        return self._rows(RESULT_SELECT + '''
+            FROM rooms r JOIN prices p ON p.room_id = r.room_id
+            WHERE r.hotel_name = ? AND r.room_type = ? AND p.date BETWEEN ? AND ?
+            ORDER BY p.date
+        ''', (hotel_name, room_type, start, end))
+
+    def cheapest(self, start, end, k=5, hotel_name=None, location=None, room_type=None):
+        """The k cheapest room-nights between two dates, optionally filtered.
+
+        location and room_type match anywhere in the text (case-insensitive), so
+        "Dublin Bay" and "Deluxe" work as in the question above.
+        """
+        where, params = self._room_filter(hotel_name, location, room_type)
+        return self._rows(RESULT_SELECT + f'''
+            FROM prices p JOIN rooms r ON r.room_id = p.room_id
+            WHERE p.date BETWEEN ? AND ? {where}
+            ORDER BY p.final_price, p.date
+            LIMIT ?
+        ''', (start, end, *params, k))
+
+    def night(self, date, hotel_name=None, location=None, room_type=None):
+        """Every room priced on one night, cheapest first."""
+        where, params = self._room_filter(hotel_name, location, room_type)
+        return self._rows(RESULT_SELECT + f'''
+            FROM prices p JOIN rooms r ON r.room_id = p.room_id
+            WHERE p.date = ? {where}
+            ORDER BY p.final_price
+        ''', (date, *params))
+
+    @staticmethod
+    def _room_filter(hotel_name, location, room_type):
+        where = []
+        params = []
+        if hotel_name:
+            where.append("r.hotel_name = ?")
+            params.append(hotel_name)
+        if location:
+            where.append("r.location LIKE ?")
+            params.append(f"%{location}%")
+        if room_type:
+            where.append("r.room_type LIKE ?")
+            params.append(f"%{room_type}%")
+        return ''.join(f" AND {condition}" for condition in where), params
+
+
+def print_rows(rows):
+    if not rows:
+        print("No matching prices")
+        return
+    print(f"{'Date':<12} {'Day':<10} {'Hotel':<28} {'Room Type':<24} {'Price':>10}")
+    print("-"*88)
+    for row in rows:
+        print(f"{row['Date']:<12} {row['Day']:<10} {row['Hotel_Name']:<28} {row['Room_Type']:<24} "
+              f"{row['Currency']} {row['Final_Price']:>6.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the indexed hotel price store")
+    parser.add_argument('--store', default=STORE_FILE, help="store file (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load = commands.add_parser('load', help="load a scraped output file (any Que4 format)")
+    load.add_argument('file')
+
+    price_range = commands.add_parser('range', help="nightly prices of one room between two dates")
+    price_range.add_argument('hotel')
+    price_range.add_argument('room')
+    price_range.add_argument('start')
+    price_range.add_argument('end')
+
+    cheapest = commands.add_parser('cheapest', help="cheapest room-nights between two dates")
+    cheapest.add_argument('start')
+    cheapest.add_argument('end')
+    cheapest.add_argument('-k', type=int, default=5)
+
+    night = commands.add_parser('night', help="every room priced on one night")
+    night.add_argument('date')
+
+    for command in (cheapest, night):
+        command.add_argument('--hotel')
+        command.add_argument('--location')
+        command.add_argument('--room')
+
+    args = parser.parse_args(argv)
+    store = PriceStore(args.store)
+    try:
+        if args.command == 'load':
+            print(f"Loaded {store.load(read_records(args.file))} prices into {args.store}")
+        elif args.command == 'range':
+            print_rows(store.price_range(args.hotel, args.room, args.start, args.end))
+        elif args.command == 'cheapest':
+            print_rows(store.cheapest(args.start, args.end, args.k, args.hotel, args.location, args.room))
+        else:
+            print_rows(store.night(args.date, args.hotel, args.location, args.room))
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Output Format Tests
+Question 4 - CA_ONE (30%)
+Round trips through the writers in Que4_output.py, run with: python test_output.py (or pytest)
+"""
+
+import os
+import tempfile
+from datetime import date, timedelta
+
+import pyarrow as pa
+
+import Que4_output
+from Que4_output import FIELDNAMES, read_records, write_records
+
+BATCH_ROWS = 100
+BATCHES = 4
+
+
+def make_records():
+    """Rows spread over several batches; every batch brings hotels and rooms the earlier ones did not have."""
+    records = []
+    first = date(2025, 12, 20)
+    for i in range(BATCH_ROWS * BATCHES - 37):      # The last batch is a short one
+        batch = i // BATCH_ROWS
+        night = first + timedelta(days=i % 11)
+        records.append({
+            'Date': night.isoformat(),
+            'Day': night.strftime('%A'),
+            'Hotel_Name': f"Hotel {batch}-{i % 3}",
+            'Location': f"Town {batch}",
+            'Room_Type': f"Room {batch}-{i % 5}",
+            'Base_Price': 100.0 + batch,
+            'Final_Price': round(100.0 + i * 0.37, 2),
+            'Currency': 'EUR' if batch % 2 else 'GBP',
+            'Amenities': f"WiFi, Pool {i % 2}",
+            'Max_Capacity': None if i % 7 == 0 else i % 6 + 1,
+            'Availability': 'Available',
+        })
+    return records
+
+
+def test_arrow_dictionary_grows_across_batches():
+    records = make_records()
+    saved = Que4_output.BATCH_ROWS
+    Que4_output.BATCH_ROWS = BATCH_ROWS
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'prices.arrow')
+            assert write_records(records, filename) == len(records)
+
+            with pa.memory_map(filename, 'r') as source:
+                reader = pa.ipc.open_file(source)
+                assert reader.num_record_batches == BATCHES
+                batches = [reader.get_batch(i) for i in range(reader.num_record_batches)]
+                # The new hotels and rooms of each later batch were sent as dictionary deltas
+                assert reader.stats.num_dictionary_deltas >= 2 * (BATCHES - 1)
+                assert reader.stats.num_replaced_dictionaries == 0
+                table = reader.read_all()
+
+            # Each batch decodes to its own hotels, none of them known to the first batch
+            for i, batch in enumerate(batches):
+                assert {name.split('-')[0] for name in batch.column('Hotel_Name').to_pylist()} == {f"Hotel {i}"}
+
+            assert table.num_rows == len(records)
+            for name in FIELDNAMES:
+                column = table.column(name)
+                if name == 'Date':
+                    column = column.cast(pa.string())
+                assert column.to_pylist() == [record[name] for record in records], name
+
+            assert list(read_records(filename)) == records
+    finally:
+        Que4_output.BATCH_ROWS = saved
+
+
+if __name__ == "__main__":
+    test_arrow_dictionary_grows_across_batches()
+    print("Output tests passed")